@@ -0,0 +1,123 @@
+"""
+有界分析执行器
+API 路由中的分析、行情获取等同步阻塞调用统一提交到固定大小的线程池执行，事件循环只负责等待结果，
+慢请求不会阻塞 /health 等其他接口。同时执行的任务数为 max_workers，另有 queue_depth 个排队名额；
+名额用完时立即拒绝（ExecutorBusy，附带建议的重试等待秒数），而不是让排队延迟无限增长。
+
+名额在线程中的任务真正结束时才释放，客户端断开连接不会让仍在运行的任务“逃出”并发限制。
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 默认并发数与排队深度
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_DEPTH = 16
+
+
+class ExecutorBusy(Exception):
+    """执行器并发与排队名额已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"分析任务繁忙，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """有并发上限和排队深度上限的线程池，供 async 路由调用同步函数"""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                 name: str = 'analysis'):
+        """
+        Args:
+            max_workers: 同时执行的任务数
+            queue_depth: 最多排队等待的任务数，为0时不排队
+            name: 线程名前缀
+        """
+        self.max_workers = max(1, max_workers)
+        self.queue_depth = max(0, queue_depth)
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._avg_seconds: Optional[float] = None
+        self.completed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> 'BoundedExecutor':
+        """从环境变量 ANALYSIS_WORKERS / ANALYSIS_QUEUE_DEPTH 创建"""
+        return cls(int(os.getenv('ANALYSIS_WORKERS', DEFAULT_WORKERS)),
+                   int(os.getenv('ANALYSIS_QUEUE_DEPTH', DEFAULT_QUEUE_DEPTH)))
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.queue_depth
+
+    def _retry_after(self) -> int:
+        """按平均任务耗时估算排在最后的任务还要等多久（调用方持有锁）"""
+        avg = self._avg_seconds if self._avg_seconds is not None else 1.0
+        return max(1, math.ceil(avg * self._admitted / self.max_workers))
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self.rejected += 1
+                raise ExecutorBusy(self._retry_after())
+            self._admitted += 1
+
+    def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """在工作线程中执行，结束时释放名额并更新平均耗时"""
+        begin = time.monotonic()
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - begin
+            with self._lock:
+                self._running -= 1
+                self._admitted -= 1
+                self.completed += 1
+                self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在线程池中执行同步函数并等待结果
+
+        Raises:
+            ExecutorBusy: 并发与排队名额已满
+        """
+        self._admit()
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, functools.partial(self._run, func, *args, **kwargs))
+        except BaseException:
+            with self._lock:
+                self._admitted -= 1
+            raise
+        return await future
+
+    def stats(self) -> Dict:
+        """并发上限、执行中与排队中的任务数、拒绝数和平均耗时"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'queue_depth': self.queue_depth,
+                'running': self._running,
+                'queued': self._admitted - self._running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_seconds': round(self._avg_seconds, 3) if self._avg_seconds is not None else None,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
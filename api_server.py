@@ -1,5 +1,6 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import uvicorn
@@ -10,6 +11,9 @@ from dotenv import load_dotenv
 
 from stock_analyzer import StockAnalyzer
 from futures_analyzer import FuturesAnalyzer
+from singleflight import AsyncSingleFlight
+from indicator_graph import DEFAULT_GRAPH
+from analysis_executor import BoundedExecutor, ExecutorBusy
 
 # 加载环境变量
 load_dotenv()
@@ -41,6 +45,24 @@ app.add_middleware(
 stock_analyzer = StockAnalyzer()
 futures_analyzer = FuturesAnalyzer()
 
+# 合并同一标的的并发分析请求，共享一次行情获取和一次分析结果；
+# 合并在事件循环中完成，只有第一个请求提交到执行器，等待中的重复请求不占用工作线程和排队名额
+analysis_flight = AsyncSingleFlight()
+
+# 分析、行情获取等阻塞调用在有界线程池中执行，不占用事件循环；
+# 并发数与排队深度由 ANALYSIS_WORKERS / ANALYSIS_QUEUE_DEPTH 配置，名额已满时返回 503
+analysis_executor = BoundedExecutor.from_env()
+
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request: Request, exc: ExecutorBusy):
+    logger.warning(f"分析任务繁忙，拒绝请求: {request.url.path}")
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    analysis_executor.shutdown(wait=False)
+
 # 请求模型
 class StockAnalysisRequest(BaseModel):
     stock_code: str = ""  # 允许空字符串，但在处理时会检查
@@ -59,6 +81,8 @@ class BatchStockAnalysisRequest(BaseModel):
     stockCodes: List[str] = []  # 兼容前端可能发送的参数名
     market: str = "A"
     min_score: Optional[int] = 60
+    top_n: Optional[int] = None  # 只返回评分最高的前N只
+    ai_top_n: Optional[int] = None  # 只为评分最高的前N只生成AI分析，默认读取 AI_ANALYSIS_TOP_N
 
     # 处理可能的参数名不一致
     def __init__(self, **data):
@@ -96,6 +120,40 @@ class BatchFuturesAnalysisRequest(BaseModel):
         if not self.futures_codes and self.futuresCodes:
             self.futures_codes = self.futuresCodes
 
+class IndicatorRequest(BaseModel):
+    code: str
+    market: str = ""           # 为空时股票默认A股，期货默认国内期货
+    fields: List[str] = []     # 需要的指标名称，为空时返回全部指标
+    rows: int = 1              # 返回最近多少根K线
+
+def indicator_payload(df, fields, rows):
+    """只保留所请求指标的最近 rows 行，日期转为字符串"""
+    recent = df[['date', 'close'] + fields].tail(max(1, rows)).copy()
+    recent['date'] = recent['date'].dt.strftime('%Y-%m-%d')
+    return recent.astype(object).where(recent.notna(), None).to_dict(orient='records')
+
+def requested_fields(request: IndicatorRequest, futures: bool):
+    """校验指标名称；未指定时返回全部股票或期货指标"""
+    futures_only = {'OI_Change', 'OI_MA', 'Momentum', 'VOI_Ratio', 'TR', 'ATR14'}
+    available = [name for name in DEFAULT_GRAPH.outputs if futures or name not in futures_only]
+    unknown = [name for name in request.fields if name not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的指标: {', '.join(unknown)}；可选: {', '.join(available)}")
+    return list(dict.fromkeys(request.fields)) or available
+
+def scan_futures(codes, market, min_score):
+    """逐个分析期货合约，保留达到评分阈值的结果（在分析线程池中执行）"""
+    results = []
+    for code in codes:
+        try:
+            result = futures_analyzer.analyze_futures(symbol=code, market=market, snapshot=True)
+            if result['score'] >= min_score:
+                results.append(result)
+        except Exception as e:
+            logger.warning(f"分析期货 {code} 时出错: {str(e)}")
+            continue
+    return results
+
 # API路由
 @app.get("/")
 async def root():
@@ -107,8 +165,15 @@ async def analyze_stock(request: StockAnalysisRequest):
     """分析单只股票"""
     try:
         logger.info(f"分析股票: {request.stock_code}, 市场: {request.market}")
-        result = stock_analyzer.analyze_stock(request.stock_code, request.market)
+        key = ('stock', request.stock_code, request.market, datetime.now().strftime('%Y-%m-%d'))
+        result, shared = await analysis_flight.do(
+            key, analysis_executor.run, stock_analyzer.analyze_stock, request.stock_code, request.market
+        )
+        if shared:
+            logger.info(f"合并并发分析请求: {request.stock_code}, 市场: {request.market}")
         return {"status": "success", "data": result}
+    except ExecutorBusy:
+        raise
     except Exception as e:
         logger.error(f"分析股票时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -118,19 +183,42 @@ async def batch_analyze_stocks(request: BatchStockAnalysisRequest):
     """批量分析股票"""
     try:
         logger.info(f"批量分析股票, 市场: {request.market}, 数量: {len(request.stock_codes)}")
-        results = stock_analyzer.scan_market(request.stock_codes, request.market, request.min_score)
+        results = await analysis_executor.run(
+            stock_analyzer.scan_market, request.stock_codes, request.market, request.min_score,
+            request.top_n, ai_top_n=request.ai_top_n
+        )
         return {"status": "success", "data": results}
+    except ExecutorBusy:
+        raise
     except Exception as e:
         logger.error(f"批量分析股票时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/stock/indicators")
+async def stock_indicators(request: IndicatorRequest):
+    """只计算并返回指定的股票技术指标"""
+    fields = requested_fields(request, futures=False)
+    try:
+        market = request.market or "A"
+        df = await analysis_executor.run(
+            lambda: stock_analyzer.calculate_selected_indicators(stock_analyzer.get_stock_data(request.code, market), fields)
+        )
+        return {"status": "success", "data": indicator_payload(df, fields, request.rows)}
+    except ExecutorBusy:
+        raise
+    except Exception as e:
+        logger.error(f"计算股票指标时出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/stock/market-stocks")
 async def get_market_stocks(market: str = Query("A", description="市场类型: A(A股), US(美股), HK(港股)")):
     """获取市场所有股票代码"""
     try:
         logger.info(f"获取市场股票列表: {market}")
-        stocks = stock_analyzer.get_market_stocks(market)
+        stocks = await analysis_executor.run(stock_analyzer.get_market_stocks, market)
         return {"status": "success", "data": stocks}
+    except ExecutorBusy:
+        raise
     except Exception as e:
         logger.error(f"获取市场股票列表时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -146,8 +234,15 @@ async def analyze_futures(request: FuturesAnalysisRequest):
             
         logger.info(f"分析期货: {request.symbol}, 市场: {request.market}")
         # 直接使用symbol参数，无需映射
-        result = futures_analyzer.analyze_futures(symbol=request.symbol, market=request.market)
+        key = ('futures', request.symbol, request.market, datetime.now().strftime('%Y-%m-%d'))
+        result, shared = await analysis_flight.do(
+            key, analysis_executor.run, futures_analyzer.analyze_futures, request.symbol, request.market
+        )
+        if shared:
+            logger.info(f"合并并发分析请求: {request.symbol}, 市场: {request.market}")
         return {"status": "success", "data": result}
+    except ExecutorBusy:
+        raise
     except Exception as e:
         logger.error(f"分析期货时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -157,28 +252,40 @@ async def batch_analyze_futures(request: BatchFuturesAnalysisRequest):
     """批量分析期货"""
     try:
         logger.info(f"批量分析期货, 市场: {request.market}, 数量: {len(request.futures_codes)}")
-        results = []
-        for code in request.futures_codes:
-            try:
-                result = futures_analyzer.analyze_futures(symbol=code, market=request.market)
-                if result['score'] >= request.min_score:
-                    results.append(result)
-            except Exception as e:
-                logger.warning(f"分析期货 {code} 时出错: {str(e)}")
-                continue
-        
+        results = await analysis_executor.run(scan_futures, request.futures_codes, request.market, request.min_score)
         return {"status": "success", "data": results}
+    except ExecutorBusy:
+        raise
     except Exception as e:
         logger.error(f"批量分析期货时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/futures/indicators")
+async def futures_indicators(request: IndicatorRequest):
+    """只计算并返回指定的期货技术指标"""
+    fields = requested_fields(request, futures=True)
+    try:
+        market = request.market or "CN"
+        df = await analysis_executor.run(
+            lambda: futures_analyzer.calculate_selected_indicators(
+                futures_analyzer.get_futures_data(request.code, market), fields, futures_analyzer.futures_params)
+        )
+        return {"status": "success", "data": indicator_payload(df, fields, request.rows)}
+    except ExecutorBusy:
+        raise
+    except Exception as e:
+        logger.error(f"计算期货指标时出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/futures/market-futures")
 async def get_market_futures(market: str = Query("CN", description="市场类型: CN(国内期货), GLOBAL(国际期货)")):
     """获取市场所有期货代码"""
     try:
         logger.info(f"获取市场期货列表: {market}")
-        futures = futures_analyzer.get_market_futures(market)
+        futures = await analysis_executor.run(futures_analyzer.get_market_futures, market)
         return {"status": "success", "data": futures}
+    except ExecutorBusy:
+        raise
     except Exception as e:
         logger.error(f"获取市场期货列表时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -190,7 +297,9 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "version": "2.0.0"
+        "version": "2.0.0",
+        "indicator_cache": stock_analyzer.indicator_cache.stats(),
+        "analysis_executor": analysis_executor.stats()
     }
 
 # 启动服务器
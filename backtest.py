@@ -0,0 +1,251 @@
+"""
+评分回测
+把基于评分的买卖规则（默认沿用 get_recommendation 的阈值：评分 ≥60 建议买入，<40 建议卖出）
+转换为持仓，在 日期 × 代码 的行情面板上模拟资金、手续费、整手和 A 股 T+1。
+
+  - 信号在当日收盘后由评分产生，次日开盘价成交（不使用未来数据）
+  - 买入按评分从高到低填满持仓槽位，每个槽位的目标金额为前一日总资产 / 最大持仓数，按整手向下取整
+  - 卖出需持有满 t_plus 个交易日；当日无K线（停牌）的标的不成交，市值按最近收盘价计算
+  - 佣金双边收取且有最低佣金，印花税只在卖出时收取
+
+时间轴逐日推进，每一天对全市场代码做数组运算，全市场多年回测在单机上为秒到分钟级。
+
+命令行：
+    python backtest.py --codes 600000,000001 --start 20210101 --entry 60 --exit 40
+"""
+
+import argparse
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from indicator_panel import OHLCVPanel
+
+# 年化使用的交易日数
+TRADING_DAYS = 252
+
+
+@dataclass
+class BacktestConfig:
+    """回测参数"""
+    initial_cash: float = 1000000
+    entry_score: float = 60        # 评分 ≥ entry_score 时买入（建议买入）
+    exit_score: float = 40         # 评分 < exit_score 时卖出（建议卖出）
+    max_positions: int = 10        # 最大持仓数
+    lot_size: int = 100            # 每手股数
+    commission: float = 0.0003     # 佣金费率（双边）
+    min_commission: float = 5.0    # 单笔最低佣金
+    stamp_duty: float = 0.0005     # 印花税（卖出）
+    t_plus: int = 1                # 买入后最少持有的交易日数
+
+
+@dataclass
+class BacktestResult:
+    """回测结果"""
+    equity: pd.Series                 # 每日总资产
+    cash: pd.Series                   # 每日现金
+    positions: pd.DataFrame           # 每日持股数（日期 × 代码）
+    trades: pd.DataFrame              # 成交明细
+    metrics: Dict = field(default_factory=dict)
+
+
+def _fees(value: np.ndarray, config: BacktestConfig, sell: bool) -> np.ndarray:
+    fees = np.maximum(value * config.commission, config.min_commission)
+    if sell:
+        fees = fees + value * config.stamp_duty
+    return np.where(value > 0, fees, 0.0)
+
+
+def run_backtest(panel: OHLCVPanel, scores: pd.DataFrame,
+                 config: Optional[BacktestConfig] = None) -> BacktestResult:
+    """
+    运行回测
+
+    Args:
+        panel: 行情面板
+        scores: 日期 × 代码 的评分（如 StockAnalyzer.calculate_score_panel 的结果），按面板的日期和代码对齐
+        config: 回测参数
+
+    Returns:
+        BacktestResult
+    """
+    config = config or BacktestConfig()
+    dates = pd.DatetimeIndex(panel.dates, name='date')
+    symbols = pd.Index(panel.symbols, name='symbol')
+    score = scores.reindex(index=dates, columns=symbols).to_numpy(dtype=np.float64)
+    valid = panel.valid_mask()
+    open_ = np.where(valid, panel.fields['open'], np.nan)
+    close = np.where(valid, panel.fields['close'], np.nan)
+
+    with np.errstate(invalid='ignore'):
+        entry_signal = score >= config.entry_score
+        exit_signal = score < config.exit_score
+    # 评分高者优先买入，非买入信号排在最后
+    entry_rank = np.where(entry_signal, -score, np.inf)
+
+    n_dates, n_symbols = close.shape
+    shares = np.zeros(n_symbols, dtype=np.int64)
+    cost = np.zeros(n_symbols)             # 持仓成本（含买入费用）
+    entry_day = np.full(n_symbols, -1, dtype=np.int64)
+    last_close = np.full(n_symbols, np.nan)
+    cash = float(config.initial_cash)
+    equity_prev = cash
+
+    equity = np.empty(n_dates)
+    cash_history = np.empty(n_dates)
+    holdings = np.zeros((n_dates, n_symbols), dtype=np.int64)
+    trades = []
+
+    for t in range(n_dates):
+        price = open_[t]
+        tradable = ~np.isnan(price)
+
+        if t > 0:
+            # 卖出：前一日出现卖出信号、已满足 T+1 且今日有K线
+            sell = (shares > 0) & exit_signal[t - 1] & tradable & (t - entry_day >= config.t_plus)
+            if sell.any():
+                idx = np.flatnonzero(sell)
+                value = shares[idx] * price[idx]
+                fees = _fees(value, config, sell=True)
+                proceeds = value - fees
+                cash += proceeds.sum()
+                trades.append(pd.DataFrame({
+                    'date': dates[t], 'symbol': symbols[idx], 'side': 'sell', 'shares': shares[idx],
+                    'price': price[idx], 'value': value, 'fees': fees, 'pnl': proceeds - cost[idx]
+                }))
+                shares[idx] = 0
+                cost[idx] = 0.0
+                entry_day[idx] = -1
+
+            # 买入：前一日出现买入信号、未持有且今日有K线，按评分从高到低填满空余槽位
+            slots = config.max_positions - int((shares > 0).sum())
+            candidates = (shares == 0) & entry_signal[t - 1] & tradable
+            if slots > 0 and candidates.any():
+                idx = np.flatnonzero(candidates)
+                idx = idx[np.argsort(entry_rank[t - 1, idx], kind='stable')][:slots]
+                budget = equity_prev / config.max_positions
+                lots = np.floor(budget / (price[idx] * (1 + config.commission)) / config.lot_size)
+                buy_shares = lots.astype(np.int64) * config.lot_size
+                value = buy_shares * price[idx]
+                total = value + _fees(value, config, sell=False)
+                # 现金不足时按优先级截断
+                affordable = (np.cumsum(total) <= cash) & (buy_shares > 0)
+                idx, buy_shares, value, total = idx[affordable], buy_shares[affordable], value[affordable], total[affordable]
+                if len(idx):
+                    cash -= total.sum()
+                    shares[idx] = buy_shares
+                    cost[idx] = total
+                    entry_day[idx] = t
+                    trades.append(pd.DataFrame({
+                        'date': dates[t], 'symbol': symbols[idx], 'side': 'buy', 'shares': buy_shares,
+                        'price': price[idx], 'value': value, 'fees': total - value, 'pnl': np.nan
+                    }))
+
+        # 按收盘价（停牌取最近收盘价）计算市值
+        last_close = np.where(np.isnan(close[t]), last_close, close[t])
+        market_value = np.nansum(shares * last_close)
+        equity[t] = cash + market_value
+        cash_history[t] = cash
+        holdings[t] = shares
+        equity_prev = equity[t]
+
+    trade_columns = ['date', 'symbol', 'side', 'shares', 'price', 'value', 'fees', 'pnl']
+    result = BacktestResult(
+        equity=pd.Series(equity, index=dates, name='equity'),
+        cash=pd.Series(cash_history, index=dates, name='cash'),
+        positions=pd.DataFrame(holdings, index=dates, columns=symbols),
+        trades=pd.concat(trades, ignore_index=True) if trades else pd.DataFrame(columns=trade_columns)
+    )
+    result.metrics = performance_metrics(result, config)
+    return result
+
+
+def performance_metrics(result: BacktestResult, config: BacktestConfig) -> Dict:
+    """收益、回撤与换手率指标"""
+    equity = result.equity
+    trades = result.trades
+    if equity.empty:
+        return {}
+    years = len(equity) / TRADING_DAYS
+    total_return = equity.iloc[-1] / config.initial_cash - 1
+    daily = equity.pct_change().dropna()
+    drawdown = equity / equity.cummax() - 1
+    traded_value = trades['value'].sum() if not trades.empty else 0.0
+    sells = trades[trades['side'] == 'sell'] if not trades.empty else trades
+
+    return {
+        'start_date': str(equity.index[0].date()),
+        'end_date': str(equity.index[-1].date()),
+        'final_equity': round(float(equity.iloc[-1]), 2),
+        'total_return': round(float(total_return), 6),
+        'annual_return': round(float((1 + total_return) ** (1 / years) - 1), 6) if years > 0 and total_return > -1 else None,
+        'annual_volatility': round(float(daily.std() * np.sqrt(TRADING_DAYS)), 6) if len(daily) > 1 else None,
+        'sharpe': round(float(daily.mean() / daily.std() * np.sqrt(TRADING_DAYS)), 4) if len(daily) > 1 and daily.std() > 0 else None,
+        'max_drawdown': round(float(drawdown.min()), 6),
+        # 换手率：成交额（买卖双边）/ 平均总资产，按年化
+        'turnover': round(float(traded_value / equity.mean() / years), 4) if years > 0 else None,
+        'trades': int(len(trades)),
+        'fees': round(float(trades['fees'].sum()), 2) if not trades.empty else 0.0,
+        'win_rate': round(float((sells['pnl'] > 0).mean()), 4) if len(sells) else None,
+    }
+
+
+def backtest_frames(frames: Dict[str, pd.DataFrame], analyzer=None,
+                    config: Optional[BacktestConfig] = None) -> BacktestResult:
+    """
+    对 {代码: 行情DataFrame} 计算评分面板并回测
+
+    Args:
+        frames: 行情数据
+        analyzer: 提供 calculate_score_panel 的分析器，默认 StockAnalyzer
+        config: 回测参数，默认使用分析器的 initial_cash
+    """
+    if analyzer is None:
+        from stock_analyzer import StockAnalyzer
+        analyzer = StockAnalyzer()
+    if config is None:
+        config = BacktestConfig(initial_cash=getattr(analyzer, 'initial_cash', BacktestConfig.initial_cash))
+    panel = OHLCVPanel.from_frames(frames)
+    scores = analyzer.calculate_score_panel(frames)
+    return run_backtest(panel, scores, config)
+
+
+def main() -> None:
+    from param_sweep import load_frames
+
+    parser = argparse.ArgumentParser(description='评分规则回测')
+    parser.add_argument('--codes', help='股票代码，逗号分隔；不指定时使用全部A股')
+    parser.add_argument('--start', help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', help='结束日期 YYYYMMDD')
+    parser.add_argument('--cash', type=float, default=BacktestConfig.initial_cash, help='初始资金')
+    parser.add_argument('--entry', type=float, default=BacktestConfig.entry_score, help='买入评分阈值')
+    parser.add_argument('--exit', type=float, default=BacktestConfig.exit_score, help='卖出评分阈值')
+    parser.add_argument('--max-positions', type=int, default=BacktestConfig.max_positions, help='最大持仓数')
+    parser.add_argument('--output', help='每日净值输出路径（CSV）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.codes:
+        codes = [code.strip() for code in args.codes.split(',') if code.strip()]
+    else:
+        from data_provider import create_provider
+        codes = create_provider().get_a_share_codes()
+
+    frames = load_frames(codes, args.start, args.end)
+    config = BacktestConfig(initial_cash=args.cash, entry_score=args.entry, exit_score=args.exit,
+                            max_positions=args.max_positions)
+    result = backtest_frames(frames, config=config)
+
+    for name, value in result.metrics.items():
+        print(f"{name}: {value}")
+    if args.output:
+        result.equity.to_frame().assign(cash=result.cash).to_csv(args.output, encoding='utf-8-sig')
+        print(f"每日净值已保存至 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,19 @@ import json
 from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import logging
+from data_provider import create_provider
+from singleflight import SingleFlight
+from indicator_cache import IndicatorCache, get_indicator_cache
+from indicator_panel import (OHLCVPanel, IndicatorPanel, compute_panel_indicators,
+                             shift, tail_windows, true_range)
+from indicator_kernel import apply_indicator_block
+from indicator_graph import DEFAULT_GRAPH
+
+# 快照模式保留的K线数：打分只读最后两行，AI 分析读取最近14行
+SNAPSHOT_ROWS = 14
+
+# AI 分析与本地分析报告读取的指标
+AI_ANALYSIS_FIELDS = ['MA5', 'MA20', 'RSI', 'MACD', 'Signal', 'MACD_hist', 'Volume_Ratio', 'Volatility']
 
 class BaseAnalyzer:
     """基础分析器，包含共用的技术指标计算逻辑"""
@@ -35,6 +48,15 @@ class BaseAnalyzer:
             'volume_ma_period': 20,
             'atr_period': 14
         }
+        
+        # 行情数据源（由 DATA_SOURCE 环境变量选择，在线数据源带本地增量仓库）
+        self.data_provider = create_provider()
+        
+        # 合并同一标的、同一区间的并发行情请求
+        self._inflight = SingleFlight()
+        
+        # 进程内共享的指标缓存（API、GUI 多个分析器实例共用）
+        self.indicator_cache = get_indicator_cache()
     
     def _setup_logger(self):
         """设置日志记录器"""
@@ -84,53 +106,122 @@ class BaseAnalyzer:
     
     def calculate_atr(self, df, period):
         """计算ATR指标"""
-        high = df['high']
-        low = df['low']
-        close = df['close'].shift(1)
+        tr = true_range(df['high'].to_numpy(dtype=np.float64),
+                        df['low'].to_numpy(dtype=np.float64),
+                        df['close'].to_numpy(dtype=np.float64))
+        return pd.Series(tr, index=df.index).rolling(window=period).mean()
+    
+    def calculate_indicators(self, df):
+        """计算技术指标（融合内核一次性计算全部指标列，返回追加指标列后的 DataFrame）"""
+        try:
+            return apply_indicator_block(df, self.params)
+            
+        except Exception as e:
+            self.logger.error(f"计算技术指标时出错: {str(e)}")
+            raise
+    
+    def calculate_selected_indicators(self, df, outputs, futures_params=None):
+        """
+        只计算指定的指标（及其依赖），返回行情字段加所请求指标列的 DataFrame
         
-        tr1 = high - low
-        tr2 = abs(high - close)
-        tr3 = abs(low - close)
+        Args:
+            outputs: 指标名称列表，可用名称见 DEFAULT_GRAPH.outputs
+            futures_params: 期货参数，计算期货指标时传入
+        """
+        try:
+            return DEFAULT_GRAPH.frame(df, outputs, self.params, futures_params)
+            
+        except Exception as e:
+            self.logger.error(f"计算指定技术指标时出错: {str(e)}")
+            raise
+    
+    def cached_indicators(self, kind, market, symbol, df, compute, params=None):
+        """
+        通过指标缓存计算指标，键为 (类型, 市场, 代码, 最后一根K线, 参数哈希)
         
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        return tr.rolling(window=period).mean()
+        Args:
+            kind: 指标类型，如 'stock'、'futures'，不同计算方式使用不同类型
+            compute: 未命中时调用的计算函数 compute(df)
+            params: 参与哈希的参数，默认为 self.params
+        """
+        key = IndicatorCache.make_key(kind, market, symbol, df, self.params if params is None else params)
+        return self.indicator_cache.get_or_compute(key, lambda: compute(df))
     
-    def calculate_indicators(self, df):
-        """计算技术指标"""
+    def calculate_snapshot_indicators(self, df, rows=SNAPSHOT_ROWS):
+        """
+        快照模式：只计算最后 rows 根K线的技术指标，返回这几行（列与 calculate_indicators 相同）。
+        指数平均以第一根K线为初值，仍需对收盘价完整递推一遍，但只保留末尾结果；
+        滚动类指标只取各自窗口所需的最少K线计算。打分与报告字段与完整计算一致。
+        """
         try:
-            # 计算移动平均线
-            df['MA5'] = self.calculate_ema(df['close'], self.params['ma_periods']['short'])
-            df['MA20'] = self.calculate_ema(df['close'], self.params['ma_periods']['medium'])
-            df['MA60'] = self.calculate_ema(df['close'], self.params['ma_periods']['long'])
+            rows = min(rows, len(df))
+            return self._snapshot_frame(df, rows, self._snapshot_columns(df, rows))
+            
+        except Exception as e:
+            self.logger.error(f"计算快照技术指标时出错: {str(e)}")
+            raise
+    
+    def _snapshot_columns(self, df, rows):
+        """计算快照模式下各指标最后 rows 个值"""
+        p = self.params
+        close = df['close'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy(dtype=np.float64)
+        cols = {}
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 移动平均线（完整递推）
+            cols['MA5'] = self.calculate_ema(df['close'], p['ma_periods']['short']).to_numpy()[-rows:]
+            cols['MA20'] = self.calculate_ema(df['close'], p['ma_periods']['medium']).to_numpy()[-rows:]
+            cols['MA60'] = self.calculate_ema(df['close'], p['ma_periods']['long']).to_numpy()[-rows:]
             
-            # 计算RSI
-            df['RSI'] = self.calculate_rsi(df['close'], self.params['rsi_period'])
+            # RSI
+            delta = close - shift(close, 1)
+            gain = np.where(delta > 0, delta, 0.0)
+            loss = np.where(delta < 0, -delta, 0.0)
+            cols['RSI'] = 100 - (100 / (1 + tail_windows(gain, p['rsi_period'], rows).mean(axis=1)
+                                       / tail_windows(loss, p['rsi_period'], rows).mean(axis=1)))
             
-            # 计算MACD
-            df['MACD'], df['Signal'], df['MACD_hist'] = self.calculate_macd(df['close'])
+            # MACD（完整递推）
+            macd, signal, hist = self.calculate_macd(df['close'])
+            cols['MACD'] = macd.to_numpy()[-rows:]
+            cols['Signal'] = signal.to_numpy()[-rows:]
+            cols['MACD_hist'] = hist.to_numpy()[-rows:]
             
-            # 计算布林带
-            df['BB_upper'], df['BB_middle'], df['BB_lower'] = self.calculate_bollinger_bands(
-                df['close'],
-                self.params['bollinger_period'],
-                self.params['bollinger_std']
-            )
+            # 布林带
+            windows = tail_windows(close, p['bollinger_period'], rows)
+            middle = windows.mean(axis=1)
+            std = windows.std(axis=1, ddof=1)
+            cols['BB_upper'] = middle + (std * p['bollinger_std'])
+            cols['BB_middle'] = middle
+            cols['BB_lower'] = middle - (std * p['bollinger_std'])
             
             # 成交量分析
-            df['Volume_MA'] = df['volume'].rolling(window=self.params['volume_ma_period']).mean()
-            df['Volume_Ratio'] = df['volume'] / df['Volume_MA']
+            cols['Volume_MA'] = tail_windows(volume, p['volume_ma_period'], rows).mean(axis=1)
+            cols['Volume_Ratio'] = volume[-rows:] / cols['Volume_MA']
             
-            # 计算ATR和波动率
-            df['ATR'] = self.calculate_atr(df, self.params['atr_period'])
-            df['Volatility'] = df['ATR'] / df['close'] * 100
+            # ATR和波动率
+            tr = true_range(df['high'].to_numpy(dtype=np.float64), df['low'].to_numpy(dtype=np.float64), close)
+            cols['ATR'] = tail_windows(tr, p['atr_period'], rows).mean(axis=1)
+            cols['Volatility'] = cols['ATR'] / close[-rows:] * 100
             
             # 动量指标
-            df['ROC'] = df['close'].pct_change(periods=10) * 100
-            
-            return df
+            cols['ROC'] = (close[-rows:] / shift(close, 10)[-rows:] - 1) * 100
+        
+        return cols
+    
+    def _snapshot_frame(self, df, rows, cols):
+        """把原始行情的最后 rows 行与快照指标组装为 DataFrame"""
+        data = {name: df[name].to_numpy()[-rows:] for name in df.columns}
+        data.update(cols)
+        return pd.DataFrame(data, index=df.index[-rows:])
+    
+    def calculate_panel_indicators(self, frames: Dict[str, pd.DataFrame]) -> IndicatorPanel:
+        """批量计算多只标的的技术指标，panel.frame(code) 与 calculate_indicators 的结果一致"""
+        try:
+            return compute_panel_indicators(OHLCVPanel.from_frames(frames), self.params)
             
         except Exception as e:
-            self.logger.error(f"计算技术指标时出错: {str(e)}")
+            self.logger.error(f"批量计算技术指标时出错: {str(e)}")
             raise
     
     def get_ai_analysis(self, df, code, market_type='stock'):
@@ -0,0 +1,245 @@
+"""
+熔断与退避重试
+  - CircuitBreaker：按上游数据源划分的熔断器（关闭 -> 打开 -> 半开 -> 关闭）。
+    连续失败达到阈值后打开，打开期间请求直接失败（CircuitOpenError），不再打到已经不可用的上游；
+    冷却时间过后进入半开状态，放行一个探测请求，成功则恢复，失败则重新打开。
+  - backoff_delay：带随机抖动的指数退避（full jitter）。
+  - RetryBudget：全局重试预算，重试次数不超过首次请求数的一定比例，上游整体故障时不会成倍放大请求量。
+只有网络类的临时错误（连接、超时、上游返回无法解析的内容等）计入熔断和重试，数据本身的问题不计入。
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# 熔断器状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 默认连续失败阈值与冷却时间（秒）
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIMEOUT = 30.0
+
+# 默认重试预算：重试次数不超过首次请求数的 20% 加 10 次
+DEFAULT_RETRY_RATIO = 0.2
+DEFAULT_MIN_RETRIES = 10
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断器打开，请求未发出"""
+
+    def __init__(self, source: str, retry_after: float):
+        super().__init__(f"数据源 {source} 已熔断，{retry_after:.1f} 秒后重试")
+        self.source = source
+        self.retry_after = retry_after
+
+
+class DataUnavailableError(ValueError):
+    """数据不足或数据本身有问题（不是上游临时错误），重试无意义，扫描时记为跳过"""
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """是否为可重试的上游临时错误（网络、超时、熔断、上游返回无法解析的内容）"""
+    return isinstance(e, (OSError, json.JSONDecodeError))
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0,
+                  rng: Optional[random.Random] = None) -> float:
+    """
+    第 attempt 次重试（从0开始）前的等待时间：在 [0, min(cap, base*2^attempt)] 中均匀随机，
+    避免大量线程在同一时刻重试。
+    """
+    return (rng or random).uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """单个上游数据源的熔断器"""
+
+    def __init__(self, source: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = DEFAULT_RECOVERY_TIMEOUT):
+        """
+        Args:
+            source: 数据源名称
+            failure_threshold: 连续失败多少次后打开
+            recovery_timeout: 打开后经过多少秒进入半开状态
+        """
+        self.source = source
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def before_call(self) -> None:
+        """请求前调用：熔断打开或半开探测进行中时抛出 CircuitOpenError"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            if state == OPEN:
+                retry_after = self.recovery_timeout - (time.monotonic() - self._opened_at)
+            else:
+                retry_after = min(1.0, self.recovery_timeout)
+            raise CircuitOpenError(self.source, max(retry_after, 0.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                self.logger.info(f"数据源 {self.source} 已恢复，熔断关闭")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                    self.logger.warning(f"数据源 {self.source} 连续失败 {self._failures} 次，"
+                                        f"熔断 {self.recovery_timeout:.0f} 秒")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self) -> None:
+        """半开探测未得到结果时释放探测名额，允许下一次请求重新探测"""
+        with self._lock:
+            self._probing = False
+
+    @contextmanager
+    def guard(self):
+        """包裹一次上游请求：熔断时不发出请求，按结果更新状态（非临时错误视为上游可用）"""
+        self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if is_transient_error(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            # 被中断（KeyboardInterrupt、线程取消等）的请求不计成功或失败，但要释放半开探测名额
+            self.release_probe()
+            raise
+        else:
+            self.record_success()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'failures': self._failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
+
+
+class BreakerRegistry:
+    """按数据源名称共享的熔断器集合"""
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = DEFAULT_RECOVERY_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'BreakerRegistry':
+        """从环境变量 CIRCUIT_BREAKER=连续失败阈值:冷却秒数（如 5:30）创建"""
+        value = os.getenv('CIRCUIT_BREAKER', '')
+        if not value:
+            return cls()
+        threshold, _, timeout = value.partition(':')
+        return cls(int(threshold), float(timeout) if timeout else DEFAULT_RECOVERY_TIMEOUT)
+
+    def get(self, source: str) -> CircuitBreaker:
+        with self._lock:
+            if source not in self._breakers:
+                self._breakers[source] = CircuitBreaker(source, self.failure_threshold, self.recovery_timeout)
+            return self._breakers[source]
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {source: breaker.stats() for source, breaker in breakers.items()}
+
+
+class RetryBudget:
+    """全局重试预算：重试次数 ≤ min_retries + ratio × 首次请求数"""
+
+    def __init__(self, ratio: float = DEFAULT_RETRY_RATIO, min_retries: int = DEFAULT_MIN_RETRIES):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+
+    @classmethod
+    def from_env(cls) -> 'RetryBudget':
+        """从环境变量 RETRY_BUDGET=比例:最少次数（如 0.2:10）创建"""
+        value = os.getenv('RETRY_BUDGET', '')
+        if not value:
+            return cls()
+        ratio, _, minimum = value.partition(':')
+        return cls(float(ratio), int(minimum) if minimum else DEFAULT_MIN_RETRIES)
+
+    def record_request(self) -> None:
+        """记录一次首次请求"""
+        with self._lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        """申请一次重试，预算不足时返回 False"""
+        with self._lock:
+            if self.retries < self.min_retries + self.ratio * self.requests:
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'requests': self.requests, 'retries': self.retries, 'denied': self.denied}
+
+
+_default_registry: Optional[BreakerRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_breakers() -> BreakerRegistry:
+    """获取进程内共享的熔断器集合，首次调用时从环境变量创建"""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = BreakerRegistry.from_env()
+        return _default_registry
@@ -0,0 +1,589 @@
+"""
+行情数据源
+统一的数据源接口，包含 akshare 实现、本地仓库缓存包装、以及离线回放实现。
+回放数据源读取录制好的行情文件，可配置延迟和错误注入，用于无网络环境下的压测和数据源对比。
+"""
+
+import os
+import time
+import random
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_store import OHLCVStore
+from rate_limiter import FetchScheduler, get_scheduler, upstream_call
+from circuit_breaker import BreakerRegistry, get_breakers
+
+# 标准化后的行情字段
+OHLCV_COLUMNS = ['open', 'close', 'high', 'low', 'volume']
+FUTURES_COLUMNS = OHLCV_COLUMNS + ['open_interest']
+# 全市场实时快照字段：最新价、涨跌幅(%)、成交量、成交额(元)、换手率(%)、上市日期；停牌股最新价为空
+SPOT_COLUMNS = ['code', 'name', 'price', 'change_pct', 'volume', 'amount', 'turnover', 'listing_date']
+# 请求全部历史行情时使用的开始日期（早于所有标的的上市日期）
+FULL_HISTORY_START = '19900101'
+
+# akshare 接口对应的上游数据源，同一数据源共享限流额度
+AKSHARE_SOURCES = {
+    'stock_zh_a_hist': 'eastmoney',
+    'stock_zh_a_spot_em': 'eastmoney',
+    'stock_hk_spot_em': 'eastmoney',
+    'stock_us_daily': 'sina',
+    'stock_hk_daily': 'sina',
+    'futures_main_sina': 'sina',
+    'futures_zh_spot': 'sina',
+    'futures_global_commodity_hist': 'global_futures',
+    'stock_us_fundamental': 'us_fundamental',
+    'stock_info_a_code_name': 'exchange',
+    'stock_info_sh_name_code': 'exchange',
+    'stock_info_sz_name_code': 'exchange',
+}
+
+# 默认回放数据目录
+DEFAULT_REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'replay')
+
+
+def normalize_ohlcv(df: pd.DataFrame, start_date: str, end_date: str,
+                    numeric_columns: List[str] = OHLCV_COLUMNS,
+                    dropna_columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    标准化行情数据：校验字段、转换类型、去除空值、按区间截取并按日期排序
+
+    Args:
+        df: 已完成列名映射的原始数据
+        start_date: 开始日期(格式YYYYMMDD)
+        end_date: 结束日期(格式YYYYMMDD)
+        numeric_columns: 需要转换为数值的字段
+        dropna_columns: 存在空值即删除该行的字段，默认为日期和全部数值字段
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['date'] + numeric_columns)
+
+    required_columns = {'date'} | set(numeric_columns)
+    missing_columns = required_columns - set(df.columns)
+    if missing_columns:
+        raise ValueError(f"缺失必须字段: {missing_columns}")
+
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+    df = df.dropna(subset=dropna_columns or ['date'] + numeric_columns)
+    df = df[(df['date'] >= pd.Timestamp(start_date)) & (df['date'] <= pd.Timestamp(end_date))]
+    return df.sort_values('date').reset_index(drop=True)
+
+
+class MarketDataProvider:
+    """行情数据源接口
+
+    所有历史行情方法返回标准化的 DataFrame（date + OHLCV 字段，按日期升序），
+    列表方法返回包含 code/name 两列的 DataFrame，实时快照返回 SPOT_COLUMNS 字段。
+    """
+
+    name = 'base'
+
+    def get_stock_history(self, code: str, market: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """获取股票日线（前复权）"""
+        raise NotImplementedError
+
+    def get_futures_history(self, symbol: str, market: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """获取期货主力合约日线"""
+        raise NotImplementedError
+
+    def get_stock_list(self, market: str) -> pd.DataFrame:
+        """获取市场股票列表（code, name）"""
+        raise NotImplementedError
+
+    def get_futures_list(self, market: str) -> pd.DataFrame:
+        """获取期货合约列表（code, name）"""
+        raise NotImplementedError
+
+    def get_a_share_codes(self) -> List[str]:
+        """获取沪深交易所上市的全部A股代码（6位，已排序）"""
+        raise NotImplementedError
+
+    def get_spot_snapshot(self, market: str) -> pd.DataFrame:
+        """一次请求获取全市场实时快照（SPOT_COLUMNS），用于扫描前的廉价预筛"""
+        raise NotImplementedError
+
+
+def normalize_spot(df: pd.DataFrame) -> pd.DataFrame:
+    """标准化实时快照：补齐缺失字段、转换类型，代码补足6位"""
+    df = df.copy()
+    for column in SPOT_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    df['code'] = df['code'].astype(str).str.zfill(6)
+    numeric = ['price', 'change_pct', 'volume', 'amount', 'turnover']
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors='coerce')
+    df['listing_date'] = pd.to_datetime(df['listing_date'], errors='coerce')
+    return df[SPOT_COLUMNS].drop_duplicates('code').reset_index(drop=True)
+
+
+def _pick_column(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
+    return next((col for col in candidates if col in df.columns), None)
+
+
+class AkshareProvider(MarketDataProvider):
+    """基于 akshare 的在线数据源"""
+
+    name = 'akshare'
+
+    def __init__(self, scheduler: Optional[FetchScheduler] = None,
+                 breakers: Optional[BreakerRegistry] = None):
+        """
+        Args:
+            scheduler: 请求调度器，默认使用进程内共享的调度器
+            breakers: 熔断器集合，默认使用进程内共享的熔断器
+        """
+        self.logger = logging.getLogger(__name__)
+        self.scheduler = scheduler or get_scheduler()
+        self.breakers = breakers or get_breakers()
+
+    def _call(self, func_name: str, **kwargs):
+        """按接口所属数据源检查熔断、获取令牌后调用 akshare 接口"""
+        import akshare as ak
+
+        source = AKSHARE_SOURCES.get(func_name, 'akshare')
+        with self.breakers.get(source).guard():
+            self.scheduler.acquire(source)
+            with upstream_call():
+                return getattr(ak, func_name)(**kwargs)
+
+    def get_stock_history(self, code, market, start_date, end_date):
+        if market == 'A':
+            df = self._call('stock_zh_a_hist', symbol=code, start_date=start_date, end_date=end_date, adjust="qfq")
+            df = df.rename(columns={
+                "日期": "date",
+                "开盘": "open",
+                "收盘": "close",
+                "最高": "high",
+                "最低": "low",
+                "成交量": "volume",
+                "trade_date": "date"
+            })
+        elif market == 'US':
+            # 接口返回全部历史，按区间截取
+            df = self._call('stock_us_daily', symbol=code, adjust="qfq")
+        elif market == 'HK':
+            # 接口返回全部历史，按区间截取
+            df = self._call('stock_hk_daily', symbol=code, adjust="qfq")
+        else:
+            raise ValueError(f"不支持的市场类型: {market}")
+
+        self.logger.debug(f"获取到 {len(df)} 行数据，列名：{df.columns.tolist()}")
+        return normalize_ohlcv(df, start_date, end_date)
+
+    def get_futures_history(self, symbol, market, start_date, end_date):
+        if market == 'CN':
+            df = self._call('futures_main_sina', symbol=symbol, start_date=start_date, end_date=end_date)
+            df = df.rename(columns={
+                "日期": "date",
+                "开盘价": "open",
+                "收盘价": "close",
+                "最高价": "high",
+                "最低价": "low",
+                "成交量": "volume",
+                "持仓量": "open_interest"
+            })
+        elif market == 'GLOBAL':
+            # 接口返回全部历史，按区间截取
+            df = self._call('futures_global_commodity_hist', symbol=symbol)
+            # 国际期货可能没有持仓量数据，添加空列
+            if not df.empty and 'open_interest' not in df.columns:
+                df['open_interest'] = np.nan
+        else:
+            raise ValueError(f"不支持的市场类型: {market}")
+
+        return normalize_ohlcv(df, start_date, end_date, FUTURES_COLUMNS, dropna_columns=['date', 'close', 'volume'])
+
+    def get_stock_list(self, market):
+        if market == 'A':
+            df = self._call('stock_info_a_code_name')
+        elif market == 'US':
+            df = self._call('stock_us_fundamental').rename(columns={'symbol': 'code', 'cname': 'name'})
+        elif market == 'HK':
+            df = self._call('stock_hk_spot_em').rename(columns={'代码': 'code', '名称': 'name'})
+        else:
+            raise ValueError(f"不支持的市场类型: {market}")
+        return df[['code', 'name']]
+
+    def get_futures_list(self, market):
+        if market != 'CN':
+            raise ValueError(f"不支持的市场类型: {market}")
+        df = self._call('futures_zh_spot')
+        return df.rename(columns={'symbol': 'code'})[['code', 'name']]
+
+    def _exchange_lists(self) -> pd.DataFrame:
+        """沪深交易所上市股票列表（code, listing_date）"""
+        frames = []
+        for df in (self._call('stock_info_sh_name_code', symbol="主板A股"),
+                   self._call('stock_info_sz_name_code', symbol="A股列表")):
+            code_col = _pick_column(df, ['A股代码', '证券代码', '股票代码', 'code'])
+            if code_col is None:
+                raise KeyError(f"未能找到股票代码字段，现有字段：{df.columns.tolist()}")
+            date_col = _pick_column(df, ['A股上市日期', '上市日期'])
+            frames.append(pd.DataFrame({
+                'code': df[code_col].astype(str).str.zfill(6),
+                'listing_date': df[date_col].values if date_col else None
+            }))
+        return pd.concat(frames, ignore_index=True).drop_duplicates('code')
+
+    def get_a_share_codes(self):
+        return sorted(self._exchange_lists()['code'])
+
+    def get_spot_snapshot(self, market):
+        if market != 'A':
+            raise ValueError(f"不支持的市场类型: {market}")
+        df = self._call('stock_zh_a_spot_em').rename(columns={
+            '代码': 'code', '名称': 'name', '最新价': 'price', '涨跌幅': 'change_pct',
+            '成交量': 'volume', '成交额': 'amount', '换手率': 'turnover'
+        })
+        df['code'] = df['code'].astype(str).str.zfill(6)
+        # 快照不含上市日期，从交易所列表补充；列表获取失败时不按上市时间筛选
+        try:
+            df = df.merge(self._exchange_lists(), on='code', how='left')
+        except Exception as e:
+            self.logger.warning(f"获取上市日期失败，快照不含上市日期：{str(e)}")
+        return normalize_spot(df)
+
+
+class CachedProvider(MarketDataProvider):
+    """在任意数据源前增加本地行情仓库，历史行情只增量请求"""
+
+    def __init__(self, inner: MarketDataProvider, store: Optional[OHLCVStore] = None):
+        self.inner = inner
+        self.store = store or OHLCVStore()
+        self.name = inner.name
+
+    def get_stock_history(self, code, market, start_date, end_date):
+        return self.store.get(
+            f'stock_{market}', code, start_date, end_date,
+            lambda start, end: self.inner.get_stock_history(code, market, start, end)
+        )
+
+    def get_futures_history(self, symbol, market, start_date, end_date):
+        return self.store.get(
+            f'futures_{market}', symbol, start_date, end_date,
+            lambda start, end: self.inner.get_futures_history(symbol, market, start, end)
+        )
+
+    def get_stock_list(self, market):
+        return self.inner.get_stock_list(market)
+
+    def get_futures_list(self, market):
+        return self.inner.get_futures_list(market)
+
+    def get_a_share_codes(self):
+        return self.inner.get_a_share_codes()
+
+    def get_spot_snapshot(self, market):
+        return self.inner.get_spot_snapshot(market)
+
+
+class ReplayError(ConnectionError):
+    """回放数据源注入的模拟网络错误"""
+
+
+class ReplayProvider(MarketDataProvider):
+    """离线回放数据源
+
+    目录结构与 OHLCVStore 一致，因此本地行情仓库目录可以直接回放：
+      {data_dir}/stock_{market}/{code}.parquet
+      {data_dir}/futures_{market}/{symbol}.parquet
+      {data_dir}/lists/stock_{market}.parquet      (code, name)
+      {data_dir}/lists/futures_{market}.parquet    (code, name)
+      {data_dir}/lists/a_share_codes.parquet       (code)
+      {data_dir}/lists/spot_{market}.parquet       (SPOT_COLUMNS)
+    """
+
+    name = 'replay'
+
+    def __init__(self, data_dir: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None,
+                 breakers: Optional[BreakerRegistry] = None):
+        """
+        初始化回放数据源
+
+        Args:
+            data_dir: 录制数据目录
+            latency: 每次请求的固定延迟（秒）
+            jitter: 在固定延迟上叠加的随机延迟上限（秒）
+            error_rate: 每次请求抛出 ReplayError 的概率
+            seed: 随机种子，便于复现压测结果
+            breakers: 熔断器集合，默认使用进程内共享的熔断器（整个回放数据源视为一个上游）
+        """
+        self.data_dir = data_dir or os.getenv('REPLAY_DATA_DIR', DEFAULT_REPLAY_DIR)
+        self.breakers = breakers or get_breakers()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._frames_lock = threading.Lock()
+
+    def _simulate_request(self, what: str) -> None:
+        """模拟网络延迟和错误"""
+        with self.breakers.get(self.name).guard():
+            with self._random_lock:
+                delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+                failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            with upstream_call():
+                if delay > 0:
+                    time.sleep(delay)
+                if failed:
+                    raise ReplayError(f"回放数据源注入错误: {what}")
+
+    def _read(self, *parts: str) -> Optional[pd.DataFrame]:
+        """读取录制文件（parquet 优先，其次 csv），结果在内存中复用"""
+        base = os.path.join(self.data_dir, *parts)
+        with self._frames_lock:
+            if base in self._frames:
+                return self._frames[base]
+        df = None
+        if os.path.exists(f"{base}.parquet"):
+            df = pd.read_parquet(f"{base}.parquet")
+        elif os.path.exists(f"{base}.csv"):
+            df = pd.read_csv(f"{base}.csv", dtype={'code': str})
+        with self._frames_lock:
+            self._frames[base] = df
+        return df
+
+    def get_stock_history(self, code, market, start_date, end_date):
+        self._simulate_request(f"stock_{market}/{code}")
+        return normalize_ohlcv(self._read(f'stock_{market}', code), start_date, end_date)
+
+    def get_futures_history(self, symbol, market, start_date, end_date):
+        self._simulate_request(f"futures_{market}/{symbol}")
+        return normalize_ohlcv(self._read(f'futures_{market}', symbol), start_date, end_date,
+                               FUTURES_COLUMNS, dropna_columns=['date', 'close', 'volume'])
+
+    def get_stock_list(self, market):
+        self._simulate_request(f"lists/stock_{market}")
+        df = self._read('lists', f'stock_{market}')
+        if df is None:
+            # 没有录制列表时，以已录制的行情文件作为股票列表
+            codes = self._recorded_symbols(f'stock_{market}')
+            df = pd.DataFrame({'code': codes, 'name': None})
+        return df
+
+    def get_futures_list(self, market):
+        self._simulate_request(f"lists/futures_{market}")
+        df = self._read('lists', f'futures_{market}')
+        if df is None:
+            symbols = self._recorded_symbols(f'futures_{market}')
+            df = pd.DataFrame({'code': symbols, 'name': None})
+        return df
+
+    def get_a_share_codes(self):
+        self._simulate_request("lists/a_share_codes")
+        df = self._read('lists', 'a_share_codes')
+        if df is None:
+            return sorted(self._recorded_symbols('stock_A'))
+        return sorted(str(code).zfill(6) for code in df['code'])
+
+    def get_spot_snapshot(self, market):
+        self._simulate_request(f"lists/spot_{market}")
+        df = self._read('lists', f'spot_{market}')
+        if df is None:
+            df = self._derive_spot(market)
+        return normalize_spot(df)
+
+    def _derive_spot(self, market: str) -> pd.DataFrame:
+        """没有录制快照时，以各行情文件的最后一根K线作为快照，第一根K线的日期作为上市日期"""
+        rows = []
+        for code in self._recorded_symbols(f'stock_{market}'):
+            df = self._read(f'stock_{market}', code)
+            if df is None or df.empty:
+                continue
+            df = df.sort_values('date')
+            last = df.iloc[-1]
+            prev_close = df['close'].iloc[-2] if len(df) > 1 else np.nan
+            rows.append({
+                'code': code, 'price': last['close'],
+                'change_pct': (last['close'] - prev_close) / prev_close * 100,
+                'volume': last['volume'], 'amount': last['close'] * last['volume'],
+                'listing_date': df['date'].iloc[0]
+            })
+        spot = pd.DataFrame(rows, columns=['code', 'price', 'change_pct', 'volume', 'amount', 'listing_date'])
+        names = self._read('lists', f'stock_{market}')
+        if names is not None:
+            spot = spot.merge(names[['code', 'name']].astype({'code': str}), on='code', how='left')
+        return spot
+
+    def _recorded_symbols(self, namespace: str) -> List[str]:
+        """列出某个命名空间下已录制的代码"""
+        directory = os.path.join(self.data_dir, namespace)
+        if not os.path.isdir(directory):
+            return []
+        return sorted({os.path.splitext(name)[0] for name in os.listdir(directory)
+                       if name.endswith(('.parquet', '.csv'))})
+
+
+class RecordingProvider(MarketDataProvider):
+    """录制数据源：透传请求并把结果写成 ReplayProvider 可读取的文件"""
+
+    def __init__(self, inner: MarketDataProvider, data_dir: Optional[str] = None):
+        self.inner = inner
+        self.data_dir = data_dir or os.getenv('REPLAY_DATA_DIR', DEFAULT_REPLAY_DIR)
+        self.name = inner.name
+        self._lock = threading.Lock()
+
+    def _write(self, df: pd.DataFrame, *parts: str, merge_on: Optional[str] = None) -> None:
+        """写入录制文件，行情数据与已有录制按日期合并"""
+        path = os.path.join(self.data_dir, *parts) + '.parquet'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            if merge_on and os.path.exists(path):
+                df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+                df = df.drop_duplicates(subset=merge_on, keep='last').sort_values(merge_on)
+            df.to_parquet(path, index=False)
+
+    def get_stock_history(self, code, market, start_date, end_date):
+        df = self.inner.get_stock_history(code, market, start_date, end_date)
+        self._write(df, f'stock_{market}', code, merge_on='date')
+        return df
+
+    def get_futures_history(self, symbol, market, start_date, end_date):
+        df = self.inner.get_futures_history(symbol, market, start_date, end_date)
+        self._write(df, f'futures_{market}', symbol, merge_on='date')
+        return df
+
+    def get_stock_list(self, market):
+        df = self.inner.get_stock_list(market)
+        self._write(df, 'lists', f'stock_{market}')
+        return df
+
+    def get_futures_list(self, market):
+        df = self.inner.get_futures_list(market)
+        self._write(df, 'lists', f'futures_{market}')
+        return df
+
+    def get_a_share_codes(self):
+        codes = self.inner.get_a_share_codes()
+        self._write(pd.DataFrame({'code': codes}), 'lists', 'a_share_codes')
+        return codes
+
+    def get_spot_snapshot(self, market):
+        df = self.inner.get_spot_snapshot(market)
+        self._write(df, 'lists', f'spot_{market}')
+        return df
+
+
+def create_provider(name: Optional[str] = None) -> MarketDataProvider:
+    """
+    按名称创建数据源，默认读取环境变量 DATA_SOURCE
+
+    - akshare: 在线数据源，启用本地行情仓库时外层包装 CachedProvider
+    - replay:  离线回放数据源，读取 REPLAY_DATA_DIR / REPLAY_LATENCY_MS /
+               REPLAY_JITTER_MS / REPLAY_ERROR_RATE / REPLAY_SEED
+    """
+    name = (name or os.getenv('DATA_SOURCE', 'akshare')).lower()
+    if name == 'akshare':
+        store = OHLCVStore()
+        provider = AkshareProvider()
+        return CachedProvider(provider, store) if store.enabled else provider
+    if name == 'replay':
+        seed = os.getenv('REPLAY_SEED')
+        return ReplayProvider(
+            latency=float(os.getenv('REPLAY_LATENCY_MS', 0)) / 1000,
+            jitter=float(os.getenv('REPLAY_JITTER_MS', 0)) / 1000,
+            error_rate=float(os.getenv('REPLAY_ERROR_RATE', 0)),
+            seed=int(seed) if seed else None
+        )
+    raise ValueError(f"不支持的数据源: {name}")
+
+
+def benchmark_provider(provider: MarketDataProvider, symbols: List[str], market: str = 'A',
+                       start_date: str = FULL_HISTORY_START, end_date: str = '22220101',
+                       workers: int = 8) -> Dict:
+    """
+    用多线程拉取一组股票的历史行情，统计数据源吞吐量
+
+    Returns:
+        包含请求数、失败数、总耗时、每秒请求数和延迟分位数的字典
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def fetch(code):
+        nonlocal errors
+        begin = time.perf_counter()
+        try:
+            provider.get_stock_history(code, market, start_date, end_date)
+            ok = True
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - begin
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, symbols))
+    total = time.perf_counter() - begin
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'provider': provider.name,
+        'requests': len(symbols),
+        'errors': errors,
+        'elapsed': total,
+        'requests_per_second': len(symbols) / total if total > 0 else 0.0,
+        'latency_p50': float(np.percentile(lat, 50)),
+        'latency_p95': float(np.percentile(lat, 95))
+    }
+
+
+def main():
+    """命令行入口：录制行情数据或对数据源进行吞吐量测试"""
+    parser = argparse.ArgumentParser(description="行情数据源录制与压测工具")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help="从在线数据源录制行情到回放目录")
+    record.add_argument('--market', default='A')
+    record.add_argument('--symbols', help="逗号分隔的代码，不指定时录制整个市场")
+    record.add_argument('--start', default=None, help="开始日期 YYYYMMDD，默认一年前")
+    record.add_argument('--end', default=time.strftime('%Y%m%d'))
+    record.add_argument('--data-dir', default=None)
+
+    bench = sub.add_parser('bench', help="测试数据源吞吐量")
+    bench.add_argument('--provider', default=None, help="akshare 或 replay，默认读取 DATA_SOURCE")
+    bench.add_argument('--market', default='A')
+    bench.add_argument('--symbols', help="逗号分隔的代码，不指定时使用数据源的股票列表")
+    bench.add_argument('--workers', type=int, default=8)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'record':
+        start = args.start or (pd.Timestamp.now() - pd.Timedelta(days=365)).strftime('%Y%m%d')
+        provider = RecordingProvider(AkshareProvider(), args.data_dir)
+        codes = args.symbols.split(',') if args.symbols else provider.get_stock_list(args.market)['code'].tolist()
+        if args.market == 'A' and not args.symbols:
+            provider.get_a_share_codes()
+            provider.get_spot_snapshot(args.market)
+        for code in codes:
+            try:
+                provider.get_stock_history(code, args.market, start, args.end)
+            except Exception as e:
+                logging.warning(f"录制 {code} 失败: {str(e)}")
+        print(f"已录制 {len(codes)} 支股票到 {provider.data_dir}")
+    else:
+        provider = create_provider(args.provider)
+        codes = args.symbols.split(',') if args.symbols else provider.get_stock_list(args.market)['code'].tolist()
+        stats = benchmark_provider(provider, codes, args.market, workers=args.workers)
+        for key, value in stats.items():
+            print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
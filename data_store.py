@@ -0,0 +1,212 @@
+"""
+本地OHLCV数据仓库
+按 命名空间(市场) / 代码 分区，以Parquet格式保存历史行情。
+已有的数据直接复用，只向数据源请求最后一根K线之后的增量部分。
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import importlib.util
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+# 默认仓库目录，与股票名称缓存共用 cache 目录
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ohlcv')
+
+# 前复权价格在除权除息后会整体调整，重叠K线收盘价的相对误差超过该值时视为复权基准变化
+ADJUSTMENT_TOLERANCE = 1e-6
+
+
+class OHLCVStore:
+    """增量式OHLCV本地仓库
+
+    每个分区由两个文件组成：
+      - {symbol}.parquet  行情数据，按日期升序
+      - {symbol}.json     覆盖区间元数据 {'start', 'end', 'updated_at'}
+
+    覆盖区间记录的是已经向数据源请求过的日期范围（而不是K线日期），
+    这样节假日、停牌或新股上市前的空白不会导致重复请求。
+    """
+
+    def __init__(self, store_dir: Optional[str] = None, enabled: Optional[bool] = None,
+                 intraday_ttl: Optional[int] = None):
+        """
+        初始化数据仓库
+
+        Args:
+            store_dir: 仓库目录，默认读取环境变量 OHLCV_STORE_DIR
+            enabled: 是否启用，默认读取环境变量 OHLCV_STORE_ENABLED
+            intraday_ttl: 覆盖到当天的数据在多少秒内视为最新，默认读取 CACHE_EXPIRY
+        """
+        self.logger = logging.getLogger(__name__)
+        self.store_dir = store_dir or os.getenv('OHLCV_STORE_DIR', DEFAULT_STORE_DIR)
+        if enabled is None:
+            enabled = os.getenv('OHLCV_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
+        if intraday_ttl is None:
+            intraday_ttl = int(os.getenv('CACHE_EXPIRY', 3600))
+        self.intraday_ttl = intraday_ttl
+
+        self.enabled = enabled
+        if self.enabled and not self._parquet_available():
+            self.logger.warning("未安装 pyarrow 或 fastparquet，本地行情仓库已禁用")
+            self.enabled = False
+
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    @staticmethod
+    def _parquet_available() -> bool:
+        """检查Parquet读写引擎是否可用"""
+        return any(importlib.util.find_spec(name) is not None for name in ('pyarrow', 'fastparquet'))
+
+    def _lock_for(self, namespace: str, symbol: str) -> threading.Lock:
+        """获取分区锁，同一分区的读写串行执行"""
+        key = (namespace, symbol)
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _paths(self, namespace: str, symbol: str) -> Tuple[str, str]:
+        """返回分区的数据文件和元数据文件路径"""
+        safe_symbol = str(symbol).replace(os.sep, '_').replace('/', '_')
+        base = os.path.join(self.store_dir, namespace, safe_symbol)
+        return f"{base}.parquet", f"{base}.json"
+
+    def load(self, namespace: str, symbol: str) -> Tuple[Optional[pd.DataFrame], Optional[Dict]]:
+        """读取分区，不存在或损坏时返回 (None, None)"""
+        data_path, meta_path = self._paths(namespace, symbol)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None, None
+        try:
+            df = pd.read_parquet(data_path)
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return df, meta
+        except Exception as e:
+            self.logger.warning(f"读取本地行情分区失败 {namespace}/{symbol}: {str(e)}")
+            return None, None
+
+    def save(self, namespace: str, symbol: str, df: pd.DataFrame, start_date: str, end_date: str) -> None:
+        """原子写入分区，先写数据再写元数据"""
+        data_path, meta_path = self._paths(namespace, symbol)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        meta = {
+            'start': start_date,
+            'end': end_date,
+            'updated_at': time.time()
+        }
+        try:
+            tmp_data = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            df.to_parquet(tmp_data, index=False)
+            os.replace(tmp_data, data_path)
+
+            tmp_meta = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+        except Exception as e:
+            self.logger.warning(f"写入本地行情分区失败 {namespace}/{symbol}: {str(e)}")
+
+    def get(self, namespace: str, symbol: str, start_date: str, end_date: str,
+            fetch: Callable[[str, str], pd.DataFrame]) -> pd.DataFrame:
+        """
+        获取 [start_date, end_date] 区间的行情，必要时通过 fetch 补齐缺失部分。
+
+        Args:
+            namespace: 分区命名空间，例如 'stock_A'、'futures_CN'
+            symbol: 代码
+            start_date: 开始日期(格式YYYYMMDD)
+            end_date: 结束日期(格式YYYYMMDD)
+            fetch: 数据源请求函数 fetch(start_date, end_date)，返回包含 date 列的标准化 DataFrame
+
+        Returns:
+            按日期升序排列的 DataFrame
+        """
+        if not self.enabled:
+            return fetch(start_date, end_date)
+
+        with self._lock_for(namespace, symbol):
+            stored, meta = self.load(namespace, symbol)
+            if stored is None or stored.empty:
+                df = self._normalize(fetch(start_date, end_date))
+                self.save(namespace, symbol, df, start_date, end_date)
+                return self._slice(df, start_date, end_date)
+
+            cov_start = meta['start']
+            cov_end = meta['end']
+            frames = [stored]
+            new_start = min(cov_start, start_date)
+            new_end = max(cov_end, end_date)
+
+            # 向前补齐
+            if start_date < cov_start:
+                self.logger.info(f"补齐历史行情 {namespace}/{symbol}: {start_date} - {cov_start}")
+                frames.insert(0, fetch(start_date, self._shift_day(cov_start, -1)))
+
+            # 向后增量，从最后一根已定型的K线开始请求以校验复权基准；
+            # 信任区间之后的K线（盘中未收盘的K线）不参与校验，由新数据覆盖
+            trusted_end = self._trusted_end(meta)
+            if end_date > trusted_end:
+                settled = stored.loc[stored['date'] <= pd.Timestamp(trusted_end)]
+                if settled.empty:
+                    delta = fetch(stored['date'].iloc[0].strftime('%Y%m%d'), end_date)
+                else:
+                    delta = fetch(settled['date'].iloc[-1].strftime('%Y%m%d'), end_date)
+                if self._adjustment_changed(settled, delta):
+                    self.logger.info(f"检测到复权基准变化，重新获取完整行情 {namespace}/{symbol}")
+                    frames = [fetch(new_start, new_end)]
+                else:
+                    frames[-1] = settled
+                    frames.append(delta)
+            elif len(frames) == 1:
+                return self._slice(stored, start_date, end_date)
+
+            merged = self._normalize(pd.concat([f for f in frames if f is not None and not f.empty],
+                                               ignore_index=True))
+            self.save(namespace, symbol, merged, new_start, new_end)
+            return self._slice(merged, start_date, end_date)
+
+    def _trusted_end(self, meta: Dict) -> str:
+        """覆盖到当天的数据超过有效期后，只信任到前一天"""
+        today = datetime.now().strftime('%Y%m%d')
+        if meta['end'] >= today and time.time() - meta.get('updated_at', 0) > self.intraday_ttl:
+            return self._shift_day(today, -1)
+        return meta['end']
+
+    @staticmethod
+    def _adjustment_changed(stored: pd.DataFrame, delta: Optional[pd.DataFrame]) -> bool:
+        """比较重叠K线的收盘价，判断前复权基准是否发生变化"""
+        if delta is None or delta.empty or 'close' not in delta.columns:
+            return False
+        overlap = stored[['date', 'close']].merge(delta[['date', 'close']], on='date', suffixes=('_old', '_new'))
+        if overlap.empty:
+            return False
+        diff = (overlap['close_new'] - overlap['close_old']).abs() / overlap['close_old'].abs().clip(lower=1e-12)
+        return bool((diff > ADJUSTMENT_TOLERANCE).any())
+
+    @staticmethod
+    def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+        """去重并按日期排序"""
+        if df is None or df.empty:
+            return df
+        df = df.drop_duplicates(subset='date', keep='last')
+        return df.sort_values('date').reset_index(drop=True)
+
+    @staticmethod
+    def _slice(df: pd.DataFrame, start_date: str, end_date: str) -> pd.DataFrame:
+        """截取请求区间"""
+        if df is None or df.empty:
+            return df
+        mask = (df['date'] >= pd.Timestamp(start_date)) & (df['date'] <= pd.Timestamp(end_date))
+        return df.loc[mask].reset_index(drop=True)
+
+    @staticmethod
+    def _shift_day(date_str: str, days: int) -> str:
+        """对YYYYMMDD格式的日期加减天数"""
+        return (datetime.strptime(date_str, '%Y%m%d') + timedelta(days=days)).strftime('%Y%m%d')
@@ -1,16 +1,25 @@
-import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import requests
 from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import logging
-from base_analyzer import BaseAnalyzer
+from base_analyzer import BaseAnalyzer, SNAPSHOT_ROWS, AI_ANALYSIS_FIELDS
+from indicator_panel import shift, tail_windows, true_range
+from indicator_kernel import apply_indicator_block, forward_fill
+from data_provider import FULL_HISTORY_START
+from circuit_breaker import is_transient_error
+from score_series import futures_score_series
 
 class FuturesAnalyzer(BaseAnalyzer):
     """期货分析器类，用于分析各种期货合约"""
     
+    # calculate_futures_score 与 analyze_futures 报告读取的指标
+    SCORE_FIELDS = ['MA5', 'MA20', 'MA60', 'MACD', 'Signal', 'MACD_hist', 'RSI', 'Momentum',
+                    'BB_upper', 'BB_lower', 'Volume_Ratio', 'OI_Change']
+    REPORT_FIELDS = ['MA5', 'MA20', 'RSI', 'MACD', 'Signal', 'Volume_Ratio', 'OI_Change']
+    
     def __init__(self):
         # 调用父类的初始化方法
         super().__init__()
@@ -23,103 +32,70 @@ class FuturesAnalyzer(BaseAnalyzer):
         }
     
     def get_futures_data(self, symbol, market='CN', start_date=None, end_date=None):
-        """获取期货数据，支持国内期货和国际期货"""
-        import akshare as ak
-        
+        """获取期货数据，支持国内期货和国际期货，未指定开始日期时取数据源提供的全部历史"""
         if start_date is None:
-            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+            start_date = FULL_HISTORY_START
         if end_date is None:
             end_date = datetime.now().strftime('%Y%m%d')
             
         try:
-            df = None
-            
-            # 根据市场类型获取数据
-            if market == 'CN':
-                # 国内期货数据
-                df = ak.futures_main_sina(symbol=symbol)
-                
-                # 重命名列以匹配分析需求
-                df = df.rename(columns={
-                    "日期": "date",
-                    "开盘价": "open",
-                    "收盘价": "close",
-                    "最高价": "high",
-                    "最低价": "low",
-                    "成交量": "volume",
-                    "持仓量": "open_interest"
-                })
-                
-            elif market == 'GLOBAL':
-                # 国际期货数据
-                df = ak.futures_global_commodity_hist(symbol=symbol)
-                
-                # 重命名列以匹配分析需求
-                df = df.rename(columns={
-                    "date": "date",
-                    "open": "open",
-                    "close": "close",
-                    "high": "high",
-                    "low": "low",
-                    "volume": "volume"
-                })
-                
-                # 国际期货可能没有持仓量数据，添加空列
-                if 'open_interest' not in df.columns:
-                    df['open_interest'] = np.nan
-                
-            else:
-                raise ValueError(f"不支持的市场类型: {market}")
-            
-            # 确保日期格式正确
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # 数据类型转换
-            numeric_columns = ['open', 'close', 'high', 'low', 'volume', 'open_interest']
-            df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-            
-            # 删除空值
-            df = df.dropna(subset=['close', 'volume'])
-            
-            return df.sort_values('date')
+            df, shared = self._inflight.do(
+                ('futures', market, symbol, start_date, end_date),
+                self.data_provider.get_futures_history, symbol, market, start_date, end_date
+            )
+            # 合并请求的结果由多个调用方共享，返回副本避免指标列互相覆盖
+            return df.copy() if shared else df
             
         except Exception as e:
             self.logger.error(f"获取期货数据失败: {str(e)}")
+            # 上游临时错误原样抛出，调用方可以区分并重试；其他错误包装为数据获取失败
+            if is_transient_error(e):
+                raise
             raise Exception(f"获取期货数据失败: {str(e)}")
     
     def calculate_futures_indicators(self, df):
-        """计算期货特有的技术指标"""
+        """计算期货特有的技术指标
+        
+        基础指标与期货指标（持仓量变化、价格动量、量仓比、TR/ATR14）由融合内核一次算出，
+        真实波幅只计算一次，ATR14 与 ATR 周期相同时直接复用。
+        """
         try:
-            # 首先计算基础技术指标
-            df = self.calculate_indicators(df)
-            
-            # 计算期货特有指标
-            
-            # 1. 持仓量变化
-            df['OI_Change'] = df['open_interest'].pct_change() * 100
-            df['OI_MA'] = df['open_interest'].rolling(window=self.futures_params['open_interest_ma_period']).mean()
-            
-            # 2. 价格动量
-            df['Momentum'] = df['close'].diff(self.futures_params['momentum_period'])
+            return apply_indicator_block(df, self.params, self.futures_params, futures=True)
             
-            # 3. 成交量与持仓量比率 (Volume/Open Interest Ratio)
-            df['VOI_Ratio'] = df['volume'] / df['open_interest']
-            
-            # 4. 价格波动性
-            df['TR'] = pd.DataFrame({
-                'a': df['high'] - df['low'],
-                'b': abs(df['high'] - df['close'].shift(1)),
-                'c': abs(df['low'] - df['close'].shift(1))
-            }).max(axis=1)
-            df['ATR14'] = df['TR'].rolling(window=14).mean()
-            
-            # 5. 合约溢价/折价指标 (如果有现货价格数据)
-            # 这里需要外部数据，暂时跳过
+        except Exception as e:
+            self.logger.error(f"计算期货技术指标时出错: {str(e)}")
+            raise
+    
+    def calculate_futures_snapshot(self, df, rows=SNAPSHOT_ROWS):
+        """快照模式：只计算最后 rows 根K线的期货指标，评分与报告字段与 calculate_futures_indicators 一致"""
+        try:
+            # 首先计算基础技术指标的快照
+            rows = min(rows, len(df))
+            cols = self._snapshot_columns(df, rows)
+            close = df['close'].to_numpy(dtype=np.float64)
+            oi = df['open_interest'].to_numpy(dtype=np.float64)
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # 1. 持仓量变化（与完整计算一致，先向前填充缺失的持仓量）
+                filled = forward_fill(oi)
+                cols['OI_Change'] = (filled[-rows:] / shift(filled, 1)[-rows:] - 1) * 100
+                cols['OI_MA'] = tail_windows(oi, self.futures_params['open_interest_ma_period'], rows).mean(axis=1)
+                
+                # 2. 价格动量
+                cols['Momentum'] = close[-rows:] - shift(close, self.futures_params['momentum_period'])[-rows:]
+                
+                # 3. 成交量与持仓量比率
+                cols['VOI_Ratio'] = df['volume'].to_numpy(dtype=np.float64)[-rows:] / oi[-rows:]
+                
+                # 4. 价格波动性
+                tr = true_range(df['high'].to_numpy(dtype=np.float64), df['low'].to_numpy(dtype=np.float64), close)
+                cols['TR'] = tr[-rows:]
+                cols['ATR14'] = tail_windows(tr, 14, rows).mean(axis=1)
             
-            return df
+            return self._snapshot_frame(df, rows, cols)
             
         except Exception as e:
-            self.logger.error(f"计算期货技术指标时出错: {str(e)}")
+            self.logger.error(f"计算期货快照指标时出错: {str(e)}")
             raise
     
     def calculate_futures_score(self, df):
@@ -189,14 +165,36 @@ class FuturesAnalyzer(BaseAnalyzer):
             self.logger.error(f"计算期货评分时出错: {str(e)}")
             raise
     
-    def analyze_futures(self, symbol, market='CN'):
-        """分析期货合约"""
+    def calculate_futures_score_series(self, df):
+        """逐K线计算整段历史的期货评分，每根K线与 calculate_futures_score 的规则一致"""
+        try:
+            return futures_score_series(df)
+            
+        except Exception as e:
+            self.logger.error(f"计算期货评分序列时出错: {str(e)}")
+            raise
+    
+    def analyze_futures(self, symbol, market='CN', snapshot=False):
+        """分析期货合约
+        
+        Args:
+            snapshot: 为 True 时只计算最后几根K线的指标（批量筛选用），评分和报告不变
+        """
         try:
             # 获取期货数据
             df = self.get_futures_data(symbol, market)
             
             # 计算技术指标
-            df = self.calculate_futures_indicators(df)
+            params = {'base': self.params, 'futures': self.futures_params}
+            if snapshot:
+                df = self.cached_indicators('futures_snapshot', market, symbol, df,
+                                            self.calculate_futures_snapshot, params)
+            else:
+                # 只计算评分、报告和 AI 分析用到的指标
+                fields = list(dict.fromkeys(self.SCORE_FIELDS + self.REPORT_FIELDS + AI_ANALYSIS_FIELDS))
+                df = self.cached_indicators('futures_report', market, symbol, df,
+                                            lambda data: self.calculate_selected_indicators(
+                                                data, fields, self.futures_params), params)
             
             # 评分系统
             score = self.calculate_futures_score(df)
@@ -235,7 +233,6 @@ class FuturesAnalyzer(BaseAnalyzer):
             return symbol
     def get_futures_name(self, symbol, market='CN'):
         """获取期货名称，支持本地缓存和网络错误处理"""
-        import akshare as ak
         import json
         import os
         
@@ -261,8 +258,8 @@ class FuturesAnalyzer(BaseAnalyzer):
             name = None
             if market == 'CN':
                 # 获取国内期货名称
-                futures_info_df = ak.futures_zh_spot()
-                filtered = futures_info_df[futures_info_df['symbol'] == symbol]
+                futures_info_df = self.data_provider.get_futures_list(market)
+                filtered = futures_info_df[futures_info_df['code'] == symbol]
                 if not filtered.empty:
                     name = filtered.iloc[0]['name']
                 
@@ -326,7 +323,7 @@ class FuturesAnalyzer(BaseAnalyzer):
         total = len(futures_list)
         for i, symbol in enumerate(futures_list):
             try:
-                report = self.analyze_futures(symbol, market)
+                report = self.analyze_futures(symbol, market, snapshot=True)
                 if report['score'] >= min_score:
                     recommendations.append(report)
                 # 打印进度
@@ -336,19 +333,18 @@ class FuturesAnalyzer(BaseAnalyzer):
                 self.logger.error(f"分析期货 {symbol} 时出错: {str(e)}")
                 continue
                 
+        self.logger.info(f"指标缓存统计: {self.indicator_cache.stats()}")
+        
         # 按得分排序
         recommendations.sort(key=lambda x: x['score'], reverse=True)
         return recommendations
     
     def get_futures_market(self, market='CN'):
         """获取市场所有期货代码"""
-        import akshare as ak
-        
         try:
             if market == 'CN':
                 # 获取国内期货
-                futures_info_df = ak.futures_zh_spot()
-                return futures_info_df['symbol'].tolist()
+                return self.data_provider.get_futures_list(market)['code'].tolist()
                 
             elif market == 'GLOBAL':
                 # 获取国际期货
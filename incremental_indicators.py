@@ -0,0 +1,287 @@
+"""
+增量技术指标
+每只股票维护一份可序列化的指标状态（各EMA当前值、滚动窗口缓冲区、累计OBV），
+每来一根新K线只做常数时间的更新，输出与全盘扫描器 StockAnalyzer.calculate_indicators 一致
+（指数平均逐位一致，滚动均值/标准差在浮点误差范围内一致）。
+"""
+
+import os
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from indicator_panel import resolve_params
+
+# 状态格式版本，参数或算法变化时旧状态作废
+STATE_VERSION = 1
+
+NAN = float('nan')
+
+
+def _ewm_alpha_span(span: int) -> float:
+    """与 pandas ewm(span=...) 相同的平滑系数"""
+    return 1.0 / (1.0 + (span - 1) / 2.0)
+
+
+def _ewm_step(prev: float, cur: float, alpha: float) -> float:
+    """pandas ewm(adjust=False) 的单步递推，包括其归一化写法，保证逐位一致"""
+    if prev != prev:
+        return cur
+    if cur != cur or prev == cur:
+        return prev
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * cur) / (old_wt + alpha)
+
+
+def _window(buffer: deque, window: int) -> Optional[np.ndarray]:
+    """取缓冲区最后 window 个值；不足 window 个或含空值时返回 None（对应 min_periods=window）"""
+    if len(buffer) < window:
+        return None
+    values = np.array(buffer, dtype=np.float64)[-window:]
+    return None if np.isnan(values).any() else values
+
+
+def _window_mean(buffer: deque, window: int) -> float:
+    values = _window(buffer, window)
+    return NAN if values is None else float(values.mean())
+
+
+def _window_std(buffer: deque, window: int) -> float:
+    """窗口样本标准差(ddof=1)"""
+    values = _window(buffer, window)
+    return NAN if values is None else float(values.std(ddof=1))
+
+
+class IncrementalIndicators:
+    """单只股票的增量指标状态"""
+
+    def __init__(self, params: Union[None, Dict, object] = None):
+        """
+        Args:
+            params: 指标参数（TechnicalParams 或同结构字典），默认使用标准参数
+        """
+        self.params = dict(resolve_params(params))
+        p = self.params
+        self.ma_periods: List[int] = list(p['ma_periods'].values())
+        self.last_date: Optional[str] = None
+        self.bars = 0
+        self.prev_close = NAN
+
+        # 指数平均状态
+        self.ma = {period: NAN for period in self.ma_periods}
+        self.avg_gain = NAN
+        self.avg_loss = NAN
+        self.ema12 = NAN
+        self.ema26 = NAN
+        self.signal = NAN
+        self.obv = 0.0
+
+        # 滚动窗口缓冲区，长度只取决于参数，与历史长度无关
+        self.closes = deque(maxlen=max(p['bollinger_period'], 14, 11))
+        self.volumes = deque(maxlen=p['volume_ma_period'])
+        self.trs = deque(maxlen=p['atr_period'])
+        self.obvs = deque(maxlen=10)
+        self.ks = deque(maxlen=3)
+
+    def update(self, date, open_: float, high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        """
+        推进一根K线并返回该K线的全部指标值
+
+        Args:
+            date: K线日期（早于或等于状态中最后日期的K线应由调用方过滤）
+        """
+        p = self.params
+        prev_close = self.prev_close
+
+        # 移动均线（EMA）
+        row = {}
+        for period in self.ma_periods:
+            self.ma[period] = _ewm_step(self.ma[period], close, _ewm_alpha_span(period))
+            row[f'MA{period}'] = self.ma[period]
+
+        # RSI（指数加权），首根K线的涨跌为空
+        delta = close - prev_close
+        gain = NAN if delta != delta else max(delta, 0.0)
+        loss = NAN if delta != delta else -min(delta, 0.0)
+        rsi_alpha = 1.0 / p['rsi_period']
+        self.avg_gain = _ewm_step(self.avg_gain, gain, rsi_alpha)
+        self.avg_loss = _ewm_step(self.avg_loss, loss, rsi_alpha)
+        rs = self.avg_gain / (self.avg_loss + 1e-10)
+        row['RSI'] = 100 - (100 / (1 + rs))
+
+        # MACD
+        self.ema12 = _ewm_step(self.ema12, close, _ewm_alpha_span(12))
+        self.ema26 = _ewm_step(self.ema26, close, _ewm_alpha_span(26))
+        macd = self.ema12 - self.ema26
+        self.signal = _ewm_step(self.signal, macd, _ewm_alpha_span(9))
+        row['MACD'] = macd
+        row['Signal'] = self.signal
+        row['MACD_hist'] = macd - self.signal
+
+        # 布林带
+        self.closes.append(close)
+        middle = _window_mean(self.closes, p['bollinger_period'])
+        std = _window_std(self.closes, p['bollinger_period'])
+        row['BB_upper'] = middle + std * p['bollinger_std']
+        row['BB_middle'] = middle
+        row['BB_lower'] = middle - std * p['bollinger_std']
+
+        # 成交量
+        self.volumes.append(volume)
+        volume_ma = _window_mean(self.volumes, p['volume_ma_period'])
+        row['Volume_MA'] = volume_ma
+        row['Volume_Ratio'] = volume / (volume_ma + 1e-10)
+
+        # ATR 与波动率，首根K线的真实波幅只取最高价-最低价
+        if prev_close != prev_close:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        self.trs.append(tr)
+        atr = _window_mean(self.trs, p['atr_period'])
+        row['ATR'] = atr
+        row['Volatility'] = atr / close * 100
+
+        # ROC(10)
+        row['ROC'] = (close / self.closes[-11] - 1) * 100 if len(self.closes) >= 11 else NAN
+
+        # OBV
+        if delta == delta and delta > 0:
+            self.obv += volume
+        elif delta == delta and delta < 0:
+            self.obv -= volume
+        self.obvs.append(self.obv)
+        row['OBV'] = self.obv
+        row['OBV_MA10'] = _window_mean(self.obvs, 10)
+
+        # 随机指标
+        window_closes = _window(self.closes, 14)
+        if window_closes is None:
+            k = NAN
+        else:
+            k = (close - window_closes.min()) / (window_closes.max() - window_closes.min() + 1e-10) * 100
+        self.ks.append(k)
+        row['%K'] = k
+        row['%D'] = _window_mean(self.ks, 3)
+
+        self.prev_close = close
+        self.bars += 1
+        self.last_date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        return row
+
+    def update_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        依次推进 df 中晚于状态最后日期的K线
+
+        Returns:
+            新推进K线的指标 DataFrame（含 date 列），没有新K线时为空
+        """
+        if self.last_date is not None:
+            df = df[df['date'] > pd.Timestamp(self.last_date)]
+        rows = []
+        for bar in df[['date', 'open', 'high', 'low', 'close', 'volume']].itertuples(index=False):
+            row = self.update(bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume)
+            row['date'] = bar.date
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, params: Union[None, Dict, object] = None) -> 'IncrementalIndicators':
+        """用完整历史预热状态"""
+        state = cls(params)
+        state.update_frame(df)
+        return state
+
+    # -------------------------------
+    # 序列化
+    # -------------------------------
+    def to_dict(self) -> Dict:
+        """导出为可 JSON 序列化的字典"""
+        return {
+            'version': STATE_VERSION,
+            'params': self.params,
+            'last_date': self.last_date,
+            'bars': self.bars,
+            'prev_close': self.prev_close,
+            'ma': {str(k): v for k, v in self.ma.items()},
+            'avg_gain': self.avg_gain,
+            'avg_loss': self.avg_loss,
+            'ema12': self.ema12,
+            'ema26': self.ema26,
+            'signal': self.signal,
+            'obv': self.obv,
+            'closes': list(self.closes),
+            'volumes': list(self.volumes),
+            'trs': list(self.trs),
+            'obvs': list(self.obvs),
+            'ks': list(self.ks),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'IncrementalIndicators':
+        """从 to_dict 的结果恢复状态"""
+        if data.get('version') != STATE_VERSION:
+            raise ValueError(f"指标状态版本不匹配: {data.get('version')}")
+        state = cls(data['params'])
+        state.last_date = data['last_date']
+        state.bars = data['bars']
+        state.prev_close = data['prev_close']
+        state.ma = {int(k): v for k, v in data['ma'].items()}
+        for name in ('avg_gain', 'avg_loss', 'ema12', 'ema26', 'signal', 'obv'):
+            setattr(state, name, data[name])
+        for name in ('closes', 'volumes', 'trs', 'obvs', 'ks'):
+            getattr(state, name).extend(data[name])
+        return state
+
+
+class IndicatorStateStore:
+    """按 命名空间/代码 保存增量指标状态的 JSON 文件仓库"""
+
+    def __init__(self, store_dir: Optional[str] = None):
+        self.store_dir = store_dir or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'cache', 'indicator_state')
+
+    def _path(self, namespace: str, symbol: str) -> str:
+        return os.path.join(self.store_dir, namespace, f"{symbol}.json")
+
+    def load(self, namespace: str, symbol: str, params: Union[None, Dict, object] = None) -> Optional[IncrementalIndicators]:
+        """读取状态；不存在、损坏或参数不同时返回 None"""
+        path = self._path(namespace, symbol)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = IncrementalIndicators.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        if state.params != dict(resolve_params(params)):
+            return None
+        return state
+
+    def save(self, namespace: str, symbol: str, state: IncrementalIndicators) -> None:
+        """原子写入状态文件"""
+        path = self._path(namespace, symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp, path)
+
+    def advance(self, namespace: str, symbol: str, df: pd.DataFrame,
+                params: Union[None, Dict, object] = None) -> Dict[str, float]:
+        """
+        读取状态、只推进 df 中的新K线并保存，返回最新一根K线的指标。
+        没有可用状态时用 df 的完整历史重新预热。
+        """
+        state = self.load(namespace, symbol, params)
+        if state is None:
+            state = IncrementalIndicators(params)
+        new_rows = state.update_frame(df)
+        if new_rows.empty:
+            raise ValueError(f"{namespace}/{symbol} 没有可用于计算指标的K线")
+        self.save(namespace, symbol, state)
+        return new_rows.iloc[-1].to_dict()
@@ -0,0 +1,184 @@
+"""
+技术指标缓存
+行情只在收盘后变化，同一标的的指标在一天内会被 API、GUI 和扫描器反复计算。
+按 (类型, 市场, 代码, 最后一根K线, 参数哈希) 缓存指标结果：
+  - 内存一级缓存：LRU，按 DataFrame 实际内存占用计算容量
+  - 磁盘二级缓存（可选）：Parquet 文件，进程重启或多进程之间共享
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple, Union
+
+import pandas as pd
+
+from indicator_panel import resolve_params
+
+# 默认内存容量（MB）
+DEFAULT_CACHE_MB = 256
+
+
+def params_hash(params: Union[None, Dict, object]) -> str:
+    """参数（字典或 TechnicalParams 数据类）的稳定哈希"""
+    payload = json.dumps(resolve_params(params), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """DataFrame 占用的内存字节数（含索引与对象列）"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class IndicatorCache:
+    """带内存上限的两级指标缓存"""
+
+    def __init__(self, max_bytes: Optional[int] = None, disk_dir: Optional[str] = None,
+                 enabled: Optional[bool] = None):
+        """
+        Args:
+            max_bytes: 内存缓存上限，默认读取环境变量 INDICATOR_CACHE_MB
+            disk_dir: 磁盘缓存目录，默认读取 INDICATOR_CACHE_DIR，为空时不启用磁盘缓存
+            enabled: 是否启用，默认读取 INDICATOR_CACHE_ENABLED
+        """
+        self.logger = logging.getLogger(__name__)
+        if enabled is None:
+            enabled = os.getenv('INDICATOR_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
+        self.enabled = enabled
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('INDICATOR_CACHE_MB', DEFAULT_CACHE_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv('INDICATOR_CACHE_DIR', '')
+        if self.disk_dir and not any(importlib.util.find_spec(name) is not None
+                                     for name in ('pyarrow', 'fastparquet')):
+            self.logger.warning("未安装 pyarrow 或 fastparquet，指标磁盘缓存已禁用")
+            self.disk_dir = ''
+
+        self._entries: 'OrderedDict[Hashable, Tuple[pd.DataFrame, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(kind: str, market: str, symbol: str, df: pd.DataFrame,
+                 params: Union[None, Dict, object] = None) -> Tuple:
+        """
+        生成缓存键。除最后一根K线日期外还包含K线数量和最后收盘价/成交量，
+        盘中最后一根K线仍在变化或复权基准调整时不会命中旧结果。
+        """
+        last = df.iloc[-1]
+        return (kind, market, str(symbol), str(pd.Timestamp(last['date']).date()), len(df),
+                float(last['close']), float(last['volume']), params_hash(params))
+
+    def _disk_path(self, key: Tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, key[0], f"{digest}.parquet")
+
+    def get(self, key: Tuple) -> Optional[pd.DataFrame]:
+        """查询缓存，命中时返回副本"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0].copy()
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    df = pd.read_parquet(path)
+                except Exception as e:
+                    self.logger.warning(f"读取指标磁盘缓存失败: {str(e)}")
+                else:
+                    with self._lock:
+                        self.disk_hits += 1
+                    self._remember(key, df)
+                    return df.copy()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Tuple, df: pd.DataFrame) -> None:
+        """写入缓存（内存，以及启用时的磁盘）"""
+        if not self.enabled:
+            return
+        self._remember(key, df.copy())
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                df.to_parquet(tmp, index=False)
+                os.replace(tmp, path)
+            except Exception as e:
+                self.logger.warning(f"写入指标磁盘缓存失败: {str(e)}")
+
+    def _remember(self, key: Tuple, df: pd.DataFrame) -> None:
+        """放入内存 LRU，超出容量时淘汰最久未使用的条目"""
+        size = frame_bytes(df)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """命中则返回缓存结果，否则计算并写入缓存"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        df = compute()
+        self.put(key, df)
+        return df
+
+    def clear(self) -> None:
+        """清空内存缓存（磁盘缓存保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """命中、未命中、淘汰次数与内存占用"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+_default_cache: Optional[IndicatorCache] = None
+_default_lock = threading.Lock()
+
+
+def get_indicator_cache() -> IndicatorCache:
+    """获取进程内共享的指标缓存，首次调用时从环境变量创建"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = IndicatorCache()
+        return _default_cache
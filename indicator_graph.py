@@ -0,0 +1,207 @@
+"""
+惰性指标依赖图
+每个指标声明为一个节点：名称、输入（行情字段或其他节点）与计算函数。
+使用方（打分函数、报告模板、API 字段列表）只需给出要用到的指标名称，
+按依赖关系只计算所需的子图，共享的中间结果（真实波幅、EMA12/26、布林中轨等）只计算一次。
+计算结果与 indicator_kernel 的完整计算一致。
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from indicator_panel import resolve_params, true_range
+from indicator_kernel import (DEFAULT_FUTURES_PARAMS, ema_into, forward_fill, lag_into,
+                              rolling_mean_into, rolling_std_into)
+
+# 行情输入字段
+SOURCE_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'open_interest')
+
+
+@dataclass(frozen=True)
+class Node:
+    """指标节点
+
+    Attributes:
+        name: 输出名称
+        inputs: 依赖的行情字段或节点名称
+        func: func(params, futures_params, *inputs) -> ndarray
+        public: 是否为对外输出的指标列（False 为只供其他节点使用的中间结果）
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    func: Callable[..., np.ndarray]
+    public: bool = True
+
+
+class IndicatorGraph:
+    """指标依赖图"""
+
+    def __init__(self, nodes: Iterable[Node] = ()):
+        self.nodes: Dict[str, Node] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: Node) -> None:
+        """注册节点，输入必须是行情字段或已注册的节点"""
+        for name in node.inputs:
+            if name not in SOURCE_FIELDS and name not in self.nodes:
+                raise ValueError(f"指标 {node.name} 依赖未定义的输入: {name}")
+        self.nodes[node.name] = node
+
+    @property
+    def outputs(self) -> List[str]:
+        """可请求的对外指标名称"""
+        return [name for name, node in self.nodes.items() if node.public]
+
+    def plan(self, outputs: Iterable[str]) -> List[Node]:
+        """按依赖顺序列出计算 outputs 所需的节点（注册顺序即为一个合法的拓扑序）"""
+        needed = set()
+        stack = list(outputs)
+        while stack:
+            name = stack.pop()
+            if name in needed or name in SOURCE_FIELDS:
+                continue
+            if name not in self.nodes:
+                raise KeyError(f"未知的指标: {name}")
+            needed.add(name)
+            stack.extend(self.nodes[name].inputs)
+        return [node for name, node in self.nodes.items() if name in needed]
+
+    def sources(self, outputs: Iterable[str]) -> List[str]:
+        """计算 outputs 需要读取的行情字段"""
+        fields = set()
+        for node in self.plan(outputs):
+            fields.update(name for name in node.inputs if name in SOURCE_FIELDS)
+        return [name for name in SOURCE_FIELDS if name in fields]
+
+    def evaluate(self, arrays: Dict[str, np.ndarray], outputs: Iterable[str],
+                 params: Union[None, Dict, object] = None,
+                 futures_params: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+        """
+        计算指定指标
+
+        Args:
+            arrays: 行情字段的一维 float64 数组
+            outputs: 需要的指标名称
+            params: 指标参数（BaseAnalyzer.params 格式）
+            futures_params: 期货参数（FuturesAnalyzer.futures_params 格式）
+
+        Returns:
+            {指标名: 数组}，只包含 outputs 中的指标
+        """
+        outputs = list(dict.fromkeys(outputs))
+        p = resolve_params(params)
+        fp = futures_params or DEFAULT_FUTURES_PARAMS
+        values = dict(arrays)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for node in self.plan(outputs):
+                values[node.name] = node.func(p, fp, *(values[name] for name in node.inputs))
+        return {name: values[name] for name in outputs}
+
+    def frame(self, df: pd.DataFrame, outputs: Iterable[str],
+              params: Union[None, Dict, object] = None,
+              futures_params: Optional[Dict] = None) -> pd.DataFrame:
+        """对行情 DataFrame 计算指定指标，返回行情字段加所请求指标列的新 DataFrame"""
+        outputs = list(dict.fromkeys(outputs))
+        arrays = {name: np.ascontiguousarray(df[name].to_numpy(dtype=np.float64))
+                  for name in self.sources(outputs)}
+        computed = self.evaluate(arrays, outputs, params, futures_params)
+        existing = [name for name in outputs if name in df.columns]
+        base = df.drop(columns=existing) if existing else df
+        block = np.column_stack([computed[name] for name in outputs]) if outputs else np.empty((len(df), 0))
+        return pd.concat([base, pd.DataFrame(block, columns=outputs, index=df.index)], axis=1)
+
+
+# -------------------------------
+# 节点计算函数
+# -------------------------------
+def _ema(span_of: Callable[[Dict], int]) -> Callable[..., np.ndarray]:
+    def func(p, fp, x):
+        out = np.empty(len(x))
+        ema_into(x if isinstance(x, pd.Series) else pd.Series(x, copy=False), span_of(p), out)
+        return out
+    return func
+
+
+def _rolling_mean(window_of: Callable[[Dict, Dict], int]) -> Callable[..., np.ndarray]:
+    def func(p, fp, x):
+        out = np.empty(len(x))
+        rolling_mean_into(x, window_of(p, fp), out)
+        return out
+    return func
+
+
+def _lagged(x: np.ndarray, periods: int) -> np.ndarray:
+    return lag_into(x, periods, np.empty(len(x)))
+
+
+def _bollinger_std(p, fp, close, middle):
+    out = np.empty(len(close))
+    rolling_std_into(close, p['bollinger_period'], middle, out)
+    return out
+
+
+def _oi_change(p, fp, oi):
+    filled = forward_fill(oi)
+    return (filled / _lagged(filled, 1) - 1) * 100
+
+
+def _atr14(p, fp, tr, atr):
+    if p['atr_period'] == 14:
+        return atr
+    return _rolling_mean(lambda p, fp: 14)(p, fp, tr)
+
+
+DEFAULT_NODES = [
+    # 移动平均线与 MACD：收盘价只包装一次为 Series（不复制）供各条 EMA 共用
+    Node('close_series', ('close',), lambda p, fp, close: pd.Series(close, copy=False), public=False),
+    Node('MA5', ('close_series',), _ema(lambda p: p['ma_periods']['short'])),
+    Node('MA20', ('close_series',), _ema(lambda p: p['ma_periods']['medium'])),
+    Node('MA60', ('close_series',), _ema(lambda p: p['ma_periods']['long'])),
+    Node('EMA12', ('close_series',), _ema(lambda p: 12), public=False),
+    Node('EMA26', ('close_series',), _ema(lambda p: 26), public=False),
+    Node('MACD', ('EMA12', 'EMA26'), lambda p, fp, fast, slow: fast - slow),
+    Node('Signal', ('MACD',), _ema(lambda p: 9)),
+    Node('MACD_hist', ('MACD', 'Signal'), lambda p, fp, macd, signal: macd - signal),
+
+    # RSI：首个差分为空，按 where(delta > 0, 0) 的语义记为 0
+    Node('delta', ('close',), lambda p, fp, close: close - _lagged(close, 1), public=False),
+    Node('avg_gain', ('delta',),
+         lambda p, fp, delta: _rolling_mean(lambda p, fp: p['rsi_period'])(p, fp, np.where(delta > 0, delta, 0.0)),
+         public=False),
+    Node('avg_loss', ('delta',),
+         lambda p, fp, delta: _rolling_mean(lambda p, fp: p['rsi_period'])(p, fp, np.where(delta < 0, -delta, 0.0)),
+         public=False),
+    Node('RSI', ('avg_gain', 'avg_loss'), lambda p, fp, gain, loss: 100 - (100 / (1 + gain / loss))),
+
+    # 布林带
+    Node('BB_middle', ('close',), _rolling_mean(lambda p, fp: p['bollinger_period'])),
+    Node('BB_std', ('close', 'BB_middle'), _bollinger_std, public=False),
+    Node('BB_upper', ('BB_middle', 'BB_std'), lambda p, fp, middle, std: middle + std * p['bollinger_std']),
+    Node('BB_lower', ('BB_middle', 'BB_std'), lambda p, fp, middle, std: middle - std * p['bollinger_std']),
+
+    # 成交量
+    Node('Volume_MA', ('volume',), _rolling_mean(lambda p, fp: p['volume_ma_period'])),
+    Node('Volume_Ratio', ('volume', 'Volume_MA'), lambda p, fp, volume, volume_ma: volume / volume_ma),
+
+    # 真实波幅、ATR 与波动率
+    Node('TR', ('high', 'low', 'close'), lambda p, fp, high, low, close: true_range(high, low, close)),
+    Node('ATR', ('TR',), _rolling_mean(lambda p, fp: p['atr_period'])),
+    Node('Volatility', ('ATR', 'close'), lambda p, fp, atr, close: atr / close * 100),
+
+    # 动量
+    Node('ROC', ('close',), lambda p, fp, close: (close / _lagged(close, 10) - 1) * 100),
+
+    # 期货指标
+    Node('OI_Change', ('open_interest',), _oi_change),
+    Node('OI_MA', ('open_interest',), _rolling_mean(lambda p, fp: fp['open_interest_ma_period'])),
+    Node('Momentum', ('close',), lambda p, fp, close: close - _lagged(close, fp['momentum_period'])),
+    Node('VOI_Ratio', ('volume', 'open_interest'), lambda p, fp, volume, oi: volume / oi),
+    Node('ATR14', ('TR', 'ATR'), _atr14),
+]
+
+# 默认指标图
+DEFAULT_GRAPH = IndicatorGraph(DEFAULT_NODES)
@@ -0,0 +1,308 @@
+"""
+融合指标内核
+从连续的 float64 数组一次性计算 calculate_indicators / calculate_futures_indicators 的全部指标，
+结果写入预先分配的二维数组（按列存放，每列一个指标），不再为每个指标构造多个 Series/DataFrame 临时对象。
+真实波幅只计算一次，期货的 TR/ATR14 直接复用。
+
+运行本文件可进行微基准测试：
+    python indicator_kernel.py --symbols 200 --bars 250
+"""
+
+import time
+import argparse
+import tracemalloc
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from indicator_panel import INDICATOR_COLUMNS, resolve_params
+
+# 期货额外指标列，顺序与 calculate_futures_indicators 一致
+FUTURES_EXTRA_COLUMNS = ['OI_Change', 'OI_MA', 'Momentum', 'VOI_Ratio', 'TR', 'ATR14']
+FUTURES_INDICATOR_COLUMNS = INDICATOR_COLUMNS + FUTURES_EXTRA_COLUMNS
+
+# 与 FuturesAnalyzer.futures_params 相同的默认期货参数
+DEFAULT_FUTURES_PARAMS = {
+    'momentum_period': 10,
+    'open_interest_ma_period': 14,
+    'basis_threshold': 0.02
+}
+
+_COL = {name: i for i, name in enumerate(FUTURES_INDICATOR_COLUMNS)}
+
+
+def ema_into(series: pd.Series, span: int, out: np.ndarray) -> None:
+    """指数移动平均写入 out，沿用 pandas 的 C 递推以保证与 ewm(adjust=False) 逐位一致"""
+    out[:] = series.ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def rolling_mean_into(x: np.ndarray, window: int, out: np.ndarray) -> None:
+    """滚动均值写入 out，前 window-1 行为空"""
+    out[:window - 1] = np.nan
+    if len(x) >= window:
+        view = np.lib.stride_tricks.sliding_window_view(x, window)
+        np.mean(view, axis=-1, out=out[window - 1:])
+
+
+def rolling_std_into(x: np.ndarray, window: int, mean: np.ndarray, out: np.ndarray) -> None:
+    """
+    滚动样本标准差(ddof=1)写入 out，复用已算好的滚动均值。
+    按窗口内偏移逐次累加离差平方，临时数组只有一行长度，不展开 (行数, 窗口) 的离差矩阵。
+    """
+    out[:window - 1] = np.nan
+    m = len(x) - window + 1
+    if m <= 0:
+        return
+    acc = out[window - 1:]
+    acc[:] = 0.0
+    center = mean[window - 1:]
+    dev = np.empty(m)
+    for offset in range(window):
+        np.subtract(x[offset:offset + m], center, out=dev)
+        np.multiply(dev, dev, out=dev)
+        np.add(acc, dev, out=acc)
+    np.divide(acc, window - 1, out=acc)
+    np.sqrt(acc, out=acc)
+
+
+def lag_into(x: np.ndarray, periods: int, out: np.ndarray) -> np.ndarray:
+    """x 向后平移 periods 行写入 out"""
+    out[:periods] = np.nan
+    out[periods:] = x[:len(x) - periods]
+    return out
+
+
+def forward_fill(x: np.ndarray) -> np.ndarray:
+    """前向填充空值（pct_change 默认的 pad 行为）"""
+    idx = np.where(np.isnan(x), 0, np.arange(len(x)))
+    np.maximum.accumulate(idx, out=idx)
+    return x[idx]
+
+
+def compute_indicator_block(open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                            close: np.ndarray, volume: np.ndarray,
+                            params: Union[None, Dict, object] = None,
+                            open_interest: Optional[np.ndarray] = None,
+                            futures_params: Optional[Dict] = None) -> np.ndarray:
+    """
+    计算单只标的的全部指标
+
+    Args:
+        open_, high, low, close, volume: 等长的 float64 数组
+        params: 指标参数（BaseAnalyzer.params 格式），默认使用标准参数
+        open_interest: 持仓量；提供时同时计算期货指标
+        futures_params: 期货参数（FuturesAnalyzer.futures_params 格式）
+
+    Returns:
+        形状为 (K线数, 指标数) 的列优先数组，列顺序为 INDICATOR_COLUMNS，
+        期货再追加 FUTURES_EXTRA_COLUMNS
+    """
+    p = resolve_params(params)
+    n = len(close)
+    columns = FUTURES_INDICATOR_COLUMNS if open_interest is not None else INDICATOR_COLUMNS
+    block = np.empty((n, len(columns)), dtype=np.float64, order='F')
+    col = {name: block[:, _COL[name]] for name in columns}
+    # 两个可复用的工作数组
+    work = np.empty(n)
+    work2 = np.empty(n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 移动平均线与 MACD：收盘价只包装一次为 Series（不复制）
+        close_series = pd.Series(close, copy=False)
+        ema_into(close_series, p['ma_periods']['short'], col['MA5'])
+        ema_into(close_series, p['ma_periods']['medium'], col['MA20'])
+        ema_into(close_series, p['ma_periods']['long'], col['MA60'])
+        ema_into(close_series, 12, work)
+        ema_into(close_series, 26, work2)
+        np.subtract(work, work2, out=col['MACD'])
+        ema_into(pd.Series(col['MACD'], copy=False), 9, col['Signal'])
+        np.subtract(col['MACD'], col['Signal'], out=col['MACD_hist'])
+
+        # RSI：涨跌幅的首个差分为空，按 where(delta > 0, 0) 的语义记为 0
+        delta = np.subtract(close, lag_into(close, 1, work), out=work)
+        gain = np.where(delta > 0, delta, 0.0)
+        np.negative(delta, out=work2)
+        loss = np.where(delta < 0, work2, 0.0)
+        rolling_mean_into(gain, p['rsi_period'], work)
+        rolling_mean_into(loss, p['rsi_period'], work2)
+        rsi = col['RSI']
+        np.divide(work, work2, out=rsi)
+        np.add(rsi, 1, out=rsi)
+        np.divide(100, rsi, out=rsi)
+        np.subtract(100, rsi, out=rsi)
+
+        # 布林带
+        rolling_mean_into(close, p['bollinger_period'], col['BB_middle'])
+        rolling_std_into(close, p['bollinger_period'], col['BB_middle'], work)
+        np.multiply(work, p['bollinger_std'], out=work)
+        np.add(col['BB_middle'], work, out=col['BB_upper'])
+        np.subtract(col['BB_middle'], work, out=col['BB_lower'])
+
+        # 成交量
+        rolling_mean_into(volume, p['volume_ma_period'], col['Volume_MA'])
+        np.divide(volume, col['Volume_MA'], out=col['Volume_Ratio'])
+
+        # 真实波幅（第一根K线只取最高价-最低价，与 max(axis=1) 跳过空值一致）与 ATR
+        prev_close = lag_into(close, 1, work2)
+        tr = np.subtract(high, low)
+        np.fmax(tr, np.abs(high - prev_close), out=tr)
+        np.fmax(tr, np.abs(low - prev_close), out=tr)
+        rolling_mean_into(tr, p['atr_period'], col['ATR'])
+        np.divide(col['ATR'], close, out=col['Volatility'])
+        np.multiply(col['Volatility'], 100, out=col['Volatility'])
+
+        # 10日变动率
+        np.divide(close, lag_into(close, 10, work), out=col['ROC'])
+        np.subtract(col['ROC'], 1, out=col['ROC'])
+        np.multiply(col['ROC'], 100, out=col['ROC'])
+
+        if open_interest is not None:
+            fp = futures_params or DEFAULT_FUTURES_PARAMS
+            filled = forward_fill(open_interest)
+            np.divide(filled, lag_into(filled, 1, work), out=col['OI_Change'])
+            np.subtract(col['OI_Change'], 1, out=col['OI_Change'])
+            np.multiply(col['OI_Change'], 100, out=col['OI_Change'])
+            rolling_mean_into(open_interest, fp['open_interest_ma_period'], col['OI_MA'])
+            np.subtract(close, lag_into(close, fp['momentum_period'], work), out=col['Momentum'])
+            np.divide(volume, open_interest, out=col['VOI_Ratio'])
+            col['TR'][:] = tr
+            if p['atr_period'] == 14:
+                col['ATR14'][:] = col['ATR']
+            else:
+                rolling_mean_into(tr, 14, col['ATR14'])
+
+    return block
+
+
+def frame_arrays(df: pd.DataFrame, futures: bool = False) -> Dict[str, np.ndarray]:
+    """从行情 DataFrame 取出内核需要的连续 float64 数组"""
+    names = ['open', 'high', 'low', 'close', 'volume'] + (['open_interest'] if futures else [])
+    return {name: np.ascontiguousarray(df[name].to_numpy(dtype=np.float64)) for name in names}
+
+
+def apply_indicator_block(df: pd.DataFrame, params: Union[None, Dict, object] = None,
+                          futures_params: Optional[Dict] = None, futures: bool = False) -> pd.DataFrame:
+    """
+    计算指标并返回追加了指标列的新 DataFrame。
+    指标块整体拼接到行情数据之后（逐列赋值会让 pandas 反复整理内部数据块，开销远大于计算本身），
+    df 中已有的同名指标列会被替换。
+    """
+    arrays = frame_arrays(df, futures)
+    block = compute_indicator_block(arrays['open'], arrays['high'], arrays['low'], arrays['close'],
+                                    arrays['volume'], params, arrays.get('open_interest'), futures_params)
+    columns = FUTURES_INDICATOR_COLUMNS if futures else INDICATOR_COLUMNS
+    existing = [name for name in columns if name in df.columns]
+    base = df.drop(columns=existing) if existing else df
+    return pd.concat([base, pd.DataFrame(block, columns=columns, index=df.index)], axis=1)
+
+
+# -------------------------------
+# 微基准测试
+# -------------------------------
+def _pandas_reference(df: pd.DataFrame, params: Dict, futures_params: Dict) -> pd.DataFrame:
+    """改造前基于 Series 中间对象的计算方式，用于对照结果和开销"""
+    p = params
+    close = df['close']
+    df['MA5'] = close.ewm(span=p['ma_periods']['short'], adjust=False).mean()
+    df['MA20'] = close.ewm(span=p['ma_periods']['medium'], adjust=False).mean()
+    df['MA60'] = close.ewm(span=p['ma_periods']['long'], adjust=False).mean()
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=p['rsi_period']).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=p['rsi_period']).mean()
+    df['RSI'] = 100 - (100 / (1 + gain / loss))
+    exp1 = close.ewm(span=12, adjust=False).mean()
+    exp2 = close.ewm(span=26, adjust=False).mean()
+    df['MACD'] = exp1 - exp2
+    df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    df['MACD_hist'] = df['MACD'] - df['Signal']
+    middle = close.rolling(window=p['bollinger_period']).mean()
+    std = close.rolling(window=p['bollinger_period']).std()
+    df['BB_upper'] = middle + (std * p['bollinger_std'])
+    df['BB_middle'] = middle
+    df['BB_lower'] = middle - (std * p['bollinger_std'])
+    df['Volume_MA'] = df['volume'].rolling(window=p['volume_ma_period']).mean()
+    df['Volume_Ratio'] = df['volume'] / df['Volume_MA']
+    prev = close.shift(1)
+    tr = pd.concat([df['high'] - df['low'], abs(df['high'] - prev), abs(df['low'] - prev)], axis=1).max(axis=1)
+    df['ATR'] = tr.rolling(window=p['atr_period']).mean()
+    df['Volatility'] = df['ATR'] / close * 100
+    df['ROC'] = (close / close.shift(10) - 1) * 100
+    df['OI_Change'] = (df['open_interest'] / df['open_interest'].shift(1) - 1) * 100
+    df['OI_MA'] = df['open_interest'].rolling(window=futures_params['open_interest_ma_period']).mean()
+    df['Momentum'] = close.diff(futures_params['momentum_period'])
+    df['VOI_Ratio'] = df['volume'] / df['open_interest']
+    df['TR'] = pd.DataFrame({
+        'a': df['high'] - df['low'],
+        'b': abs(df['high'] - prev),
+        'c': abs(df['low'] - prev)
+    }).max(axis=1)
+    df['ATR14'] = df['TR'].rolling(window=14).mean()
+    return df
+
+
+def _synthetic_frame(bars: int, rng: np.random.Generator) -> pd.DataFrame:
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    spread = np.abs(rng.normal(0, 0.01, bars)) * close
+    return pd.DataFrame({
+        'date': pd.bdate_range('2024-01-01', periods=bars),
+        'open': close + rng.normal(0, 0.005, bars) * close,
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.integers(10_000, 1_000_000, bars).astype(np.float64),
+        'open_interest': rng.integers(50_000, 200_000, bars).astype(np.float64)
+    })
+
+
+def _measure(func, frames: List[pd.DataFrame]) -> Dict[str, float]:
+    """每只标的的平均耗时（取三轮最快）与平均峰值内存分配"""
+    peak = 0
+    for df in frames:
+        df = df.copy()
+        tracemalloc.start()
+        func(df)
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    best = float('inf')
+    for _ in range(3):
+        copies = [df.copy() for df in frames]
+        begin = time.perf_counter()
+        for df in copies:
+            func(df)
+        best = min(best, time.perf_counter() - begin)
+    return {'ms': best * 1000 / len(frames), 'peak_kb': peak / 1024 / len(frames)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='融合指标内核微基准测试')
+    parser.add_argument('--symbols', type=int, default=200, help='模拟标的数量')
+    parser.add_argument('--bars', type=int, default=250, help='每只标的K线数量')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    params = resolve_params(None)
+    rng = np.random.default_rng(args.seed)
+    frames = [_synthetic_frame(args.bars, rng) for _ in range(args.symbols)]
+
+    reference = _pandas_reference(frames[0].copy(), params, DEFAULT_FUTURES_PARAMS)
+    fused = apply_indicator_block(frames[0].copy(), params, DEFAULT_FUTURES_PARAMS, futures=True)
+    diff = max(
+        np.nanmax(np.abs(reference[name] - fused[name]) / np.maximum(1, np.abs(reference[name])))
+        for name in FUTURES_INDICATOR_COLUMNS
+    )
+
+    results = {
+        'pandas': _measure(lambda df: _pandas_reference(df, params, DEFAULT_FUTURES_PARAMS), frames),
+        'kernel': _measure(lambda df: apply_indicator_block(df, params, DEFAULT_FUTURES_PARAMS, futures=True), frames)
+    }
+    print(f"标的数: {args.symbols}  K线数: {args.bars}  最大相对误差: {diff:.2e}")
+    for name, r in results.items():
+        print(f"{name:>8}: {r['ms']:.3f} ms/标的  峰值分配 {r['peak_kb']:.1f} KB/标的")
+    print(f"提速 {results['pandas']['ms'] / results['kernel']['ms']:.1f}x，"
+          f"峰值分配减少 {1 - results['kernel']['peak_kb'] / results['pandas']['peak_kb']:.0%}")
+
+
+if __name__ == '__main__':
+    main()
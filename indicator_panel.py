@@ -0,0 +1,268 @@
+"""
+横截面指标引擎
+在 日期 × 代码 的二维面板上一次性计算全市场技术指标，结果与 BaseAnalyzer.calculate_indicators 一致。
+
+停牌、上市时间不同会让面板中出现空值。计算前先把每个代码的有效K线压紧到面板底部
+（“K线空间”，每列最后一行都是该代码最新一根K线），在K线空间中完成计算后再放回日期位置，
+这样滚动窗口和指数平均都只跨越该代码自己的K线，和逐只计算的结果相同。
+"""
+
+import dataclasses
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from data_provider import OHLCV_COLUMNS
+
+# 与 BaseAnalyzer.params 相同的默认参数
+DEFAULT_PARAMS = {
+    'ma_periods': {'short': 5, 'medium': 20, 'long': 60},
+    'rsi_period': 14,
+    'bollinger_period': 20,
+    'bollinger_std': 2,
+    'volume_ma_period': 20,
+    'atr_period': 14
+}
+
+# calculate_indicators 输出的指标列，顺序与其一致
+INDICATOR_COLUMNS = [
+    'MA5', 'MA20', 'MA60', 'RSI', 'MACD', 'Signal', 'MACD_hist',
+    'BB_upper', 'BB_middle', 'BB_lower', 'Volume_MA', 'Volume_Ratio',
+    'ATR', 'Volatility', 'ROC'
+]
+
+# 滚动标准差按列分块计算，限制中间数组的内存
+_STD_CHUNK = 512
+
+
+def resolve_params(params: Union[None, Dict, object]) -> Dict:
+    """把 None / 参数字典 / TechnicalParams 数据类统一为参数字典"""
+    if params is None:
+        return DEFAULT_PARAMS
+    if dataclasses.is_dataclass(params):
+        return dataclasses.asdict(params)
+    return params
+
+
+# -------------------------------
+# 二维数组上的基础算子（按行为时间，列为代码）
+# -------------------------------
+def ema(x: np.ndarray, span: int) -> np.ndarray:
+    """指数移动平均，等价于 Series.ewm(span=span, adjust=False).mean()"""
+    alpha = 1.0 / (1.0 + (span - 1) / 2.0)
+    old_wt = 1.0 - alpha
+    norm = old_wt + alpha
+    out = np.empty_like(x)
+    prev = np.full(x.shape[1:], np.nan)
+    for t in range(x.shape[0]):
+        cur = x[t]
+        updated = (old_wt * prev + alpha * cur) / norm
+        prev = np.where(np.isnan(prev), cur,
+                        np.where(np.isnan(cur) | (prev == cur), prev, updated))
+        out[t] = prev
+    return out
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """滚动均值，窗口内有空值或不足 window 行时为空，等价于 rolling(window).mean()"""
+    out = np.full_like(x, np.nan)
+    if x.shape[0] >= window:
+        view = np.lib.stride_tricks.sliding_window_view(x, window, axis=0)
+        out[window - 1:] = view.mean(axis=-1)
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """滚动样本标准差(ddof=1)，等价于 rolling(window).std()"""
+    out = np.full_like(x, np.nan)
+    if x.shape[0] >= window:
+        for begin in range(0, x.shape[1], _STD_CHUNK):
+            chunk = x[:, begin:begin + _STD_CHUNK]
+            view = np.lib.stride_tricks.sliding_window_view(chunk, window, axis=0)
+            out[window - 1:, begin:begin + _STD_CHUNK] = view.std(axis=-1, ddof=1)
+    return out
+
+
+def shift(x: np.ndarray, periods: int = 1) -> np.ndarray:
+    """沿时间轴平移，空出的位置填充空值"""
+    out = np.full_like(x, np.nan)
+    if periods < x.shape[0]:
+        out[periods:] = x[:-periods]
+    return out
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """真实波幅，第一根K线只取最高价-最低价（与 pandas max(axis=1) 跳过空值一致）"""
+    prev_close = shift(close, 1)
+    return np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+
+def tail_windows(x: np.ndarray, window: int, rows: int) -> np.ndarray:
+    """
+    一维序列最后 rows 个滚动窗口，形状为 (rows, window)。
+    历史不足的位置以空值补齐，对窗口求均值等运算时自然得到空值（与 min_periods=window 一致）。
+    """
+    need = window + rows - 1
+    if len(x) < need:
+        x = np.concatenate([np.full(need - len(x), np.nan), x])
+    return np.lib.stride_tricks.sliding_window_view(x[-need:], window)
+
+
+def compute_indicator_arrays(open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                             close: np.ndarray, volume: np.ndarray,
+                             params: Union[None, Dict, object] = None) -> Dict[str, np.ndarray]:
+    """
+    在K线空间（每列的有效K线连续、空值只出现在前部）计算全部指标。
+    一维数组（单只标的）和二维数组（多只标的）均可。
+    """
+    p = resolve_params(params)
+    valid = ~np.isnan(close)
+    out = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['MA5'] = ema(close, p['ma_periods']['short'])
+        out['MA20'] = ema(close, p['ma_periods']['medium'])
+        out['MA60'] = ema(close, p['ma_periods']['long'])
+
+        delta = close - shift(close, 1)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        gain[~valid] = np.nan
+        loss[~valid] = np.nan
+        rs = rolling_mean(gain, p['rsi_period']) / rolling_mean(loss, p['rsi_period'])
+        out['RSI'] = 100 - (100 / (1 + rs))
+
+        exp1 = ema(close, 12)
+        exp2 = ema(close, 26)
+        out['MACD'] = exp1 - exp2
+        out['Signal'] = ema(out['MACD'], 9)
+        out['MACD_hist'] = out['MACD'] - out['Signal']
+
+        middle = rolling_mean(close, p['bollinger_period'])
+        std = rolling_std(close, p['bollinger_period'])
+        out['BB_upper'] = middle + (std * p['bollinger_std'])
+        out['BB_middle'] = middle
+        out['BB_lower'] = middle - (std * p['bollinger_std'])
+
+        out['Volume_MA'] = rolling_mean(volume, p['volume_ma_period'])
+        out['Volume_Ratio'] = volume / out['Volume_MA']
+
+        out['ATR'] = rolling_mean(true_range(high, low, close), p['atr_period'])
+        out['Volatility'] = out['ATR'] / close * 100
+
+        out['ROC'] = (close / shift(close, 10) - 1) * 100
+
+    return out
+
+
+# -------------------------------
+# 面板
+# -------------------------------
+@dataclasses.dataclass
+class OHLCVPanel:
+    """日期 × 代码 的行情面板，每个字段一个 (日期数, 代码数) 的 float64 数组，无K线处为空值"""
+    dates: np.ndarray
+    symbols: List[str]
+    fields: Dict[str, np.ndarray]
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame]) -> 'OHLCVPanel':
+        """由 {代码: 行情DataFrame} 构建面板，日期取所有代码的并集"""
+        symbols = list(frames)
+        long = pd.concat(
+            [df[['date'] + OHLCV_COLUMNS].assign(symbol=symbol) for symbol, df in frames.items()],
+            ignore_index=True
+        )
+        dates = np.sort(long['date'].unique())
+        row = np.searchsorted(dates, long['date'].to_numpy())
+        col = pd.Categorical(long['symbol'], categories=symbols).codes
+        fields = {}
+        for name in OHLCV_COLUMNS:
+            arr = np.full((len(dates), len(symbols)), np.nan)
+            arr[row, col] = long[name].to_numpy(dtype=np.float64)
+            fields[name] = arr
+        return cls(dates=dates, symbols=symbols, fields=fields)
+
+    def valid_mask(self) -> np.ndarray:
+        """每个位置是否为有效K线（OHLCV 均不为空，与 dropna 后的逐只数据一致）"""
+        mask = np.ones((len(self.dates), len(self.symbols)), dtype=bool)
+        for name in OHLCV_COLUMNS:
+            mask &= ~np.isnan(self.fields[name])
+        return mask
+
+
+class IndicatorPanel:
+    """指标面板：行情字段与指标均为 日期 × 代码 数组"""
+
+    def __init__(self, dates: np.ndarray, symbols: List[str], columns: Dict[str, np.ndarray],
+                 valid: np.ndarray):
+        self.dates = dates
+        self.symbols = symbols
+        self.columns = columns
+        self.valid = valid
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def frame(self, symbol: str) -> pd.DataFrame:
+        """
+        取出单个代码的指标数据，格式与 calculate_indicators 的返回值一致，
+        可以直接传给 calculate_score / get_ai_analysis。
+        """
+        s = self._index[symbol]
+        rows = self.valid[:, s]
+        data = {'date': self.dates[rows]}
+        for name, arr in self.columns.items():
+            data[name] = arr[rows, s]
+        return pd.DataFrame(data)
+
+    def latest(self) -> pd.DataFrame:
+        """每个代码最新一根有效K线的全部字段，以代码为索引"""
+        has_bar = self.valid.any(axis=0)
+        last = len(self.dates) - 1 - np.argmax(self.valid[::-1], axis=0)
+        cols = np.arange(len(self.symbols))
+        data = {'date': np.where(has_bar, self.dates[last], np.datetime64('NaT'))}
+        for name, arr in self.columns.items():
+            data[name] = np.where(has_bar, arr[last, cols], np.nan)
+        return pd.DataFrame(data, index=pd.Index(self.symbols, name='symbol'))
+
+
+def to_bar_space(valid: np.ndarray) -> np.ndarray:
+    """
+    返回把每列有效K线压紧到底部的行序。
+    对每列稳定排序 valid（False 在前），有效K线保持原有先后顺序。
+    """
+    return np.argsort(valid, axis=0, kind='stable')
+
+
+def compute_panel_indicators(panel: OHLCVPanel, params: Union[None, Dict, object] = None) -> IndicatorPanel:
+    """
+    对整个面板批量计算技术指标
+
+    Args:
+        panel: 行情面板
+        params: 指标参数（BaseAnalyzer.params 格式的字典或 TechnicalParams），默认使用 DEFAULT_PARAMS
+
+    Returns:
+        包含行情字段与全部指标的 IndicatorPanel
+    """
+    valid = panel.valid_mask()
+    order = to_bar_space(valid)
+
+    bars = {}
+    for name in OHLCV_COLUMNS:
+        arr = np.where(valid, panel.fields[name], np.nan)
+        bars[name] = np.take_along_axis(arr, order, axis=0)
+
+    computed = compute_indicator_arrays(bars['open'], bars['high'], bars['low'],
+                                        bars['close'], bars['volume'], params)
+
+    columns = {}
+    for name, arr in list(bars.items()) + list(computed.items()):
+        dated = np.full_like(arr, np.nan)
+        np.put_along_axis(dated, order, arr, axis=0)
+        dated[~valid] = np.nan
+        columns[name] = dated
+    return IndicatorPanel(panel.dates, panel.symbols, columns, valid)
@@ -0,0 +1,295 @@
+"""
+参数扫描
+对一组 TechnicalParams 变体和一个股票池一次性计算全盘扫描器（全部股票分析推荐1.py）的打分表。
+
+每只股票只读取一次行情，各变体之间共享中间结果：
+  - 同一周期的 EMA / RSI 只递推一次（多个变体用到同一周期时直接复用）
+  - MACD、OBV、随机指标与参数无关，每只股票只算一次
+  - 成交量均线由累计和相减得到，任意窗口都是 O(1)
+股票按块分配到多个进程并行计算。
+
+变体的均线周期按 短/中/长 三档解释（打分规则比较的是 短>中>长）。
+
+命令行：
+    python param_sweep.py --codes 600000,000001 --grid ma_short=5,10 --grid rsi_period=9,14
+"""
+
+import os
+import argparse
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from indicator_panel import DEFAULT_PARAMS, resolve_params
+from scan_pipeline import pack_ohlcv, unpack_ohlcv
+
+# 网格轴名称 -> 参数字典中的位置
+PARAM_AXES = {
+    'ma_short': ('ma_periods', 'short'),
+    'ma_medium': ('ma_periods', 'medium'),
+    'ma_long': ('ma_periods', 'long'),
+    'rsi_period': ('rsi_period',),
+    'bollinger_period': ('bollinger_period',),
+    'bollinger_std': ('bollinger_std',),
+    'volume_ma_period': ('volume_ma_period',),
+    'atr_period': ('atr_period',),
+}
+
+# 每个进程任务包含的股票数
+DEFAULT_CHUNK_SIZE = 64
+
+logger = logging.getLogger(__name__)
+
+
+def param_grid(base: Union[None, Dict, object] = None, **axes: Sequence) -> List[Dict]:
+    """
+    生成参数网格（各轴取值的笛卡尔积）
+
+    Args:
+        base: 未指定的参数取自 base，默认为标准参数
+        axes: PARAM_AXES 中的轴名称 -> 取值列表，例如 ma_short=[5, 10], rsi_period=[9, 14]
+
+    Returns:
+        参数字典列表（与 TechnicalParams 字段结构相同）
+    """
+    unknown = set(axes) - set(PARAM_AXES)
+    if unknown:
+        raise ValueError(f"未知的参数轴: {', '.join(sorted(unknown))}")
+    base = resolve_params(base)
+    names = list(axes)
+    variants = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        params = {**base, 'ma_periods': dict(base['ma_periods'])}
+        for name, value in zip(names, values):
+            path = PARAM_AXES[name]
+            if len(path) == 2:
+                params[path[0]][path[1]] = value
+            else:
+                params[path[0]] = value
+        variants.append(params)
+    return variants
+
+
+def variant_label(params: Union[Dict, object]) -> str:
+    """变体的简短名称，用作打分表的列名"""
+    p = resolve_params(params)
+    ma = p['ma_periods']
+    return (f"ma{ma['short']}-{ma['medium']}-{ma['long']}_rsi{p['rsi_period']}"
+            f"_vol{p['volume_ma_period']}_bb{p['bollinger_period']}x{p['bollinger_std']}_atr{p['atr_period']}")
+
+
+class SharedSeries:
+    """单只股票在各变体之间共享的中间结果，只保留打分需要的最后一根K线的值"""
+
+    def __init__(self, df: pd.DataFrame):
+        close = df['close'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy(dtype=np.float64)
+        self.volume = volume[-1] if len(volume) else np.nan
+        self._close = pd.Series(close, copy=False)
+        self._volume_cumsum = np.concatenate([[0.0], np.cumsum(volume)])
+        self._ema: Dict[int, float] = {}
+        self._rsi: Dict[int, float] = {}
+
+        # 涨跌幅（首个差分为空），供各周期的 RSI 共用
+        delta = self._close.diff()
+        self._gain = delta.clip(lower=0)
+        self._loss = -delta.clip(upper=0)
+
+        # 与参数无关的指标
+        self.macd = self.ema(12) - self.ema(26)
+        macd_series = self._close.ewm(span=12, adjust=False).mean() - self._close.ewm(span=26, adjust=False).mean()
+        self.signal = macd_series.ewm(span=9, adjust=False).mean().iloc[-1]
+
+        diff = np.nan_to_num(np.diff(close, prepend=np.nan))
+        obv = np.cumsum(np.where(diff > 0, volume, np.where(diff < 0, -volume, 0)))
+        self.obv = obv[-1]
+        self.obv_ma10 = obv[-10:].mean() if len(obv) >= 10 else np.nan
+
+        if len(close) >= 14:
+            window = close[-14:]
+            lowest, highest = window.min(), window.max()
+            self.k = (close[-1] - lowest) / (highest - lowest + 1e-10) * 100
+        else:
+            self.k = np.nan
+
+    def ema(self, span: int) -> float:
+        """收盘价 EMA 的最后一个值"""
+        if span not in self._ema:
+            self._ema[span] = self._close.ewm(span=span, adjust=False).mean().iloc[-1]
+        return self._ema[span]
+
+    def rsi(self, period: int) -> float:
+        """指数加权 RSI 的最后一个值"""
+        if period not in self._rsi:
+            avg_gain = self._gain.ewm(com=period - 1, adjust=False).mean().iloc[-1]
+            avg_loss = self._loss.ewm(com=period - 1, adjust=False).mean().iloc[-1]
+            self._rsi[period] = 100 - (100 / (1 + avg_gain / (avg_loss + 1e-10)))
+        return self._rsi[period]
+
+    def volume_ma(self, window: int) -> float:
+        """成交量窗口均值（累计和相减）"""
+        n = len(self._volume_cumsum) - 1
+        if n < window:
+            return np.nan
+        return (self._volume_cumsum[n] - self._volume_cumsum[n - window]) / window
+
+
+def scanner_score(shared: SharedSeries, params: Union[Dict, object]) -> float:
+    """与全盘扫描器 StockAnalyzer.calculate_score 相同的打分规则"""
+    p = resolve_params(params)
+    ma = p['ma_periods']
+    ma_short, ma_medium, ma_long = shared.ema(ma['short']), shared.ema(ma['medium']), shared.ema(ma['long'])
+    rsi = shared.rsi(p['rsi_period'])
+    volume_ratio = shared.volume / (shared.volume_ma(p['volume_ma_period']) + 1e-10)
+
+    score = 0
+    if ma_short > ma_medium and ma_medium > ma_long:
+        score += 30
+    else:
+        if ma_short > ma_medium:
+            score += 15
+        if ma_medium > ma_long:
+            score += 15
+    if 30 <= rsi <= 70:
+        score += 20
+    elif rsi < 30:
+        score += 15
+    if shared.macd > shared.signal:
+        score += 20
+    if volume_ratio > 1.5:
+        score += 30
+    elif volume_ratio > 1:
+        score += 15
+    score += 5 if shared.obv > shared.obv_ma10 else -5
+    if shared.k < 20:
+        score += 5
+    elif shared.k > 80:
+        score -= 5
+    return score
+
+
+def score_variants(df: pd.DataFrame, variants: Sequence[Dict]) -> List[float]:
+    """对单只股票计算所有变体的打分"""
+    shared = SharedSeries(df)
+    return [scanner_score(shared, params) for params in variants]
+
+
+def _score_chunk(chunk: List[Tuple[str, np.ndarray, np.ndarray]], variants: Sequence[Dict]) -> List[Tuple[str, List[float]]]:
+    """进程任务：对一块股票计算所有变体的打分，输入为 pack_ohlcv 打包的数组"""
+    results = []
+    for code, dates, values in chunk:
+        try:
+            results.append((code, score_variants(unpack_ohlcv(dates, values), variants)))
+        except Exception as e:
+            logger.warning(f"股票 {code} 参数扫描失败: {str(e)}")
+    return results
+
+
+def sweep(frames: Dict[str, pd.DataFrame], variants: Sequence[Union[Dict, object]],
+          processes: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    对股票池计算所有参数变体的打分表
+
+    Args:
+        frames: {股票代码: 行情DataFrame}
+        variants: 参数变体（字典或 TechnicalParams），可由 param_grid 生成
+        processes: 进程数，默认等于CPU核数；为0时在当前进程计算
+        chunk_size: 每个进程任务包含的股票数
+
+    Returns:
+        以股票代码为索引、变体名称为列的打分表
+    """
+    variants = [resolve_params(params) for params in variants]
+    labels = [variant_label(params) for params in variants]
+    processes = (os.cpu_count() or 1) if processes is None else processes
+
+    items = [(code, *pack_ohlcv(df)) for code, df in frames.items() if not df.empty]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    rows = []
+    if processes > 0 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for result in pool.map(_score_chunk, chunks, itertools.repeat(variants)):
+                rows.extend(result)
+    else:
+        for chunk in chunks:
+            rows.extend(_score_chunk(chunk, variants))
+
+    table = pd.DataFrame([scores for _, scores in rows], columns=labels,
+                         index=pd.Index([code for code, _ in rows], name='stock_code'))
+    return table
+
+
+def summarize(table: pd.DataFrame, min_score: float = 85) -> pd.DataFrame:
+    """各变体的平均分和高分股票数量，按高分数量降序"""
+    summary = pd.DataFrame({
+        'mean_score': table.mean(),
+        'high_score_count': (table >= min_score).sum(),
+    })
+    summary.index.name = 'variant'
+    return summary.sort_values(['high_score_count', 'mean_score'], ascending=False)
+
+
+def load_frames(codes: Iterable[str], start_date: Optional[str] = None, end_date: Optional[str] = None,
+                provider=None, max_workers: int = 8) -> Dict[str, pd.DataFrame]:
+    """通过数据源（默认 DATA_SOURCE 指定，带本地增量仓库与限流）并发获取股票池行情"""
+    from data_provider import create_provider
+
+    provider = provider or create_provider()
+    start_date = start_date or (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+    end_date = end_date or datetime.now().strftime('%Y%m%d')
+
+    def fetch(code: str) -> Tuple[str, Optional[pd.DataFrame]]:
+        try:
+            return code, provider.get_stock_history(code, 'A', start_date, end_date)
+        except Exception as e:
+            logger.warning(f"获取股票 {code} 行情失败: {str(e)}")
+            return code, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return {code: df for code, df in pool.map(fetch, codes) if df is not None and not df.empty}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='TechnicalParams 参数扫描')
+    parser.add_argument('--codes', help='股票代码，逗号分隔；不指定时使用全部A股')
+    parser.add_argument('--grid', action='append', default=[],
+                        help=f"参数轴，如 ma_short=5,10（可多次指定，可选: {', '.join(PARAM_AXES)}）")
+    parser.add_argument('--start', help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', help='结束日期 YYYYMMDD')
+    parser.add_argument('--processes', type=int, default=None, help='计算进程数，默认CPU核数')
+    parser.add_argument('--min-score', type=float, default=85, help='高分阈值')
+    parser.add_argument('--output', default='scanner/param_sweep.csv', help='打分表输出路径')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    axes = {}
+    for item in args.grid:
+        name, _, values = item.partition('=')
+        axes[name.strip()] = [float(v) if name.strip() == 'bollinger_std' else int(v) for v in values.split(',')]
+    variants = param_grid(DEFAULT_PARAMS, **axes)
+
+    if args.codes:
+        codes = [code.strip() for code in args.codes.split(',') if code.strip()]
+    else:
+        from data_provider import create_provider
+        codes = create_provider().get_a_share_codes()
+
+    frames = load_frames(codes, args.start, args.end)
+    print(f"股票 {len(frames)} 只，参数变体 {len(variants)} 个")
+    table = sweep(frames, variants, args.processes)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    table.to_csv(args.output, encoding='utf-8-sig')
+    print(summarize(table, args.min_score).to_string())
+    print(f"打分表已保存至 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+"""
+请求限流
+令牌桶限流器，以及按数据源划分令牌桶的请求调度器。
+所有工作线程共享同一个调度器，在不超过上游限额的前提下尽量连续地发出请求。
+AdaptiveConcurrency 按延迟和错误率在线调整同时进行的请求数（AIMD）。
+延迟只统计真正发往上游的请求（数据源用 upstream_call 包裹，在获取令牌之后计时），
+本地缓存命中和令牌等待不计入，避免把基准延迟拉低或把限流等待误判为上游拥塞。
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# 未单独配置的数据源使用的默认限额：每秒请求数, 突发容量
+DEFAULT_RATE_LIMIT = (5.0, 10)
+
+# 当前线程在 AdaptiveConcurrency.slot 内发往上游的请求次数与累计耗时
+_upstream = threading.local()
+
+
+@contextmanager
+def upstream_call():
+    """包裹一次真正发往上游的请求（应在获取令牌之后进入），耗时计入当前线程的并发名额"""
+    begin = time.monotonic()
+    try:
+        yield
+    finally:
+        _upstream.calls = getattr(_upstream, 'calls', 0) + 1
+        _upstream.latency = getattr(_upstream, 'latency', 0.0) + time.monotonic() - begin
+
+
+class TokenBucket:
+    """线程安全的令牌桶
+
+    令牌以 rate 个/秒的速度补充，最多积累 capacity 个，每次请求消耗一个令牌。
+    rate 为 0 或 None 时不限流。
+    """
+
+    def __init__(self, rate: Optional[float], capacity: Optional[int] = None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate or 1))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self.acquired = 0
+        self.waited = 0.0
+
+    def configure(self, rate: Optional[float], capacity: Optional[int] = None) -> None:
+        """调整速率和容量，已积累的令牌按新容量截断"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity or max(1, int(rate or 1))
+            self._tokens = min(self._tokens, float(self.capacity))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(float(self.capacity), self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        """立即尝试获取令牌，不等待"""
+        with self._lock:
+            if not self.rate:
+                self.acquired += tokens
+                return True
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.acquired += tokens
+                return True
+            return False
+
+    def acquire(self, tokens: int = 1, timeout: Optional[float] = None) -> bool:
+        """
+        获取令牌，令牌不足时等待到下一个令牌补充的时刻
+
+        Returns:
+            是否在超时前获取到令牌
+        """
+        begin = time.monotonic()
+        while True:
+            with self._lock:
+                if not self.rate:
+                    self.acquired += tokens
+                    return True
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.acquired += tokens
+                    self.waited += time.monotonic() - begin
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - begin)
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class FetchScheduler:
+    """按数据源划分令牌桶的请求调度器"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 default: Tuple[float, int] = DEFAULT_RATE_LIMIT):
+        """
+        Args:
+            limits: {数据源: (每秒请求数, 突发容量)}
+            default: 未配置数据源的默认限额
+        """
+        self.logger = logging.getLogger(__name__)
+        self.default = default
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        for source, (rate, burst) in (limits or {}).items():
+            self.configure(source, rate, burst)
+
+    @classmethod
+    def from_env(cls) -> 'FetchScheduler':
+        """
+        从环境变量创建调度器
+          RATE_LIMIT_DEFAULT=5:10
+          RATE_LIMITS=eastmoney=8:16,sina=4:8
+        """
+        def parse(value: str) -> Tuple[float, int]:
+            rate, _, burst = value.partition(':')
+            return float(rate), int(burst) if burst else max(1, int(float(rate)))
+
+        default = parse(os.getenv('RATE_LIMIT_DEFAULT', '')) if os.getenv('RATE_LIMIT_DEFAULT') else DEFAULT_RATE_LIMIT
+        limits = {}
+        for item in filter(None, os.getenv('RATE_LIMITS', '').split(',')):
+            source, _, value = item.strip().partition('=')
+            limits[source] = parse(value)
+        return cls(limits, default)
+
+    def bucket(self, source: str) -> TokenBucket:
+        """获取数据源对应的令牌桶，不存在时按默认限额创建"""
+        with self._lock:
+            if source not in self._buckets:
+                self._buckets[source] = TokenBucket(*self.default)
+            return self._buckets[source]
+
+    def configure(self, source: str, rate: Optional[float], burst: Optional[int] = None) -> None:
+        """设置某个数据源的每秒请求数和突发容量"""
+        with self._lock:
+            if source in self._buckets:
+                self._buckets[source].configure(rate, burst)
+            else:
+                self._buckets[source] = TokenBucket(rate, burst)
+
+    def acquire(self, source: str, timeout: Optional[float] = None) -> bool:
+        """在向数据源发出请求前调用，必要时阻塞等待令牌"""
+        return self.bucket(source).acquire(timeout=timeout)
+
+    def stats(self) -> Dict[str, Dict]:
+        """各数据源的限额、已发请求数和累计等待时间"""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {
+            source: {
+                'rate': bucket.rate,
+                'burst': bucket.capacity,
+                'requests': bucket.acquired,
+                'waited': round(bucket.waited, 3)
+            }
+            for source, bucket in buckets.items()
+        }
+
+
+class _Slot:
+    """AdaptiveConcurrency.slot 的结果标记"""
+
+    def __init__(self):
+        self.ok: Optional[bool] = None
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发控制器
+
+    根据请求延迟和错误率在线调整允许同时进行的请求数：
+      - 一个观察窗口（约为当前并发数个请求）内没有异常时，并发数加 increase（加性增）
+      - 窗口内错误率超过 error_threshold，或平均延迟超过历史最低窗口延迟的 latency_tolerance 倍时，
+        并发数乘以 decrease（乘性减）
+    并发数始终在 [min_limit, max_limit] 之间。
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: Optional[int] = None,
+                 increase: float = 1.0, decrease: float = 0.7,
+                 error_threshold: float = 0.1, latency_tolerance: float = 2.0,
+                 throughput_window: float = 10.0):
+        """
+        Args:
+            initial: 初始并发数
+            min_limit / max_limit: 并发数上下限
+            increase: 每个正常窗口增加的并发数
+            decrease: 异常窗口的并发数缩减系数
+            error_threshold: 触发缩减的窗口错误率
+            latency_tolerance: 触发缩减的延迟倍数（相对历史最低窗口平均延迟）
+            throughput_window: 吞吐量统计的时间窗口（秒）
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or initial)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.error_threshold = error_threshold
+        self.latency_tolerance = latency_tolerance
+        self.throughput_window = throughput_window
+        self.logger = logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._window_latency = 0.0
+        self._window_timed = 0
+        self._window_count = 0
+        self._window_errors = 0
+        self._base_latency: Optional[float] = None
+        self._completions: deque = deque()
+        self._started = time.monotonic()
+        self.completed = 0
+        self.errors = 0
+        self.increases = 0
+        self.decreases = 0
+
+    @classmethod
+    def from_env(cls, initial: int, bounds: Optional[Tuple[int, int]] = None) -> 'AdaptiveConcurrency':
+        """
+        创建控制器，并发数范围依次取 bounds、环境变量 FETCH_CONCURRENCY（如 4:40）、
+        默认的 [initial/4, initial*2]
+        """
+        if bounds is None and os.getenv('FETCH_CONCURRENCY'):
+            low, _, high = os.getenv('FETCH_CONCURRENCY').partition(':')
+            bounds = (int(low), int(high or low))
+        low, high = bounds or (max(1, initial // 4), initial * 2)
+        return cls(initial, low, high)
+
+    @property
+    def current(self) -> int:
+        """当前允许的并发数"""
+        return int(self.limit)
+
+    def acquire(self) -> None:
+        """占用一个并发名额，已达当前并发数时等待"""
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency: Optional[float], ok: bool = True) -> None:
+        """
+        释放名额并记录本次请求的结果
+
+        Args:
+            latency: 上游请求耗时（秒），为 None 时没有发出上游请求（如本地缓存命中），不计入延迟统计
+            ok: 是否成功（上游错误为 False；数据本身不满足条件等非上游原因应视为成功）
+        """
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            self.completed += 1
+            self._completions.append(now)
+            while self._completions and now - self._completions[0] > self.throughput_window:
+                self._completions.popleft()
+
+            if latency is None and ok:
+                # 没有上游请求的成功调用不是有效样本
+                self._cond.notify_all()
+                return
+            self._window_count += 1
+            if latency is not None:
+                self._window_timed += 1
+                self._window_latency += latency
+            if not ok:
+                self.errors += 1
+                self._window_errors += 1
+            if self._window_count >= max(5, int(self.limit)):
+                self._adjust()
+            self._cond.notify_all()
+
+    def _adjust(self) -> None:
+        """一个观察窗口结束时调整并发数（调用方持有锁）"""
+        error_rate = self._window_errors / self._window_count
+        avg_latency = self._window_latency / self._window_timed if self._window_timed else None
+        # 基准延迟取历史最低窗口延迟，并缓慢上浮，上游整体变慢后不会一直缩减
+        if avg_latency is not None:
+            if self._base_latency is None:
+                self._base_latency = avg_latency
+            else:
+                self._base_latency = min(avg_latency, self._base_latency * 1.05)
+
+        congested = (error_rate > self.error_threshold
+                     or (avg_latency is not None and avg_latency > self._base_latency * self.latency_tolerance))
+        if congested:
+            new_limit = max(float(self.min_limit), self.limit * self.decrease)
+            if new_limit < self.limit:
+                self.decreases += 1
+            if int(new_limit) < int(self.limit):
+                self.logger.info(f"并发数下调：{int(self.limit)} -> {int(new_limit)}"
+                                 f"（错误率 {error_rate:.0%}，平均延迟 {avg_latency or 0:.2f}s）")
+        else:
+            new_limit = min(float(self.max_limit), self.limit + self.increase)
+            if new_limit > self.limit:
+                self.increases += 1
+        self.limit = new_limit
+        self._window_count = 0
+        self._window_latency = 0.0
+        self._window_timed = 0
+        self._window_errors = 0
+
+    @contextmanager
+    def slot(self):
+        """
+        包裹一次请求：占用名额，并在结束时按结果反馈。
+        延迟取块内 upstream_call 的累计耗时，没有上游请求（缓存命中）时不计入延迟统计。
+        请求抛出异常时记为失败；调用方可通过 slot.ok = True 把非上游原因的异常记为成功。
+        """
+        self.acquire()
+        slot = _Slot()
+        _upstream.calls = 0
+        _upstream.latency = 0.0
+        try:
+            yield slot
+        except BaseException:
+            if slot.ok is None:
+                slot.ok = False
+            raise
+        finally:
+            self.release(_upstream.latency if _upstream.calls else None, slot.ok is not False)
+
+    def throughput(self) -> float:
+        """最近 throughput_window 秒内每秒完成的请求数"""
+        with self._cond:
+            now = time.monotonic()
+            recent = sum(1 for t in self._completions if now - t <= self.throughput_window)
+        return recent / max(min(self.throughput_window, now - self._started), 1e-3)
+
+    def stats(self) -> Dict:
+        """当前并发数、在途请求数、吞吐量与调整次数"""
+        with self._cond:
+            stats = {
+                'limit': int(self.limit),
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'in_flight': self._in_flight,
+                'completed': self.completed,
+                'errors': self.errors,
+                'increases': self.increases,
+                'decreases': self.decreases,
+            }
+        stats['throughput'] = round(self.throughput(), 2)
+        return stats
+
+
+_default_scheduler: Optional[FetchScheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> FetchScheduler:
+    """获取进程内共享的调度器，首次调用时从环境变量创建"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = FetchScheduler.from_env()
+        return _default_scheduler
+
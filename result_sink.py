@@ -0,0 +1,77 @@
+"""
+扫描结果收集
+TopKSink 逐条接收扫描结果，只保留评分达到阈值的记录，设置 k 时再只保留评分最高的 k 条（最小堆）。
+内存占用与保留的记录数成正比，与扫描的股票总数无关；随时可以取出按评分从高到低排列的快照，
+用于中间结果保存和最终输出，不需要对全部结果建表排序。
+"""
+
+import heapq
+import math
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class TopKSink:
+    """线程安全的 阈值 + Top-K 结果收集器"""
+
+    def __init__(self, k: Optional[int] = None, min_score: Optional[float] = None, key: str = 'score'):
+        """
+        Args:
+            k: 最多保留的记录数，为 None 时保留所有达到阈值的记录
+            min_score: 评分阈值，低于阈值的记录直接丢弃
+            key: 记录中评分字段名
+        """
+        if k is not None and k <= 0:
+            raise ValueError(f"k 必须为正整数: {k}")
+        self.k = k
+        self.min_score = min_score
+        self.key = key
+        self._lock = threading.Lock()
+        # (评分, -序号, 记录)：堆顶为最先被淘汰的记录，同分时先到的记录优先保留
+        self._heap: List[tuple] = []
+        self._seq = 0
+        self.seen = 0
+
+    def add(self, record: Dict) -> bool:
+        """加入一条记录，返回是否被保留"""
+        score = float(record[self.key])
+        with self._lock:
+            self.seen += 1
+            if math.isnan(score) or (self.min_score is not None and score < self.min_score):
+                return False
+            item = (score, -self._seq, record)
+            self._seq += 1
+            if self.k is None or len(self._heap) < self.k:
+                heapq.heappush(self._heap, item)
+                return True
+            if item[:2] > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, item)
+                return True
+            return False
+
+    def update(self, records: Iterable[Dict]) -> int:
+        """批量加入记录，返回被保留的条数"""
+        return sum(self.add(record) for record in records)
+
+    @property
+    def threshold(self) -> Optional[float]:
+        """当前进入结果所需的最低评分（已满 k 条时为第 k 名的评分）"""
+        with self._lock:
+            if self.k is not None and len(self._heap) >= self.k:
+                return self._heap[0][0]
+            return self.min_score
+
+    def snapshot(self) -> List[Dict]:
+        """按评分从高到低排列的当前结果"""
+        with self._lock:
+            items = list(self._heap)
+        return [record for _, _, record in sorted(items, reverse=True)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def stats(self) -> Dict:
+        """已接收与保留的记录数"""
+        with self._lock:
+            return {'seen': self.seen, 'kept': len(self._heap), 'k': self.k, 'min_score': self.min_score}
@@ -0,0 +1,302 @@
+"""
+扫描结果库
+每次扫描（全盘扫描器或 StockAnalyzer.scan_market）记为一次 run，每只股票的打分结果写入本地 SQLite，
+一行对应 一次扫描 × 一只股票。历史结果通过索引直接查询，不需要重新扫描：
+  - 新入选：本次评分达到阈值、上一次（默认为前一个交易日的扫描）未达到的股票
+  - 单只股票历次扫描的评分
+  - 两次扫描之间的评分变化
+
+结果在扫描过程中分批写入，不在内存中保留。
+
+命令行：
+    python results_store.py runs
+    python results_store.py new --min-score 85
+    python results_store.py history 600519
+    python results_store.py diff 12 15
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 默认数据库路径，与行情仓库共用 cache 目录
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'scan_results.db')
+
+# 单独成列的报告字段，其余字段保存在 report JSON 中
+RESULT_COLUMNS = ['score', 'price', 'price_change', 'recommendation']
+
+# 每积累多少条结果写入一次
+DEFAULT_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    market TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    params TEXT,
+    total INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    code TEXT NOT NULL,
+    score REAL,
+    price REAL,
+    price_change REAL,
+    recommendation TEXT,
+    report TEXT,
+    PRIMARY KEY (run_id, code)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_results_code ON results(code, run_id);
+CREATE INDEX IF NOT EXISTS idx_results_score ON results(run_id, score);
+CREATE INDEX IF NOT EXISTS idx_runs_source ON runs(source, market, finished_at);
+"""
+
+
+def _json_default(value):
+    """NumPy 标量转为 Python 原生类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultsStore:
+    """SQLite 扫描结果库（线程安全）"""
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            path: 数据库文件路径，默认读取环境变量 SCAN_RESULTS_DB
+            batch_size: 每积累多少条结果提交一次
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path or os.getenv('SCAN_RESULTS_DB') or DEFAULT_DB_PATH
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: Dict[int, List[tuple]] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    # ---------------- 写入 ----------------
+
+    def start_run(self, source: str, market: str = 'A', params: Optional[Dict] = None) -> int:
+        """登记一次扫描，返回 run_id"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO runs (source, market, started_at, params) VALUES (?, ?, ?, ?)',
+                (source, market, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                 json.dumps(params or {}, ensure_ascii=False, default=_json_default)))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def add(self, run_id: int, report: Dict) -> None:
+        """加入一条打分结果，攒够 batch_size 条后写入"""
+        row = (run_id, str(report['stock_code']),
+               *(_number(report.get(name)) for name in RESULT_COLUMNS[:3]),
+               report.get('recommendation'),
+               json.dumps(report, ensure_ascii=False, default=_json_default))
+        with self._lock:
+            pending = self._pending.setdefault(run_id, [])
+            pending.append(row)
+            if len(pending) >= self.batch_size:
+                self._flush_locked(run_id)
+
+    def add_many(self, run_id: int, reports: Iterable[Dict]) -> None:
+        for report in reports:
+            self.add(run_id, report)
+
+    def _flush_locked(self, run_id: int) -> None:
+        rows = self._pending.pop(run_id, [])
+        if rows:
+            # 同一次扫描中重复的股票（如续扫时重新处理）以最后一次结果为准
+            self._conn.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.commit()
+
+    def flush(self, run_id: int) -> None:
+        """写入尚未提交的结果"""
+        with self._lock:
+            self._flush_locked(run_id)
+
+    def finish_run(self, run_id: int) -> None:
+        """写入剩余结果并标记扫描完成；未完成的扫描不参与默认的对比查询"""
+        with self._lock:
+            self._flush_locked(run_id)
+            self._conn.execute(
+                'UPDATE runs SET finished_at = ?, total = (SELECT COUNT(*) FROM results WHERE run_id = ?) '
+                'WHERE run_id = ?', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), run_id, run_id))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            for run_id in list(self._pending):
+                self._flush_locked(run_id)
+            self._conn.close()
+
+    # ---------------- 查询 ----------------
+
+    def _query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [item[0] for item in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def runs(self, source: Optional[str] = None, limit: int = 20) -> pd.DataFrame:
+        """最近的扫描记录"""
+        where, params = ('WHERE source = ?', (source,)) if source else ('', ())
+        return self._query(f'SELECT run_id, source, market, started_at, finished_at, total, params '
+                           f'FROM runs {where} ORDER BY run_id DESC LIMIT ?', params + (limit,))
+
+    def latest_run(self, source: str = 'scanner', market: str = 'A') -> Optional[int]:
+        """最近一次完成的扫描"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT MAX(run_id) FROM runs WHERE source = ? AND market = ? AND finished_at IS NOT NULL',
+                (source, market)).fetchone()
+        return row[0] if row else None
+
+    def previous_run(self, run_id: int, earlier_day: bool = True) -> Optional[int]:
+        """
+        同一来源、同一市场在 run_id 之前最近一次完成的扫描
+
+        Args:
+            earlier_day: 只考虑开始日期早于 run_id 当天的扫描（即“昨天”的扫描），同一天多次扫描时不互相比较
+        """
+        day_filter = "AND date(p.started_at) < date(r.started_at)" if earlier_day else ''
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT MAX(p.run_id) FROM runs r JOIN runs p ON p.source = r.source AND p.market = r.market '
+                f'WHERE r.run_id = ? AND p.run_id < r.run_id AND p.finished_at IS NOT NULL {day_filter}',
+                (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def run_results(self, run_id: int, min_score: Optional[float] = None) -> pd.DataFrame:
+        """某次扫描的结果，按评分从高到低"""
+        return self._query(
+            'SELECT code, score, price, price_change, recommendation FROM results '
+            'WHERE run_id = ? AND score >= ? ORDER BY score DESC, code',
+            (run_id, min_score if min_score is not None else float('-inf')))
+
+    def new_entrants(self, run_id: Optional[int] = None, since_run: Optional[int] = None,
+                     min_score: float = 85, source: str = 'scanner', market: str = 'A') -> pd.DataFrame:
+        """
+        本次评分达到 min_score、对比扫描中未达到（或未出现）的股票
+
+        Args:
+            run_id: 本次扫描，默认为最近一次完成的扫描
+            since_run: 对比的扫描，默认为前一个交易日最近一次完成的扫描
+        """
+        run_id = run_id or self.latest_run(source, market)
+        if run_id is None:
+            return pd.DataFrame(columns=['code', 'score', 'previous_score', 'price', 'recommendation'])
+        since_run = since_run or self.previous_run(run_id)
+        return self._query(
+            'SELECT r.code, r.score, p.score AS previous_score, r.price, r.recommendation '
+            'FROM results r LEFT JOIN results p ON p.run_id = ? AND p.code = r.code '
+            'WHERE r.run_id = ? AND r.score >= ? AND (p.score IS NULL OR p.score < ?) '
+            'ORDER BY r.score DESC, r.code',
+            (since_run, run_id, min_score, min_score))
+
+    def score_history(self, code: str, source: Optional[str] = None, limit: Optional[int] = None) -> pd.DataFrame:
+        """单只股票历次扫描的评分，按时间先后"""
+        where, params = ('AND u.source = ?', (code, source)) if source else ('', (code,))
+        return self._query(
+            f'SELECT * FROM (SELECT r.run_id, u.source, u.started_at, r.score, r.price, r.price_change, '
+            f'r.recommendation FROM results r JOIN runs u ON u.run_id = r.run_id '
+            f'WHERE r.code = ? {where} ORDER BY r.run_id DESC LIMIT ?) ORDER BY run_id',
+            params + (limit if limit is not None else -1,))
+
+    def diff(self, run_a: int, run_b: int, min_score: Optional[float] = None) -> pd.DataFrame:
+        """
+        两次扫描的对比
+
+        Args:
+            min_score: 只保留至少一侧评分达到该值的股票
+
+        Returns:
+            code, score_a, score_b, delta, change（new / dropped / up / down / same），按 delta 从大到小
+        """
+        threshold = min_score if min_score is not None else float('-inf')
+        table = self._query(
+            'SELECT b.code, a.score AS score_a, b.score AS score_b FROM results b '
+            'LEFT JOIN results a ON a.run_id = ? AND a.code = b.code WHERE b.run_id = ? '
+            'AND (b.score >= ? OR a.score >= ?) '
+            'UNION ALL '
+            'SELECT a.code, a.score, NULL FROM results a '
+            'WHERE a.run_id = ? AND a.score >= ? '
+            'AND NOT EXISTS (SELECT 1 FROM results b WHERE b.run_id = ? AND b.code = a.code)',
+            (run_a, run_b, threshold, threshold, run_a, threshold, run_b))
+        table['delta'] = table['score_b'] - table['score_a']
+        table['change'] = np.select(
+            [table['score_a'].isna(), table['score_b'].isna(), table['delta'] > 0, table['delta'] < 0],
+            ['new', 'dropped', 'up', 'down'], 'same')
+        return table.sort_values(['delta', 'code'], ascending=[False, True], na_position='first').reset_index(drop=True)
+
+
+_default_store: Optional[ResultsStore] = None
+_default_lock = threading.Lock()
+
+
+def get_results_store() -> ResultsStore:
+    """获取进程内共享的结果库，首次调用时按环境变量创建"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ResultsStore()
+        return _default_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='扫描结果库查询')
+    parser.add_argument('--db', help='数据库路径，默认 SCAN_RESULTS_DB 或 cache/scan_results.db')
+    parser.add_argument('--source', default='scanner', help='扫描来源：scanner（全盘扫描）或 scan_market')
+    parser.add_argument('--market', default='A', help='市场')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('runs', help='最近的扫描记录')
+    new = commands.add_parser('new', help='新入选的高分股票')
+    new.add_argument('--run', type=int, help='本次扫描，默认最近一次')
+    new.add_argument('--since', type=int, help='对比扫描，默认前一个交易日')
+    new.add_argument('--min-score', type=float, default=85)
+    history = commands.add_parser('history', help='单只股票的评分历史')
+    history.add_argument('code')
+    history.add_argument('--limit', type=int)
+    diff = commands.add_parser('diff', help='两次扫描的对比')
+    diff.add_argument('run_a', type=int)
+    diff.add_argument('run_b', type=int)
+    diff.add_argument('--min-score', type=float)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.command == 'runs':
+        table = store.runs(args.source)
+    elif args.command == 'new':
+        table = store.new_entrants(args.run, args.since, args.min_score, args.source, args.market)
+    elif args.command == 'history':
+        table = store.score_history(args.code, args.source, args.limit)
+    else:
+        table = store.diff(args.run_a, args.run_b, args.min_score)
+    print(table.to_string(index=False) if not table.empty else '没有符合条件的记录')
+
+
+if __name__ == '__main__':
+    main()
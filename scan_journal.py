@@ -0,0 +1,208 @@
+"""
+扫描断点日志
+全盘扫描中每只股票的处理结果（完成、跳过及原因、失败及原因）以 JSON 行追加写入日志文件。
+扫描中断或重启后读取日志，只处理尚未记录或上次失败的股票，已完成的结果直接复用。
+
+  - 只追加，不重写：每条记录写入后立即 flush，进程崩溃不会丢失已写入的记录
+  - 按条数或时间间隔批量 fsync，断电时最多丢失最后一批记录
+  - 读取时忽略崩溃时写了一半的最后一行
+  - 首行记录扫描参数，参数不同的旧日志不会被续用
+  - 内存中只保留每只股票的最新状态，分析结果按需从文件流式读取
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# 记录状态
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# 默认批量 fsync 的条数与时间间隔（秒）
+DEFAULT_FSYNC_EVERY = 100
+DEFAULT_FSYNC_INTERVAL = 5.0
+
+
+def _json_default(value):
+    """NumPy 标量转为 Python 原生类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+class ScanJournal:
+    """追加写入的扫描断点日志（JSONL）"""
+
+    def __init__(self, path: str, meta: Optional[Dict] = None, resume: bool = True,
+                 fsync_every: int = DEFAULT_FSYNC_EVERY,
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        """
+        Args:
+            path: 日志文件路径
+            meta: 扫描参数（如打分阈值、指标参数），与已有日志首行不同时不续用旧日志
+            resume: 是否续用已有日志；为 False 时旧日志改名保留，重新开始
+            fsync_every: 每写入多少条记录 fsync 一次
+            fsync_interval: 距上次 fsync 超过多少秒时 fsync
+        """
+        self.path = path
+        self.meta = meta or {}
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._status: Dict[str, str] = {}
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path):
+            if resume and self._load():
+                self.logger.info(f"续用扫描日志 {path}：已有 {len(self._status)} 条记录")
+            else:
+                self._retire()
+        new_file = not os.path.exists(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        if new_file:
+            self._write({'type': 'header', 'meta': self.meta,
+                         'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+            self.sync()
+
+    def _load(self) -> bool:
+        """读取已有日志，返回是否可以续用"""
+        status = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        if header.get('type') != 'header' or header.get('meta') != json.loads(
+                json.dumps(self.meta, default=_json_default)):
+            self.logger.info(f"扫描日志 {self.path} 的扫描参数不同，不再续用")
+            return False
+        tail_complete = True
+        for n, line in enumerate(lines[1:], 1):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 只有最后一行可能因崩溃而不完整
+                if n == len(lines) - 1:
+                    self.logger.warning(f"忽略扫描日志 {self.path} 末尾不完整的记录")
+                    tail_complete = False
+                    continue
+                raise ValueError(f"扫描日志 {self.path} 第 {n + 1} 行损坏")
+            status[entry['code']] = entry['status']
+        if not lines[-1].endswith('\n'):
+            # 最后一行没有换行：不完整的截掉，完整的补上换行，后续追加从新的一行开始
+            with open(self.path, 'r+', encoding='utf-8') as f:
+                if tail_complete:
+                    f.seek(0, os.SEEK_END)
+                    f.write('\n')
+                else:
+                    f.truncate(sum(len(line.encode('utf-8')) for line in lines[:-1]))
+        self._status = status
+        return True
+
+    def _retire(self) -> None:
+        """旧日志改名保留"""
+        retired = f"{self.path}.{datetime.now().strftime('%H%M%S')}.old"
+        os.replace(self.path, retired)
+        self.logger.info(f"旧扫描日志已改名为 {retired}")
+
+    def _write(self, entry: Dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=_json_default) + '\n')
+        self._file.flush()
+        self._unsynced += 1
+
+    def record(self, code: str, status: str, report: Optional[Dict] = None, reason: str = '') -> None:
+        """追加一条处理结果"""
+        entry = {'code': code, 'status': status, 'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        if report is not None:
+            entry['report'] = report
+        if reason:
+            entry['reason'] = reason
+        with self._lock:
+            self._write(entry)
+            self._status[code] = status
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+
+    def _sync_locked(self) -> None:
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self) -> None:
+        """立即 fsync"""
+        with self._lock:
+            self._sync_locked()
+
+    def close(self) -> None:
+        """fsync 并关闭文件"""
+        with self._lock:
+            if not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+    def __enter__(self) -> 'ScanJournal':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def pending(self, codes: Iterable[str]) -> List[str]:
+        """尚未记录或上次失败、需要（重新）处理的代码，保持原有顺序"""
+        with self._lock:
+            return [code for code in codes
+                    if self._status.get(code) not in (DONE, SKIPPED)]
+
+    def reports(self) -> Iterator[Dict]:
+        """逐条读取已完成股票的分析结果（从文件流式读取，不在内存中保留）"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+        for entry in read_journal(self.path, lazy=True):
+            if entry['status'] == DONE and self._status.get(entry['code']) == DONE:
+                yield entry['report']
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的股票数"""
+        counts = {DONE: 0, SKIPPED: 0, FAILED: 0}
+        with self._lock:
+            for status in self._status.values():
+                counts[status] += 1
+        return counts
+
+
+def _iter_journal(path: str) -> Iterator[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        previous = None
+        for n, line in enumerate(f, 1):
+            if previous is not None:
+                # 上一行不是最后一行，解析失败说明文件损坏
+                raise ValueError(f"扫描日志 {path} 第 {previous} 行损坏")
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                previous = n
+                continue
+            if entry.get('type') != 'header':
+                yield entry
+
+
+def read_journal(path: str, lazy: bool = False):
+    """
+    读取日志中的全部记录（不含首行），忽略不完整的最后一行，用于离线查看或合并
+
+    Args:
+        lazy: 为 True 时返回逐行解析的迭代器，不一次性读入整个文件
+    """
+    entries = _iter_journal(path)
+    return entries if lazy else list(entries)
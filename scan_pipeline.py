@@ -0,0 +1,173 @@
+"""
+流式扫描流水线
+universe -> 各处理阶段 -> sink，阶段之间用有界队列连接。
+每个阶段有独立的工作线程，慢任务只占用一个线程，不会阻塞其他标的；
+队列满时上游阶段自动等待（背压），内存占用与标的总数无关。
+"""
+
+import queue
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_provider import OHLCV_COLUMNS
+
+# 阶段结束标记
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    """流水线阶段
+
+    Attributes:
+        name: 阶段名称
+        func: 处理函数 func(payload) -> payload，返回 None 表示该标的被跳过
+        workers: 工作线程数
+    """
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+class ScanPipeline:
+    """由有界队列连接的多阶段流水线"""
+
+    def __init__(self, stages: List[Stage], sink: Callable[[Any], None],
+                 queue_size: int = 64,
+                 on_item_done: Optional[Callable[[], None]] = None,
+                 on_error: Optional[Callable[[str, Any, Exception], None]] = None):
+        """
+        Args:
+            stages: 按顺序执行的处理阶段
+            sink: 结果接收函数，只在单个线程中调用，无需线程安全
+            queue_size: 每个阶段输入队列的容量
+            on_item_done: 每个输入标的处理结束（完成、跳过或失败）时调用，用于进度显示
+            on_error: 阶段处理抛出异常时调用 on_error(阶段名, 输入, 异常)
+        """
+        self.stages = stages
+        self.sink = sink
+        self.queue_size = queue_size
+        self.on_item_done = on_item_done
+        self.on_error = on_error
+        self.logger = logging.getLogger(__name__)
+        self.stats: Dict[str, Dict[str, int]] = {
+            stage.name: {'processed': 0, 'skipped': 0, 'failed': 0} for stage in stages
+        }
+        self._stats_lock = threading.Lock()
+
+    def _item_done(self) -> None:
+        if self.on_item_done:
+            try:
+                self.on_item_done()
+            except Exception as e:
+                self.logger.error(f"流水线进度回调失败：{str(e)}")
+
+    def _failed(self, stage: str, payload: Any, error: Exception) -> None:
+        """记录阶段失败；on_error 自身抛出的异常只记录日志，不终止工作线程"""
+        self._count(stage, 'failed')
+        if not self.on_error:
+            self.logger.error(f"流水线阶段 {stage} 处理失败：{str(error)}")
+            return
+        try:
+            self.on_error(stage, payload, error)
+        except Exception as e:
+            self.logger.error(f"流水线阶段 {stage} 失败回调出错：{str(e)}（原始错误：{str(error)}）")
+
+    def _count(self, stage: str, key: str) -> None:
+        with self._stats_lock:
+            self.stats[stage][key] += 1
+
+    def run(self, items: Iterable[Any]) -> Dict[str, Dict[str, int]]:
+        """运行流水线直到所有输入处理完毕，返回各阶段统计"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+
+        def produce():
+            for item in items:
+                queues[0].put(item)
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_STOP)
+
+        def make_worker(index: int, stage: Stage, remaining: List[int], lock: threading.Lock):
+            inbox, outbox = queues[index], queues[index + 1]
+            next_workers = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+
+            def work():
+                try:
+                    while True:
+                        payload = inbox.get()
+                        if payload is _STOP:
+                            break
+                        try:
+                            result = stage.func(payload)
+                        except Exception as e:
+                            self._failed(stage.name, payload, e)
+                            self._item_done()
+                            continue
+                        if result is None:
+                            self._count(stage.name, 'skipped')
+                            self._item_done()
+                            continue
+                        self._count(stage.name, 'processed')
+                        outbox.put(result)
+                finally:
+                    # 本阶段最后一个退出的线程通知下游结束（即使线程异常退出，下游也不会一直等待）
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        for _ in range(next_workers):
+                            outbox.put(_STOP)
+            return work
+
+        def consume():
+            inbox = queues[-1]
+            while True:
+                payload = inbox.get()
+                if payload is _STOP:
+                    break
+                try:
+                    self.sink(payload)
+                except Exception as e:
+                    self.logger.error(f"流水线结果处理失败：{str(e)}")
+                finally:
+                    self._item_done()
+
+        threads.append(threading.Thread(target=produce, name='pipeline-universe', daemon=True))
+        for index, stage in enumerate(self.stages):
+            remaining, lock = [stage.workers], threading.Lock()
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=make_worker(index, stage, remaining, lock),
+                                                name=f'pipeline-{stage.name}-{n}', daemon=True))
+        threads.append(threading.Thread(target=consume, name='pipeline-sink', daemon=True))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.stats
+
+
+def pack_ohlcv(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把行情数据打包为两个连续的 NumPy 数组，用于跨进程传递。
+    相比直接序列化 DataFrame，只复制数值缓冲区，不携带索引、对象列和块管理器。
+
+    Returns:
+        (日期 int64 纳秒时间戳数组, 形状为 (行数, 5) 的 float64 OHLCV 数组)
+    """
+    dates = df['date'].to_numpy(dtype='datetime64[ns]').view('int64')
+    values = np.ascontiguousarray(df[OHLCV_COLUMNS].to_numpy(dtype=np.float64))
+    return dates, values
+
+
+def unpack_ohlcv(dates: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+    """pack_ohlcv 的逆操作，还原为标准行情 DataFrame"""
+    df = pd.DataFrame(values, columns=OHLCV_COLUMNS)
+    df.insert(0, 'date', dates.view('datetime64[ns]'))
+    return df
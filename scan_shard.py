@@ -0,0 +1,220 @@
+"""
+分片扫描与结果合并
+多台机器各自扫描全市场的一个互不重叠的分片（按代码的稳定哈希分配，与机器和进程无关），
+断点日志写入共享目录（如 NFS/SMB 挂载目录），全部分片完成后由合并命令汇总为一份排序结果和按价格区间的报告。
+
+  - 分片 i/n 负责 crc32(代码) % n == i 的股票，同一代码在所有机器上总是落在同一分片
+  - 每个分片写自己的日志 scan_YYYYMMDD.shard{i}of{n}.jsonl，完成后写 .done 标记
+  - 合并时读取当天全部分片日志，同一代码以最后写入的日志为准，并报告缺失或未完成的分片
+
+命令行：
+    python scan_shard.py scan --shard 0/4 --journal-dir /mnt/shared/journal
+    python scan_shard.py merge --journal-dir /mnt/shared/journal --shards 4
+"""
+
+import os
+import re
+import glob
+import json
+import zlib
+import logging
+import argparse
+import importlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from result_sink import TopKSink
+from scan_journal import DONE, read_journal
+
+# 分片日志文件名中的分片编号
+SHARD_PATTERN = re.compile(r'\.shard(\d+)of(\d+)\.jsonl$')
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """解析 "i/n" 形式的分片参数"""
+    index, _, count = text.partition('/')
+    index, count = int(index), int(count)
+    if count <= 0 or not 0 <= index < count:
+        raise ValueError(f"无效的分片参数: {text}，应为 i/n 且 0 <= i < n")
+    return index, count
+
+
+def shard_from_env() -> Optional[Tuple[int, int]]:
+    """从环境变量 SCAN_SHARD（如 0/4）读取分片参数，未设置时返回 None（不分片）"""
+    text = os.getenv('SCAN_SHARD', '').strip()
+    return parse_shard(text) if text else None
+
+
+def shard_of(code: str, count: int) -> int:
+    """代码所属的分片（稳定哈希，不受 PYTHONHASHSEED 影响）"""
+    return zlib.crc32(str(code).encode('utf-8')) % count
+
+
+def select_shard(codes: Sequence[str], shard: Optional[Tuple[int, int]]) -> List[str]:
+    """保留属于该分片的代码，保持原有顺序"""
+    if shard is None:
+        return list(codes)
+    index, count = shard
+    return [code for code in codes if shard_of(code, count) == index]
+
+
+def journal_name(date: str, shard: Optional[Tuple[int, int]] = None) -> str:
+    """断点日志文件名"""
+    if shard is None:
+        return f"scan_{date}.jsonl"
+    return f"scan_{date}.shard{shard[0]}of{shard[1]}.jsonl"
+
+
+def mark_done(journal_path: str, counts: Dict[str, int]) -> None:
+    """分片扫描完成后写入完成标记"""
+    with open(f"{journal_path}.done", 'w', encoding='utf-8') as f:
+        json.dump({'finished': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'counts': counts}, f,
+                  ensure_ascii=False)
+
+
+@dataclass
+class MergeResult:
+    """分片合并结果"""
+    reports: List[Dict]                                   # 达到阈值的结果，按评分从高到低
+    total: int = 0                                        # 合并的股票数（已完成）
+    shards: List[int] = field(default_factory=list)       # 找到的分片
+    missing: List[int] = field(default_factory=list)      # 缺失的分片
+    unfinished: List[int] = field(default_factory=list)   # 没有完成标记的分片
+    run_id: Optional[int] = None                          # 写入结果库的 run_id
+
+
+def shard_journals(journal_dir: str, date: Optional[str] = None,
+                   shards: Optional[int] = None) -> Tuple[Dict[int, str], int]:
+    """
+    查找共享目录中某一天的分片日志
+
+    Args:
+        journal_dir: 断点日志目录
+        date: 日期 YYYYMMDD，默认当天
+        shards: 预期的分片数，默认取日志文件名中的分片数
+
+    Returns:
+        ({分片编号: 日志路径}, 分片数)
+    """
+    date = date or datetime.now().strftime('%Y%m%d')
+    paths = {}
+    for path in sorted(glob.glob(os.path.join(journal_dir, f"scan_{date}.shard*of*.jsonl"))):
+        index, count = map(int, SHARD_PATTERN.search(path).groups())
+        shards = shards or count
+        if count != shards:
+            logging.getLogger(__name__).warning(f"忽略分片数不同的日志 {path}（{count} != {shards}）")
+            continue
+        paths[index] = path
+    if not paths:
+        raise FileNotFoundError(f"{journal_dir} 中没有 {date} 的分片日志")
+    return paths, shards
+
+
+def shard_status(journal_dir: str, date: Optional[str] = None,
+                 shards: Optional[int] = None) -> Tuple[List[int], List[int]]:
+    """缺失的分片与没有完成标记的分片"""
+    paths, shards = shard_journals(journal_dir, date, shards)
+    return ([i for i in range(shards) if i not in paths],
+            [i for i, path in sorted(paths.items()) if not os.path.exists(f"{path}.done")])
+
+
+def merge_journals(journal_dir: str, date: Optional[str] = None, min_score: float = 85,
+                   top_k: Optional[int] = None, shards: Optional[int] = None,
+                   results_store=None) -> MergeResult:
+    """
+    合并共享目录中某一天的全部分片日志
+
+    Args:
+        journal_dir: 断点日志目录
+        date: 日期 YYYYMMDD，默认当天
+        min_score / top_k: 结果阈值与最多保留条数
+        shards: 预期的分片数，默认取日志文件名中的分片数
+        results_store: 不为 None 时把合并后的全部打分结果写入结果库（source='scanner'）
+    """
+    paths, shards = shard_journals(journal_dir, date, shards)
+    missing, unfinished = shard_status(journal_dir, date, shards)
+
+    run_id = results_store.start_run('scanner', 'A', {'merged_shards': shards}) if results_store else None
+    # 同一代码以最后写入的日志为准（按修改时间排序），失败记录不覆盖已完成的结果；低分结果只保留状态
+    latest: Dict[str, Tuple[str, Optional[Dict]]] = {}
+    for index in sorted(paths, key=lambda i: os.path.getmtime(paths[i])):
+        for entry in read_journal(paths[index], lazy=True):
+            code = entry['code']
+            if entry['status'] == DONE:
+                report = entry['report']
+                latest[code] = (DONE, report if float(report['score']) >= min_score else None)
+                if run_id is not None:
+                    results_store.add(run_id, report)
+            elif latest.get(code, (None,))[0] != DONE:
+                latest[code] = (entry['status'], None)
+
+    sink = TopKSink(k=top_k, min_score=min_score)
+    total = 0
+    for status, report in latest.values():
+        if status == DONE:
+            total += 1
+            if report is not None:
+                sink.add(report)
+    if run_id is not None:
+        results_store.finish_run(run_id)
+
+    return MergeResult(reports=sink.snapshot(), total=total, shards=sorted(paths),
+                       missing=missing, unfinished=unfinished, run_id=run_id)
+
+
+def _scanner_module():
+    """全盘扫描器模块（文件名为中文，按名称导入）"""
+    return importlib.import_module('全部股票分析推荐1')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='分片扫描与结果合并')
+    parser.add_argument('--journal-dir', default='scanner/journal', help='断点日志目录（多机时为共享目录）')
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan = commands.add_parser('scan', help='扫描一个分片')
+    scan.add_argument('--shard', required=True, help='分片 i/n，如 0/4')
+    scan.add_argument('--workers', type=int, default=20, help='行情获取并发数')
+    merge = commands.add_parser('merge', help='合并各分片的日志，输出排序结果和价格区间报告')
+    merge.add_argument('--date', help='日期 YYYYMMDD，默认当天')
+    merge.add_argument('--shards', type=int, help='预期分片数，默认取日志文件名中的分片数')
+    merge.add_argument('--min-score', type=float, default=85)
+    merge.add_argument('--top-k', type=int, help='最多输出的股票数')
+    merge.add_argument('--allow-partial', action='store_true', help='有分片缺失或未完成时仍输出报告')
+    merge.add_argument('--no-store', action='store_true', help='不把合并结果写入结果库')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    scanner_module = _scanner_module()
+
+    if args.command == 'scan':
+        scanner = scanner_module.TopStockScanner(max_workers=args.workers, journal_dir=args.journal_dir,
+                                                 shard=parse_shard(args.shard))
+        results = scanner.get_high_score_stocks()
+        print(f"分片 {args.shard} 完成，发现 {len(results)} 支高分股票，日志：{scanner.journal_path()}")
+        return
+
+    missing, unfinished = shard_status(args.journal_dir, args.date, args.shards)
+    if missing or unfinished:
+        print(f"缺失分片: {missing}，未完成分片: {unfinished}")
+        if not args.allow_partial:
+            raise SystemExit("分片未全部完成，使用 --allow-partial 输出部分结果")
+
+    store = None
+    if not args.no_store:
+        from results_store import get_results_store
+        store = get_results_store()
+    result = merge_journals(args.journal_dir, args.date, args.min_score, args.top_k, args.shards, store)
+    formatted = [scanner_module.format_report(report) for report in result.reports]
+    if formatted:
+        scanner_module.save_results_by_price(formatted)
+    print(f"合并 {len(result.shards)} 个分片共 {result.total} 支股票，发现 {len(formatted)} 支高分股票"
+          f"（得分≥{args.min_score}）")
+    for item in formatted[:20]:
+        print(f"  {item['股票代码']}  评分 {item['评分']}  {item['当前价格']}  {item['投资建议']}")
+    if result.run_id is not None:
+        print(f"合并结果已写入结果库（run_id={result.run_id}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+全历史评分序列
+calculate_score / calculate_futures_score 只对最后一根K线打分。这里用数组运算对每一根K线套用同样的规则，
+得到整段历史的评分序列（或 日期 × 代码 的评分面板），供回测、图表和评分趋势筛选使用。
+每根K线的得分与把数据截断到该K线后调用标量版本的结果一致（空值比较为假，与标量版本相同）。
+"""
+
+from typing import Callable, Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from indicator_panel import IndicatorPanel
+
+# calculate_score 各条件的分值
+STOCK_SCORE_WEIGHTS = {
+    'ma_short_medium': 15,  # MA5 > MA20
+    'ma_medium_long': 15,   # MA20 > MA60
+    'rsi_neutral': 20,      # 30 <= RSI <= 70
+    'rsi_oversold': 15,     # RSI < 30
+    'macd': 20,             # MACD > Signal
+    'volume_surge': 30,     # 量比 > 1.5
+    'volume_up': 15,        # 量比 > 1
+}
+
+
+def stock_score_array(cols: Mapping[str, np.ndarray], weights: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """
+    StockAnalyzer.calculate_score 的数组版本
+
+    Args:
+        cols: 指标名 -> 数组（一维或 日期 × 代码 二维，形状一致）
+        weights: 各条件的分值，缺省项取 STOCK_SCORE_WEIGHTS（用于评估其他权重方案）
+
+    Returns:
+        与输入同形状的评分数组（默认权重下为 int64）
+    """
+    w = STOCK_SCORE_WEIGHTS if weights is None else {**STOCK_SCORE_WEIGHTS, **weights}
+    ma5, ma20, ma60 = cols['MA5'], cols['MA20'], cols['MA60']
+    rsi = cols['RSI']
+    volume_ratio = cols['Volume_Ratio']
+
+    with np.errstate(invalid='ignore'):
+        # 趋势得分 (30分)
+        score = np.where(ma5 > ma20, w['ma_short_medium'], 0) + np.where(ma20 > ma60, w['ma_medium_long'], 0)
+
+        # RSI得分 (20分)
+        score = score + np.where((rsi >= 30) & (rsi <= 70), w['rsi_neutral'], np.where(rsi < 30, w['rsi_oversold'], 0))
+
+        # MACD得分 (20分)
+        score = score + np.where(cols['MACD'] > cols['Signal'], w['macd'], 0)
+
+        # 成交量得分 (30分)
+        score = score + np.where(volume_ratio > 1.5, w['volume_surge'], np.where(volume_ratio > 1, w['volume_up'], 0))
+    return score.astype(np.int64) if weights is None else score
+
+
+def futures_score_array(cols: Mapping[str, np.ndarray], prev_close: np.ndarray) -> np.ndarray:
+    """
+    FuturesAnalyzer.calculate_futures_score 的数组版本
+
+    Args:
+        cols: 指标名 -> 数组（含 close）
+        prev_close: 每根K线的前一根收盘价，首根K线取自身收盘价（与标量版本一致）
+
+    Returns:
+        与输入同形状的 int64 评分数组，范围 0-100
+    """
+    close = cols['close']
+    ma5, ma20, ma60 = cols['MA5'], cols['MA20'], cols['MA60']
+    macd, signal, hist = cols['MACD'], cols['Signal'], cols['MACD_hist']
+    rsi = cols['RSI']
+    volume_ratio = cols['Volume_Ratio']
+    oi_change = cols['OI_Change']
+
+    with np.errstate(invalid='ignore'):
+        score = np.full(np.shape(close), 50, dtype=np.int64)
+
+        # 1. 趋势评分：MA趋势
+        score += np.select(
+            [(ma5 > ma20) & (ma20 > ma60), ma5 > ma20, (ma5 < ma20) & (ma20 < ma60), ma5 < ma20],
+            [15, 10, -15, -10], 0)
+
+        # MACD信号
+        score += np.select([(macd > signal) & (hist > 0), (macd < signal) & (hist < 0)], [10, -10], 0)
+
+        # 2. 动量评分：RSI 与价格动量
+        score += np.select([rsi > 70, rsi < 30], [5, -5], 0)
+        score += np.where(cols['Momentum'] > 0, 5, -5)
+
+        # 3. 波动性评分：布林带位置
+        score += np.select([close > cols['BB_upper'], close < cols['BB_lower']], [-10, 10], 0)
+
+        # 4. 成交量评分
+        score += np.select([volume_ratio > 1.5, volume_ratio < 0.5], [5, -5], 0)
+
+        # 5. 持仓量评分
+        score += np.select([(oi_change > 5) & (close > prev_close), (oi_change < -5) & (close < prev_close)],
+                           [10, -10], 0)
+    return np.clip(score, 0, 100)
+
+
+def _frame_columns(df: pd.DataFrame, names) -> Dict[str, np.ndarray]:
+    return {name: df[name].to_numpy(dtype=np.float64) for name in names}
+
+
+def stock_score_series(df: pd.DataFrame) -> pd.Series:
+    """对 calculate_indicators 的结果逐K线打分，索引与 df 相同"""
+    cols = _frame_columns(df, ('MA5', 'MA20', 'MA60', 'RSI', 'MACD', 'Signal', 'Volume_Ratio'))
+    return pd.Series(stock_score_array(cols), index=df.index, name='score')
+
+
+def futures_score_series(df: pd.DataFrame) -> pd.Series:
+    """对 calculate_futures_indicators 的结果逐K线打分，索引与 df 相同"""
+    cols = _frame_columns(df, ('close', 'MA5', 'MA20', 'MA60', 'MACD', 'Signal', 'MACD_hist', 'RSI',
+                               'Momentum', 'BB_upper', 'BB_lower', 'Volume_Ratio', 'OI_Change'))
+    close = cols['close']
+    prev_close = np.concatenate([close[:1], close[:-1]])
+    return pd.Series(futures_score_array(cols, prev_close), index=df.index, name='score')
+
+
+def stock_score_panel(panel: IndicatorPanel) -> pd.DataFrame:
+    """
+    对指标面板整体打分
+
+    Returns:
+        日期 × 代码 的评分 DataFrame，无K线处为空值
+    """
+    scores = stock_score_array(panel.columns).astype(np.float64)
+    scores[~panel.valid] = np.nan
+    return pd.DataFrame(scores, index=pd.DatetimeIndex(panel.dates, name='date'),
+                        columns=pd.Index(panel.symbols, name='symbol'))
+
+
+def score_panel(frames: Dict[str, pd.DataFrame],
+                score_func: Callable[[pd.DataFrame], pd.Series]) -> pd.DataFrame:
+    """
+    把多只标的的评分序列对齐为 日期 × 代码 的面板（用于没有指标面板的期货等场景）
+
+    Args:
+        frames: {代码: 含 date 列的指标 DataFrame}
+        score_func: stock_score_series 或 futures_score_series
+
+    Returns:
+        日期 × 代码 的评分 DataFrame，无K线处为空值
+    """
+    series = {symbol: score_func(df).set_axis(pd.DatetimeIndex(df['date'], name='date'))
+              for symbol, df in frames.items()}
+    panel = pd.DataFrame(series).sort_index()
+    panel.columns.name = 'symbol'
+    return panel
+
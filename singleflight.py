@@ -0,0 +1,114 @@
+"""
+请求合并（single-flight）
+同一 key 的并发调用只执行一次，其余调用等待并共享同一结果或异常。
+SingleFlight 用于线程，AsyncSingleFlight 用于事件循环中的协程。
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """一次正在执行的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.dups = 0
+
+
+class SingleFlight:
+    """合并相同 key 的并发调用
+
+    只合并“正在执行中”的调用，调用结束后不缓存结果，下一次调用会重新执行。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        执行 fn(*args, **kwargs)，若相同 key 的调用正在执行则等待其结果
+
+        Returns:
+            (结果, 是否与其他调用共享)。结果被共享时调用方不应原地修改它。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.dups += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.dups > 0
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, shared
+
+    def in_flight(self) -> int:
+        """当前正在执行的调用数"""
+        with self._lock:
+            return len(self._calls)
+
+
+class _AsyncCall:
+    """一次正在执行的协程调用"""
+
+    def __init__(self, task: 'asyncio.Task'):
+        self.task = task
+        self.dups = 0
+
+
+class AsyncSingleFlight:
+    """在事件循环中合并相同 key 的并发协程调用
+
+    只有第一个调用方真正执行 fn，其余调用方在事件循环中等待同一个任务，不占用线程或执行器名额。
+    任务独立于发起它的请求运行，发起方被取消（如客户端断开）不会取消其他调用方正在等待的任务。
+    只能在同一个事件循环中使用，不需要加锁。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _AsyncCall] = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        执行 await fn(*args, **kwargs)，若相同 key 的调用正在执行则等待其结果
+
+        Returns:
+            (结果, 是否与其他调用共享)。结果被共享时调用方不应原地修改它。
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            call.dups += 1
+            return await asyncio.shield(call.task), True
+
+        call = _AsyncCall(asyncio.ensure_future(fn(*args, **kwargs)))
+        self._calls[key] = call
+        call.task.add_done_callback(lambda _: self._calls.pop(key, None))
+        result = await asyncio.shield(call.task)
+        return result, call.dups > 0
+
+    def in_flight(self) -> int:
+        """当前正在执行的调用数"""
+        return len(self._calls)
@@ -0,0 +1,108 @@
+"""
+实时快照预筛
+全盘扫描前先用一次全市场实时快照请求（MarketDataProvider.get_spot_snapshot）按声明式条件剔除股票：
+价格区间、换手率、成交量、成交额、上市天数、ST/退市整理、停牌。只有通过预筛的股票才逐只获取历史行情，
+停牌、ST、流动性差等不可能进入高分结果的股票不再占用上游请求。
+
+条件可以在代码中构造，也可以用环境变量 SPOT_FILTER 声明，例如：
+    SPOT_FILTER=min_price=2,max_price=300,min_amount=2e7,min_listing_days=60,exclude_st=true
+快照中缺失的字段（如回放数据没有换手率）不参与对应条件的判断。
+"""
+
+import os
+import dataclasses
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+# ST、*ST 及退市整理股票的名称特征
+ST_PATTERN = r'ST|退'
+
+
+@dataclass
+class SpotFilter:
+    """预筛条件，未设置（None）的条件不生效"""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_turnover: Optional[float] = None       # 换手率(%)
+    min_volume: Optional[float] = None         # 成交量
+    min_amount: Optional[float] = None         # 成交额(元)
+    min_listing_days: Optional[int] = None     # 上市天数（自然日）
+    exclude_st: bool = True
+    exclude_suspended: bool = True
+
+    @classmethod
+    def parse(cls, text: str) -> 'SpotFilter':
+        """解析 "min_price=2,max_price=300,exclude_st=true" 形式的条件"""
+        fields = {f.name: f for f in dataclasses.fields(cls)}
+        values = {}
+        for item in filter(None, (part.strip() for part in text.split(','))):
+            name, _, value = item.partition('=')
+            name = name.strip()
+            if name not in fields:
+                raise ValueError(f"未知的预筛条件: {name}")
+            if fields[name].type is bool:
+                values[name] = value.strip().lower() in ('1', 'true', 'yes', 'on')
+            elif name == 'min_listing_days':
+                values[name] = int(float(value))
+            else:
+                values[name] = float(value)
+        return cls(**values)
+
+    @classmethod
+    def from_env(cls) -> Optional['SpotFilter']:
+        """从环境变量 SPOT_FILTER 创建，未设置时返回 None（不预筛）"""
+        text = os.getenv('SPOT_FILTER', '').strip()
+        return cls.parse(text) if text else None
+
+    def apply(self, snapshot: pd.DataFrame, as_of: Optional[datetime] = None) -> 'SpotFilterResult':
+        """
+        对快照逐条件筛选
+
+        Args:
+            snapshot: 实时快照（SPOT_COLUMNS）
+            as_of: 计算上市天数的基准时间，默认当前时间
+
+        Returns:
+            SpotFilterResult，被剔除的股票记录第一个未通过的条件
+        """
+        snapshot = snapshot.reset_index(drop=True)
+        reason = pd.Series(None, index=snapshot.index, dtype=object)
+
+        def reject(mask: pd.Series, label: str) -> None:
+            reason[mask.fillna(False).astype(bool) & reason.isna()] = label
+
+        price = snapshot['price']
+        if self.exclude_suspended:
+            volume = snapshot['volume']
+            reject(price.isna() | (price <= 0) | (volume == 0), '停牌')
+        if self.exclude_st:
+            reject(snapshot['name'].astype('string').str.contains(ST_PATTERN, na=False), 'ST')
+        if self.min_listing_days is not None:
+            age = (pd.Timestamp(as_of or datetime.now()) - snapshot['listing_date']).dt.days
+            reject(age < self.min_listing_days, '上市天数')
+        for column, bound, label in (('price', self.min_price, '价格'), ('turnover', self.min_turnover, '换手率'),
+                                     ('volume', self.min_volume, '成交量'), ('amount', self.min_amount, '成交额')):
+            if bound is not None:
+                reject(snapshot[column] < bound, label)
+        if self.max_price is not None:
+            reject(price > self.max_price, '价格')
+
+        kept = reason.isna()
+        return SpotFilterResult(
+            kept=snapshot.loc[kept, 'code'].tolist(),
+            rejected=dict(zip(snapshot.loc[~kept, 'code'], reason[~kept]))
+        )
+
+
+@dataclass
+class SpotFilterResult:
+    """预筛结果"""
+    kept: List[str]
+    rejected: Dict[str, str] = field(default_factory=dict)   # {代码: 剔除原因}
+
+    def reason_counts(self) -> Dict[str, int]:
+        """各剔除原因的股票数"""
+        return pd.Series(self.rejected, dtype=object).value_counts().to_dict() if self.rejected else {}
@@ -3,101 +3,81 @@ import numpy as np
 from datetime import datetime, timedelta
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import logging
-from base_analyzer import BaseAnalyzer
+from base_analyzer import BaseAnalyzer, AI_ANALYSIS_FIELDS
+from data_provider import FULL_HISTORY_START
+from circuit_breaker import is_transient_error
+from indicator_panel import true_range
+from indicator_kernel import apply_indicator_block
+from score_series import stock_score_series, stock_score_panel
+from backtest import BacktestConfig, BacktestResult, backtest_frames
+from result_sink import TopKSink
+from results_store import get_results_store
+
+# 批量分析时默认只为评分最高的前N只股票生成 AI 分析，及 AI 分析的并发数
+DEFAULT_AI_TOP_N = 10
+DEFAULT_AI_WORKERS = 4
 
 class StockAnalyzer(BaseAnalyzer):
+    # calculate_score 与 analyze_stock 报告读取的指标
+    SCORE_FIELDS = ['MA5', 'MA20', 'MA60', 'RSI', 'MACD', 'Signal', 'Volume_Ratio']
+    REPORT_FIELDS = ['MA5', 'MA20', 'RSI', 'MACD', 'Signal', 'Volume_Ratio']
+    
     def __init__(self, initial_cash=1000000):
         # 调用父类的初始化方法
         super().__init__()
         
+        # 回测初始资金
+        self.initial_cash = initial_cash
+        
     def get_stock_data(self, stock_code, market='A', start_date=None, end_date=None):
-        """获取股票数据，支持A股、美股和港股"""
-        import akshare as ak
+        """获取股票数据，支持A股、美股和港股
         
+        未指定开始日期时，A股取最近一年，美股和港股取数据源提供的全部历史
+        """
         if start_date is None:
-            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+            if market in ('US', 'HK'):
+                start_date = FULL_HISTORY_START
+            else:
+                start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
         if end_date is None:
             end_date = datetime.now().strftime('%Y%m%d')
             
         try:
-            df = None
-            
-            # 根据市场类型获取数据
-            if market == 'A':
-                # A股数据
-                df = ak.stock_zh_a_hist(symbol=stock_code, 
-                                      start_date=start_date, 
-                                      end_date=end_date,
-                                      adjust="qfq")
-                
-                # 重命名列名以匹配分析需求
-                df = df.rename(columns={
-                    "日期": "date",
-                    "开盘": "open",
-                    "收盘": "close",
-                    "最高": "high",
-                    "最低": "low",
-                    "成交量": "volume"
-                })
-                
-            elif market == 'US':
-                # 美股数据
-                df = ak.stock_us_daily(symbol=stock_code, adjust="qfq")
-                
-                # 重命名列以匹配分析需求
-                df = df.rename(columns={
-                    "date": "date",
-                    "open": "open",
-                    "close": "close",
-                    "high": "high",
-                    "low": "low",
-                    "volume": "volume"
-                })
-                
-            elif market == 'HK':
-                # 港股数据
-                df = ak.stock_hk_daily(symbol=stock_code, adjust="qfq")
-                
-                # 重命名列以匹配分析需求
-                df = df.rename(columns={
-                    "date": "date",
-                    "open": "open",
-                    "close": "close",
-                    "high": "high",
-                    "low": "low",
-                    "volume": "volume"
-                })
-                
-            else:
-                raise ValueError(f"不支持的市场类型: {market}")
-            
-            # 确保日期格式正确
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # 数据类型转换
-            numeric_columns = ['open', 'close', 'high', 'low', 'volume']
-            df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-            
-            # 删除空值
-            df = df.dropna()
-            
-            return df.sort_values('date')
+            df, shared = self._inflight.do(
+                ('stock', market, stock_code, start_date, end_date),
+                self.data_provider.get_stock_history, stock_code, market, start_date, end_date
+            )
+            # 合并请求的结果由多个调用方共享，返回副本避免指标列互相覆盖
+            return df.copy() if shared else df
             
         except Exception as e:
             self.logger.error(f"获取股票数据失败: {str(e)}")
+            # 上游临时错误原样抛出，调用方可以区分并重试；其他错误包装为数据获取失败
+            if is_transient_error(e):
+                raise
             raise Exception(f"获取股票数据失败: {str(e)}")
             
-    def analyze_stock(self, stock_code, market='A'):
-        """分析股票，支持不同市场"""
+    def analyze_stock(self, stock_code, market='A', snapshot=False, with_ai=True):
+        """分析股票，支持不同市场
+        
+        Args:
+            snapshot: 为 True 时只计算最后几根K线的指标（批量筛选用），评分和报告不变
+            with_ai: 为 False 时不生成 AI 分析（ai_analysis 为 None），批量分析先打分、再由 add_ai_analysis 补充
+        """
         try:
             # 获取股票数据
             df = self.get_stock_data(stock_code, market)
             
             # 计算技术指标
-            df = self.calculate_indicators(df)
+            if snapshot:
+                df = self.cached_indicators('stock_snapshot', market, stock_code, df,
+                                            self.calculate_snapshot_indicators)
+            else:
+                df = self._report_indicators(stock_code, market, df)
             
             # 评分系统
             score = self.calculate_score(df)
@@ -123,7 +103,7 @@ class StockAnalyzer(BaseAnalyzer):
                 'macd_signal': 'BUY' if latest['MACD'] > latest['Signal'] else 'SELL',
                 'volume_status': 'HIGH' if latest['Volume_Ratio'] > 1.5 else 'NORMAL',
                 'recommendation': self.get_recommendation(score),
-                'ai_analysis': self.get_ai_analysis(df, stock_code, 'stock')
+                'ai_analysis': self.get_ai_analysis(df, stock_code, 'stock') if with_ai else None
             }
             
             return report
@@ -133,9 +113,39 @@ class StockAnalyzer(BaseAnalyzer):
             raise
     
             return stock_code
+
+    def _report_indicators(self, stock_code, market, df):
+        """只计算评分、报告和 AI 分析用到的指标（走指标缓存）"""
+        fields = list(dict.fromkeys(self.SCORE_FIELDS + self.REPORT_FIELDS + AI_ANALYSIS_FIELDS))
+        return self.cached_indicators('stock_report', market, stock_code, df,
+                                      lambda data: self.calculate_selected_indicators(data, fields))
+
+    def add_ai_analysis(self, reports, max_workers=None):
+        """
+        并发为一组报告生成 AI 分析，写入各报告的 ai_analysis（两阶段批量分析的第二阶段）
+
+        Args:
+            reports: analyze_stock(with_ai=False) 生成的报告
+            max_workers: 并发数，默认读取环境变量 AI_ANALYSIS_WORKERS
+        """
+        max_workers = max_workers or int(os.getenv('AI_ANALYSIS_WORKERS', DEFAULT_AI_WORKERS))
+
+        def analyze(report):
+            stock_code, market = report['stock_code'], report.get('market', 'A')
+            try:
+                df = self._report_indicators(stock_code, market, self.get_stock_data(stock_code, market))
+                report['ai_analysis'] = self.get_ai_analysis(df, stock_code, 'stock')
+            except Exception as e:
+                self.logger.error(f"生成股票 {stock_code} 的 AI 分析时出错: {str(e)}")
+                report['ai_analysis'] = f"AI 分析生成失败: {str(e)}"
+
+        if reports:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(reports))) as executor:
+                list(executor.map(analyze, reports))
+        return reports
+
     def get_stock_name(self, stock_code, market='A'):
         """获取股票名称，支持本地缓存和网络错误处理"""
-        import akshare as ak
         import json
         import os
         
@@ -159,26 +169,10 @@ class StockAnalyzer(BaseAnalyzer):
         # 缓存中没有，尝试从网络获取
         try:
             name = None
-            if market == 'A':
-                # 获取A股股票名称
-                stock_info_df = ak.stock_info_a_code_name()
-                filtered = stock_info_df[stock_info_df['code'] == stock_code]
-                if not filtered.empty:
-                    name = filtered.iloc[0]['name']
-                
-            elif market == 'US':
-                # 获取美股股票名称
-                stock_info_df = ak.stock_us_fundamental()
-                filtered = stock_info_df[stock_info_df['symbol'] == stock_code]
-                if not filtered.empty:
-                    name = filtered.iloc[0]['cname']
-                
-            elif market == 'HK':
-                # 获取港股股票名称
-                stock_info_df = ak.stock_hk_spot_em()
-                filtered = stock_info_df[stock_info_df['代码'] == stock_code]
-                if not filtered.empty:
-                    name = filtered.iloc[0]['名称']
+            stock_info_df = self.data_provider.get_stock_list(market)
+            filtered = stock_info_df[stock_info_df['code'] == stock_code]
+            if not filtered.empty:
+                name = filtered.iloc[0]['name']
             
             # 如果找到名称，更新缓存
             if name:
@@ -203,20 +197,30 @@ class StockAnalyzer(BaseAnalyzer):
             self.logger.warning(f"由于网络错误，使用默认名称: {default_name}")
             return default_name
             
-    def scan_market(self, stock_list=None, market='A', min_score=60):
-        """扫描市场，寻找符合条件的股票"""
+    def scan_market(self, stock_list=None, market='A', min_score=60, top_n=None, save_results=True,
+                    ai_top_n=None):
+        """
+        扫描市场，寻找符合条件的股票；指定 top_n 时只保留评分最高的 top_n 只。
+        分两阶段进行：先为全部股票打分（不调用 LLM），再只为入选结果中评分最高的 ai_top_n 只
+        （默认读取环境变量 AI_ANALYSIS_TOP_N）并发生成 AI 分析。
+        save_results 为 True 时每只股票的打分结果写入结果库（source='scan_market'），可查询历史与逐次对比。
+        """
         if stock_list is None:
             # 如果没有提供股票列表，获取市场所有股票
             stock_list = self.get_market_stocks(market)
             
-        recommendations = []
+        # 边扫描边按阈值和 top_n 筛选，只保留入选的报告
+        recommendations = TopKSink(k=top_n, min_score=min_score)
+        store = get_results_store() if save_results else None
+        run_id = store.start_run('scan_market', market, {'min_score': min_score, 'top_n': top_n}) if store else None
         
         total = len(stock_list)
         for i, stock_code in enumerate(stock_list):
             try:
-                report = self.analyze_stock(stock_code, market)
-                if report['score'] >= min_score:
-                    recommendations.append(report)
+                report = self.analyze_stock(stock_code, market, snapshot=True, with_ai=False)
+                recommendations.add(report)
+                if run_id is not None:
+                    store.add(run_id, report)
                 # 打印进度
                 if (i + 1) % 10 == 0 or (i + 1) == total:
                     self.logger.info(f"已分析 {i + 1}/{total} 只股票")
@@ -224,32 +228,26 @@ class StockAnalyzer(BaseAnalyzer):
                 self.logger.error(f"分析股票 {stock_code} 时出错: {str(e)}")
                 continue
                 
-        # 按得分排序
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
-        return recommendations
+        self.logger.info(f"指标缓存统计: {self.indicator_cache.stats()}")
+        if run_id is not None:
+            store.finish_run(run_id)
+        
+        # 按得分从高到低，只为前 ai_top_n 只生成 AI 分析
+        results = recommendations.snapshot()
+        if ai_top_n is None:
+            ai_top_n = int(os.getenv('AI_ANALYSIS_TOP_N', DEFAULT_AI_TOP_N))
+        self.add_ai_analysis(results[:ai_top_n])
+        for report in results[ai_top_n:]:
+            report['ai_analysis'] = f"仅为评分最高的 {ai_top_n} 只股票生成 AI 分析"
+        return results
     
     def get_market_stocks(self, market='A'):
         """获取市场所有股票代码"""
-        import akshare as ak
-        
         try:
-            if market == 'A':
-                # 获取A股所有股票
-                stock_info_df = ak.stock_info_a_code_name()
-                return stock_info_df['code'].tolist()
-                
-            elif market == 'US':
-                # 获取美股所有股票
-                stock_info_df = ak.stock_us_fundamental()
-                return stock_info_df['symbol'].tolist()
-                
-            elif market == 'HK':
-                # 获取港股所有股票
-                stock_info_df = ak.stock_hk_spot_em()
-                return stock_info_df['代码'].tolist()
-                
-            else:
+            if market not in ('A', 'US', 'HK'):
                 raise ValueError(f"不支持的市场类型: {market}")
+            
+            return self.data_provider.get_stock_list(market)['code'].tolist()
                 
         except Exception as e:
             self.logger.error(f"获取市场股票列表失败: {str(e)}")
@@ -286,50 +284,15 @@ class StockAnalyzer(BaseAnalyzer):
         
     def calculate_atr(self, df, period):
         """计算ATR指标"""
-        high = df['high']
-        low = df['low']
-        close = df['close'].shift(1)
-        
-        tr1 = high - low
-        tr2 = abs(high - close)
-        tr3 = abs(low - close)
-        
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        return tr.rolling(window=period).mean()
+        tr = true_range(df['high'].to_numpy(dtype=np.float64),
+                        df['low'].to_numpy(dtype=np.float64),
+                        df['close'].to_numpy(dtype=np.float64))
+        return pd.Series(tr, index=df.index).rolling(window=period).mean()
         
     def calculate_indicators(self, df):
         """计算技术指标"""
         try:
-            # 计算移动平均线
-            df['MA5'] = self.calculate_ema(df['close'], 5)
-            df['MA20'] = self.calculate_ema(df['close'], 20)
-            df['MA60'] = self.calculate_ema(df['close'], 60)
-            
-            # 计算RSI
-            df['RSI'] = self.calculate_rsi(df['close'], 14)
-            
-            # 计算MACD
-            df['MACD'], df['Signal'], df['MACD_hist'] = self.calculate_macd(df['close'])
-            
-            # 计算布林带
-            df['BB_upper'], df['BB_middle'], df['BB_lower'] = self.calculate_bollinger_bands(
-                df['close'],
-                20,
-                2
-            )
-            
-            # 成交量分析
-            df['Volume_MA'] = df['volume'].rolling(window=20).mean()
-            df['Volume_Ratio'] = df['volume'] / df['Volume_MA']
-            
-            # 计算ATR和波动率
-            df['ATR'] = self.calculate_atr(df, 14)
-            df['Volatility'] = df['ATR'] / df['close'] * 100
-            
-            # 动量指标
-            df['ROC'] = df['close'].pct_change(periods=10) * 100
-            
-            return df
+            return apply_indicator_block(df, self.params)
             
         except Exception as e:
             self.logger.error(f"计算技术指标时出错: {str(e)}")
@@ -368,6 +331,40 @@ class StockAnalyzer(BaseAnalyzer):
         except Exception as e:
             self.logger.error(f"计算评分时出错: {str(e)}")
             raise
+    
+    def calculate_score_series(self, df):
+        """逐K线计算整段历史的评分，每根K线与 calculate_score 的规则一致"""
+        try:
+            return stock_score_series(df)
+            
+        except Exception as e:
+            self.logger.error(f"计算评分序列时出错: {str(e)}")
+            raise
+    
+    def calculate_score_panel(self, frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """批量计算多只股票的历史评分，返回 日期 × 代码 的评分面板"""
+        try:
+            return stock_score_panel(self.calculate_panel_indicators(frames))
+            
+        except Exception as e:
+            self.logger.error(f"计算评分面板时出错: {str(e)}")
+            raise
+    
+    def backtest(self, frames: Dict[str, pd.DataFrame], entry_score=60, exit_score=40, **kwargs) -> BacktestResult:
+        """按评分阈值回测（默认与 get_recommendation 一致：≥60 买入，<40 卖出），使用 initial_cash 作为初始资金
+        
+        Args:
+            frames: {股票代码: 行情DataFrame}
+            kwargs: BacktestConfig 的其他参数（最大持仓数、整手股数、费率、T+1 等）
+        """
+        try:
+            config = BacktestConfig(initial_cash=self.initial_cash, entry_score=entry_score,
+                                    exit_score=exit_score, **kwargs)
+            return backtest_frames(frames, self, config)
+            
+        except Exception as e:
+            self.logger.error(f"回测时出错: {str(e)}")
+            raise
             
     def get_ai_analysis(self, df, stock_code, stock_type):
         """使用 OpenAI API 进行 AI 分析"""
@@ -0,0 +1,8 @@
+"""测试公共配置：把项目根目录加入导入路径（模块均位于根目录）"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,67 @@
+"""本地OHLCV仓库的增量更新"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from data_store import OHLCVStore
+
+pytest.importorskip('pyarrow')
+
+
+def _bars(start: str, end: str, close: float = 10.0) -> pd.DataFrame:
+    dates = pd.date_range(start, end, freq='D')
+    return pd.DataFrame({
+        'date': dates, 'open': close, 'close': close, 'high': close, 'low': close, 'volume': 1000.0,
+    })
+
+
+class RecordingFetch:
+    """按请求区间从 source 截取数据，并记录每次请求的区间"""
+
+    def __init__(self, source: pd.DataFrame):
+        self.source = source
+        self.requests = []
+
+    def __call__(self, start: str, end: str) -> pd.DataFrame:
+        self.requests.append((start, end))
+        mask = (self.source['date'] >= pd.Timestamp(start)) & (self.source['date'] <= pd.Timestamp(end))
+        return self.source.loc[mask].reset_index(drop=True)
+
+
+def test_partial_intraday_bar_does_not_force_full_refetch(tmp_path):
+    today = datetime.now().strftime('%Y%m%d')
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+    start = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+    store = OHLCVStore(store_dir=str(tmp_path), enabled=True, intraday_ttl=0)
+
+    # 盘中缓存：当天的K线尚未收盘
+    morning = _bars(start, today)
+    morning.loc[morning.index[-1], ['close', 'volume']] = [10.5, 300.0]
+    store.get('stock_A', '600000', start, today, RecordingFetch(morning))
+
+    # 有效期过后再次请求：当天K线的收盘价和成交量已经变化，历史K线不变
+    afternoon = _bars(start, today)
+    afternoon.loc[afternoon.index[-1], ['close', 'volume']] = [10.8, 900.0]
+    fetch = RecordingFetch(afternoon)
+    df = store.get('stock_A', '600000', start, today, fetch)
+
+    assert fetch.requests == [(yesterday, today)]
+    assert df['close'].iloc[-1] == 10.8
+    assert df['volume'].iloc[-1] == 900.0
+    assert len(df) == len(afternoon)
+
+
+def test_adjustment_change_on_settled_bars_refetches_full_history(tmp_path):
+    today = datetime.now().strftime('%Y%m%d')
+    start = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+    store = OHLCVStore(store_dir=str(tmp_path), enabled=True, intraday_ttl=0)
+    store.get('stock_A', '600000', start, today, RecordingFetch(_bars(start, today, close=10.0)))
+
+    # 除权后前复权价格整体调整
+    fetch = RecordingFetch(_bars(start, today, close=9.0))
+    df = store.get('stock_A', '600000', start, today, fetch)
+
+    assert fetch.requests[-1] == (start, today)
+    assert (df['close'] == 9.0).all()
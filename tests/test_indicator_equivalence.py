@@ -0,0 +1,275 @@
+"""
+指标与评分的等价性
+融合内核、依赖图、面板、快照与逐K线评分序列都声明与原始的 pandas 逐行实现结果一致。
+这里保留原始实现作为参照，在固定的行情样本上逐列、逐K线比较。
+"""
+
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from futures_analyzer import FuturesAnalyzer
+from indicator_kernel import FUTURES_INDICATOR_COLUMNS
+from indicator_panel import INDICATOR_COLUMNS
+from score_series import futures_score_series, stock_score_series
+from stock_analyzer import StockAnalyzer
+
+scanner_module = importlib.import_module('全部股票分析推荐1')
+
+ROWS = 260
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+# -------------------------------
+# 原始实现（参照）
+# -------------------------------
+def reference_indicators(df, params):
+    """原始的 BaseAnalyzer.calculate_indicators"""
+    df = df.copy()
+    close = df['close']
+    df['MA5'] = close.ewm(span=params['ma_periods']['short'], adjust=False).mean()
+    df['MA20'] = close.ewm(span=params['ma_periods']['medium'], adjust=False).mean()
+    df['MA60'] = close.ewm(span=params['ma_periods']['long'], adjust=False).mean()
+
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=params['rsi_period']).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=params['rsi_period']).mean()
+    df['RSI'] = 100 - (100 / (1 + gain / loss))
+
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    signal = macd.ewm(span=9, adjust=False).mean()
+    df['MACD'], df['Signal'], df['MACD_hist'] = macd, signal, macd - signal
+
+    middle = close.rolling(window=params['bollinger_period']).mean()
+    std = close.rolling(window=params['bollinger_period']).std()
+    df['BB_upper'] = middle + std * params['bollinger_std']
+    df['BB_middle'] = middle
+    df['BB_lower'] = middle - std * params['bollinger_std']
+
+    df['Volume_MA'] = df['volume'].rolling(window=params['volume_ma_period']).mean()
+    df['Volume_Ratio'] = df['volume'] / df['Volume_MA']
+
+    prev_close = close.shift(1)
+    tr = pd.concat([df['high'] - df['low'], (df['high'] - prev_close).abs(), (df['low'] - prev_close).abs()],
+                   axis=1).max(axis=1)
+    df['ATR'] = tr.rolling(window=params['atr_period']).mean()
+    df['Volatility'] = df['ATR'] / close * 100
+    df['ROC'] = close.pct_change(periods=10) * 100
+    return df
+
+
+def reference_futures_indicators(df, params, futures_params):
+    """原始的 FuturesAnalyzer.calculate_futures_indicators（pct_change 默认向前填充缺失的持仓量）"""
+    df = reference_indicators(df, params)
+    df['OI_Change'] = df['open_interest'].ffill().pct_change(fill_method=None) * 100
+    df['OI_MA'] = df['open_interest'].rolling(window=futures_params['open_interest_ma_period']).mean()
+    df['Momentum'] = df['close'].diff(futures_params['momentum_period'])
+    df['VOI_Ratio'] = df['volume'] / df['open_interest']
+    df['TR'] = pd.DataFrame({
+        'a': df['high'] - df['low'],
+        'b': abs(df['high'] - df['close'].shift(1)),
+        'c': abs(df['low'] - df['close'].shift(1))
+    }).max(axis=1)
+    df['ATR14'] = df['TR'].rolling(window=14).mean()
+    return df
+
+
+def reference_score(df):
+    """原始的 StockAnalyzer.calculate_score"""
+    score = 0
+    latest = df.iloc[-1]
+    if latest['MA5'] > latest['MA20']:
+        score += 15
+    if latest['MA20'] > latest['MA60']:
+        score += 15
+    if 30 <= latest['RSI'] <= 70:
+        score += 20
+    elif latest['RSI'] < 30:
+        score += 15
+    if latest['MACD'] > latest['Signal']:
+        score += 20
+    if latest['Volume_Ratio'] > 1.5:
+        score += 30
+    elif latest['Volume_Ratio'] > 1:
+        score += 15
+    return score
+
+
+def reference_futures_score(df):
+    """原始的 FuturesAnalyzer.calculate_futures_score"""
+    latest = df.iloc[-1]
+    score = 50
+    if latest['MA5'] > latest['MA20'] and latest['MA20'] > latest['MA60']:
+        score += 15
+    elif latest['MA5'] > latest['MA20']:
+        score += 10
+    elif latest['MA5'] < latest['MA20'] and latest['MA20'] < latest['MA60']:
+        score -= 15
+    elif latest['MA5'] < latest['MA20']:
+        score -= 10
+    if latest['MACD'] > latest['Signal'] and latest['MACD_hist'] > 0:
+        score += 10
+    elif latest['MACD'] < latest['Signal'] and latest['MACD_hist'] < 0:
+        score -= 10
+    if latest['RSI'] > 70:
+        score += 5
+    elif latest['RSI'] < 30:
+        score -= 5
+    score += 5 if latest['Momentum'] > 0 else -5
+    if latest['close'] > latest['BB_upper']:
+        score -= 10
+    elif latest['close'] < latest['BB_lower']:
+        score += 10
+    if latest['Volume_Ratio'] > 1.5:
+        score += 5
+    elif latest['Volume_Ratio'] < 0.5:
+        score -= 5
+    prev_close = df.iloc[-2]['close'] if len(df) > 1 else latest['close']
+    if latest['OI_Change'] > 5 and latest['close'] > prev_close:
+        score += 10
+    elif latest['OI_Change'] < -5 and latest['close'] < prev_close:
+        score -= 10
+    return max(0, min(100, score))
+
+
+# -------------------------------
+# 固定行情样本
+# -------------------------------
+def make_ohlcv(seed: int, rows: int = ROWS, start: str = '2023-01-02', futures: bool = False) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, rows)))
+    spread = np.abs(rng.normal(0, 0.01, rows)) * close
+    df = pd.DataFrame({
+        'date': pd.bdate_range(start, periods=rows),
+        'open': close * (1 + rng.normal(0, 0.005, rows)),
+        'close': close,
+        'high': close + spread,
+        'low': close - spread,
+        # 成交量有放量和缩量，覆盖量比的各个评分区间
+        'volume': rng.lognormal(11, 0.6, rows),
+    })
+    if futures:
+        oi = 5e4 * np.exp(np.cumsum(rng.normal(0, 0.06, rows)))
+        oi[[40, 120, rows - 2]] = np.nan
+        df['open_interest'] = oi
+    return df
+
+
+@pytest.fixture(scope='module')
+def stock_analyzer():
+    return StockAnalyzer()
+
+
+@pytest.fixture(scope='module')
+def futures_analyzer():
+    return FuturesAnalyzer()
+
+
+def assert_columns_close(actual: pd.DataFrame, expected: pd.DataFrame, columns):
+    for name in columns:
+        np.testing.assert_allclose(actual[name].to_numpy(dtype=np.float64), expected[name].to_numpy(dtype=np.float64),
+                                   rtol=RTOL, atol=ATOL, equal_nan=True, err_msg=name)
+
+
+def per_row_scores(df: pd.DataFrame, score) -> np.ndarray:
+    """原始评分逐K线调用：把数据截断到每一根K线后对最后一根打分"""
+    return np.array([score(df.iloc[:i + 1]) for i in range(len(df))])
+
+
+# -------------------------------
+# 股票
+# -------------------------------
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_fused_kernel_matches_reference(stock_analyzer, seed):
+    df = make_ohlcv(seed)
+    expected = reference_indicators(df, stock_analyzer.params)
+    actual = stock_analyzer.calculate_indicators(df.copy())
+    assert_columns_close(actual, expected, INDICATOR_COLUMNS)
+    assert stock_analyzer.calculate_score(actual) == reference_score(expected)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_snapshot_matches_reference(stock_analyzer, seed):
+    df = make_ohlcv(seed)
+    expected = reference_indicators(df, stock_analyzer.params)
+    snapshot = stock_analyzer.calculate_snapshot_indicators(df.copy())
+    assert_columns_close(snapshot, expected.iloc[-len(snapshot):], INDICATOR_COLUMNS)
+    assert stock_analyzer.calculate_score(snapshot) == reference_score(expected)
+
+
+def test_indicator_graph_matches_reference(stock_analyzer):
+    df = make_ohlcv(4)
+    expected = reference_indicators(df, stock_analyzer.params)
+    fields = ['MA5', 'RSI', 'BB_upper', 'Volume_Ratio', 'ATR', 'ROC']
+    actual = stock_analyzer.calculate_selected_indicators(df.copy(), fields)
+    assert_columns_close(actual, expected, fields)
+
+
+def test_panel_matches_reference(stock_analyzer):
+    # 各代码的起止日期不同，面板按日期并集对齐
+    frames = {
+        '600000': make_ohlcv(5),
+        '600001': make_ohlcv(6, rows=200, start='2023-03-01'),
+        '600002': make_ohlcv(7, rows=150),
+    }
+    panel = stock_analyzer.calculate_panel_indicators(frames)
+    scores = stock_analyzer.calculate_score_panel(frames)
+    for code, df in frames.items():
+        expected = reference_indicators(df, stock_analyzer.params)
+        assert_columns_close(panel.frame(code), expected, INDICATOR_COLUMNS)
+        actual_scores = scores[code].dropna().to_numpy()
+        np.testing.assert_array_equal(actual_scores, per_row_scores(expected, reference_score), err_msg=code)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_score_series_matches_per_row_scoring(stock_analyzer, seed):
+    expected = reference_indicators(make_ohlcv(seed), stock_analyzer.params)
+    actual = stock_score_series(stock_analyzer.calculate_indicators(make_ohlcv(seed)))
+    np.testing.assert_array_equal(actual.to_numpy(), per_row_scores(expected, reference_score))
+
+
+# -------------------------------
+# 期货
+# -------------------------------
+@pytest.mark.parametrize('seed', [11, 12])
+def test_futures_kernel_matches_reference(futures_analyzer, seed):
+    df = make_ohlcv(seed, futures=True)
+    expected = reference_futures_indicators(df, futures_analyzer.params, futures_analyzer.futures_params)
+    actual = futures_analyzer.calculate_futures_indicators(df.copy())
+    assert_columns_close(actual, expected, FUTURES_INDICATOR_COLUMNS)
+    assert futures_analyzer.calculate_futures_score(actual) == reference_futures_score(expected)
+
+
+@pytest.mark.parametrize('seed', [11, 12])
+def test_futures_snapshot_matches_reference(futures_analyzer, seed):
+    # 倒数第二根K线缺少持仓量
+    df = make_ohlcv(seed, futures=True)
+    expected = reference_futures_indicators(df, futures_analyzer.params, futures_analyzer.futures_params)
+    snapshot = futures_analyzer.calculate_futures_snapshot(df.copy())
+    assert_columns_close(snapshot, expected.iloc[-len(snapshot):], FUTURES_INDICATOR_COLUMNS)
+    assert futures_analyzer.calculate_futures_score(snapshot) == reference_futures_score(expected)
+
+
+@pytest.mark.parametrize('seed', [11, 12])
+def test_futures_score_series_matches_per_row_scoring(futures_analyzer, seed):
+    df = make_ohlcv(seed, futures=True)
+    expected = reference_futures_indicators(df, futures_analyzer.params, futures_analyzer.futures_params)
+    actual = futures_score_series(futures_analyzer.calculate_futures_indicators(df.copy()))
+    np.testing.assert_array_equal(actual.to_numpy(), per_row_scores(expected, reference_futures_score))
+
+
+# -------------------------------
+# 全盘扫描器
+# -------------------------------
+@pytest.mark.parametrize('seed', [21, 22, 23])
+def test_scanner_snapshot_matches_full_calculation(seed):
+    analyzer = scanner_module.StockAnalyzer(data_provider=scanner_module.MarketDataProvider())
+    df = make_ohlcv(seed)
+    full = analyzer.calculate_indicators(df.copy())
+    snapshot = analyzer.calculate_snapshot_indicators(df.copy())
+    columns = [name for name in full.columns if name not in df.columns]
+    assert_columns_close(snapshot, full.iloc[-len(snapshot):], columns)
+    assert analyzer.build_report('600000', snapshot)['score'] == analyzer.build_report('600000', full)['score']
@@ -0,0 +1,69 @@
+"""AIMD 并发控制器的延迟采样"""
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveConcurrency, upstream_call
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+def _cache_hit(controller, clock):
+    with controller.slot():
+        clock.advance(0.0001)
+
+
+def _upstream(controller, clock, latency=0.05, token_wait=0.0):
+    with controller.slot():
+        clock.advance(token_wait)
+        with upstream_call():
+            clock.advance(latency)
+
+
+def test_cache_hits_do_not_shrink_limit(clock):
+    controller = AdaptiveConcurrency(initial=8, min_limit=1, max_limit=16)
+    for _ in range(100):
+        _cache_hit(controller, clock)
+        _cache_hit(controller, clock)
+        _upstream(controller, clock)
+
+    stats = controller.stats()
+    assert stats['decreases'] == 0
+    assert stats['limit'] == 16
+    assert stats['completed'] == 300
+
+
+def test_token_wait_is_not_counted_as_latency(clock):
+    controller = AdaptiveConcurrency(initial=8, min_limit=1, max_limit=16)
+    for i in range(100):
+        # 令牌桶等待时间波动很大，上游延迟稳定
+        _upstream(controller, clock, token_wait=2.0 if i % 2 else 0.0)
+
+    assert controller.stats()['decreases'] == 0
+
+
+def test_slow_upstream_still_shrinks_limit(clock):
+    controller = AdaptiveConcurrency(initial=8, min_limit=1, max_limit=16)
+    for _ in range(40):
+        _cache_hit(controller, clock)
+        _upstream(controller, clock, latency=0.05)
+    for _ in range(40):
+        _upstream(controller, clock, latency=0.5)
+
+    assert controller.stats()['decreases'] > 0
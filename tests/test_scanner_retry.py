@@ -0,0 +1,80 @@
+"""全盘扫描器行情获取的重试与跳过判定"""
+
+import importlib
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from circuit_breaker import RetryBudget
+from scan_journal import FAILED, SKIPPED
+
+scanner_module = importlib.import_module('全部股票分析推荐1')
+
+
+def _history(rows: int = 120) -> pd.DataFrame:
+    close = 10 + np.sin(np.arange(rows) / 5)
+    return pd.DataFrame({
+        'date': pd.bdate_range('2024-01-02', periods=rows),
+        'open': close, 'close': close, 'high': close + 0.1, 'low': close - 0.1,
+        'volume': np.full(rows, 1e5),
+    })
+
+
+class FlakyProvider:
+    """前 failures 次请求返回无法解析的响应，之后返回 result"""
+
+    def __init__(self, failures: int, result: pd.DataFrame):
+        self.failures = failures
+        self.result = result
+        self.calls = 0
+
+    def get_stock_history(self, code, market, start_date, end_date):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise json.JSONDecodeError('Expecting value', '<html>', 0)
+        return self.result
+
+
+@pytest.fixture
+def scanner(tmp_path, monkeypatch):
+    monkeypatch.setattr(scanner_module.time, 'sleep', lambda seconds: None)
+    scanner = scanner_module.TopStockScanner(max_workers=4, compute_processes=0, journal_dir=str(tmp_path),
+                                             results_store=False, prefilter=False, shard=None)
+    scanner.retry_budget = RetryBudget(ratio=1.0, min_retries=10)
+    scanner.recorded = []
+    monkeypatch.setattr(scanner, '_record',
+                        lambda code, status, report=None, reason='': scanner.recorded.append((code, status)))
+    return scanner
+
+
+def test_unparsable_response_is_retried(scanner):
+    provider = FlakyProvider(failures=1, result=_history())
+    scanner.analyzer.data_provider = provider
+
+    fetched = scanner.fetch_stock_safe('600000', max_retries=3)
+
+    assert fetched is not None and fetched[0] == '600000'
+    assert provider.calls == 2
+    assert scanner.recorded == []
+    assert scanner.concurrency.errors == 1
+
+
+def test_persistent_unparsable_response_is_failed_not_skipped(scanner):
+    provider = FlakyProvider(failures=10, result=_history())
+    scanner.analyzer.data_provider = provider
+
+    assert scanner.fetch_stock_safe('600000', max_retries=3) is None
+    assert provider.calls == 3
+    assert scanner.recorded == [('600000', FAILED)]
+
+
+def test_insufficient_data_is_skipped_without_retry(scanner):
+    provider = FlakyProvider(failures=0, result=_history(rows=20))
+    scanner.analyzer.data_provider = provider
+
+    assert scanner.fetch_stock_safe('600000', max_retries=3) is None
+    assert provider.calls == 1
+    assert scanner.recorded == [('600000', SKIPPED)]
+    assert scanner.concurrency.errors == 0
@@ -0,0 +1,215 @@
+"""
+滚动样本外验证（walk-forward）
+把历史切分为滚动的 训练/测试 窗口，在每个窗口上用进程池评估一组候选评分配置（买卖阈值与条件分值），
+每个窗口在训练段上按目标指标选出最优配置，并记录它在随后测试段上的表现，汇总为一张结果表。
+
+行情通过数据源读取（DATA_SOURCE 指定，带本地增量仓库），逐只指标走共享指标缓存
+（设置 INDICATOR_CACHE_DIR 后可跨进程/跨运行复用）。指标只在完整历史上计算一次，
+各窗口只切片使用，增加窗口只增加回测计算量，不会重新获取数据或重算指标。
+
+命令行：
+    python walk_forward.py --codes 600000,000001 --start 20200101 --train-days 250 --test-days 60 \
+        --entry 50,60,70 --exit 30,40
+"""
+
+import os
+import argparse
+import dataclasses
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicator_panel import OHLCVPanel
+from backtest import BacktestConfig, run_backtest
+from score_series import stock_score_array
+
+# 评分所需的指标
+SCORE_INPUTS = ['MA5', 'MA20', 'MA60', 'RSI', 'MACD', 'Signal', 'Volume_Ratio']
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScoringConfig:
+    """候选评分配置"""
+    name: str
+    entry_score: float = 60
+    exit_score: float = 40
+    weights: Dict[str, float] = field(default_factory=dict)   # 覆盖 STOCK_SCORE_WEIGHTS 中的条件分值
+
+
+def rolling_windows(n_dates: int, train_days: int, test_days: int,
+                    step_days: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """
+    生成滚动窗口
+
+    Returns:
+        [(训练起点, 测试起点, 测试终点)]，左闭右开的日期下标
+    """
+    step_days = step_days or test_days
+    windows = []
+    start = 0
+    while start + train_days + test_days <= n_dates:
+        windows.append((start, start + train_days, start + train_days + test_days))
+        start += step_days
+    return windows
+
+
+def indicator_columns(frames: Dict[str, pd.DataFrame], panel: OHLCVPanel,
+                      names: Sequence[str] = SCORE_INPUTS) -> Dict[str, np.ndarray]:
+    """把逐只的指标 DataFrame 对齐为面板的 日期 × 代码 数组"""
+    columns = {name: np.full((len(panel.dates), len(panel.symbols)), np.nan) for name in names}
+    for col, symbol in enumerate(panel.symbols):
+        df = frames.get(symbol)
+        if df is None or df.empty:
+            continue
+        rows = np.searchsorted(panel.dates, df['date'].to_numpy())
+        for name in names:
+            columns[name][rows, col] = df[name].to_numpy(dtype=np.float64)
+    return columns
+
+
+def _slice_panel(panel: OHLCVPanel, start: int, stop: int) -> OHLCVPanel:
+    return OHLCVPanel(dates=panel.dates[start:stop], symbols=panel.symbols,
+                      fields={name: arr[start:stop] for name, arr in panel.fields.items()})
+
+
+# 进程内共享的面板，由进程池初始化函数设置，避免每个任务重复传输大数组
+_worker_panel: Optional[OHLCVPanel] = None
+_worker_columns: Optional[Dict[str, np.ndarray]] = None
+
+
+def _init_worker(panel: OHLCVPanel, columns: Dict[str, np.ndarray]) -> None:
+    global _worker_panel, _worker_columns
+    _worker_panel = panel
+    _worker_columns = columns
+
+
+def _evaluate_window(window: Tuple[int, int, int], configs: Sequence[ScoringConfig],
+                     base: BacktestConfig) -> List[Dict]:
+    """进程任务：在一个窗口的训练段与测试段上回测所有候选配置"""
+    train_start, test_start, test_end = window
+    # 评分逐K线独立，只需对本窗口的日期范围打分
+    window_columns = {name: arr[train_start:test_end] for name, arr in _worker_columns.items()}
+    rows = []
+    for config in configs:
+        scores = np.asarray(stock_score_array(window_columns, config.weights or None), dtype=np.float64)
+        bt_config = dataclasses.replace(base, entry_score=config.entry_score, exit_score=config.exit_score)
+        row = {'window_start': str(pd.Timestamp(_worker_panel.dates[train_start]).date()),
+               'test_start': str(pd.Timestamp(_worker_panel.dates[test_start]).date()),
+               'test_end': str(pd.Timestamp(_worker_panel.dates[test_end - 1]).date()),
+               'config': config.name}
+        for phase, (start, stop) in (('train', (train_start, test_start)), ('test', (test_start, test_end))):
+            sliced = _slice_panel(_worker_panel, start, stop)
+            score_frame = pd.DataFrame(scores[start - train_start:stop - train_start],
+                                       index=pd.DatetimeIndex(sliced.dates), columns=sliced.symbols)
+            metrics = run_backtest(sliced, score_frame, bt_config).metrics
+            for name in ('total_return', 'sharpe', 'max_drawdown', 'turnover', 'trades'):
+                row[f'{phase}_{name}'] = metrics.get(name)
+        rows.append(row)
+    return rows
+
+
+def walk_forward(indicator_frames: Dict[str, pd.DataFrame], configs: Sequence[ScoringConfig],
+                 train_days: int = 250, test_days: int = 60, step_days: Optional[int] = None,
+                 objective: str = 'sharpe', base: Optional[BacktestConfig] = None,
+                 processes: Optional[int] = None) -> pd.DataFrame:
+    """
+    滚动样本外评估
+
+    Args:
+        indicator_frames: {代码: 含 SCORE_INPUTS 指标的 DataFrame}
+        configs: 候选评分配置
+        train_days / test_days / step_days: 训练段、测试段长度与窗口步长（交易日）
+        objective: 训练段上选择配置的目标指标（越大越好，如 sharpe、total_return）
+        base: 资金、费率、持仓数等回测参数
+        processes: 进程数，默认CPU核数；为0时在当前进程计算
+
+    Returns:
+        每个 窗口 × 配置 一行的结果表，selected 列标记该窗口在训练段上选出的配置
+    """
+    base = base or BacktestConfig()
+    panel = OHLCVPanel.from_frames(indicator_frames)
+    columns = indicator_columns(indicator_frames, panel)
+    windows = rolling_windows(len(panel.dates), train_days, test_days, step_days)
+    if not windows:
+        raise ValueError(f"历史数据只有 {len(panel.dates)} 个交易日，不足一个 {train_days}+{test_days} 的窗口")
+
+    processes = (os.cpu_count() or 1) if processes is None else processes
+    rows = []
+    if processes > 0 and len(windows) > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(windows)),
+                                 initializer=_init_worker, initargs=(panel, columns)) as pool:
+            for result in pool.map(_evaluate_window, windows, itertools.repeat(configs), itertools.repeat(base)):
+                rows.extend(result)
+    else:
+        _init_worker(panel, columns)
+        for window in windows:
+            rows.extend(_evaluate_window(window, configs, base))
+
+    table = pd.DataFrame(rows)
+    ranked = table[f'train_{objective}'].astype(float).fillna(-np.inf)
+    table['selected'] = table.index.isin(ranked.groupby(table['window_start']).idxmax())
+    return table
+
+
+def load_indicator_frames(codes: Sequence[str], start_date: Optional[str] = None,
+                          end_date: Optional[str] = None, analyzer=None) -> Dict[str, pd.DataFrame]:
+    """获取行情并通过分析器的指标缓存计算指标"""
+    from param_sweep import load_frames
+
+    if analyzer is None:
+        from stock_analyzer import StockAnalyzer
+        analyzer = StockAnalyzer()
+    frames = load_frames(codes, start_date, end_date, provider=analyzer.data_provider)
+    # 只计算评分用到的指标，缓存条目更小，全市场多年历史也能留在内存缓存中
+    compute = lambda df: analyzer.calculate_selected_indicators(df, SCORE_INPUTS)
+    return {code: analyzer.cached_indicators('stock_score', 'A', code, df, compute)
+            for code, df in frames.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='评分规则滚动样本外验证')
+    parser.add_argument('--codes', help='股票代码，逗号分隔；不指定时使用全部A股')
+    parser.add_argument('--start', help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', help='结束日期 YYYYMMDD')
+    parser.add_argument('--train-days', type=int, default=250, help='训练段交易日数')
+    parser.add_argument('--test-days', type=int, default=60, help='测试段交易日数')
+    parser.add_argument('--step-days', type=int, default=None, help='窗口步长，默认等于测试段')
+    parser.add_argument('--entry', default='60', help='候选买入阈值，逗号分隔')
+    parser.add_argument('--exit', default='40', help='候选卖出阈值，逗号分隔')
+    parser.add_argument('--objective', default='sharpe', help='训练段选择配置的目标指标')
+    parser.add_argument('--processes', type=int, default=None, help='进程数，默认CPU核数')
+    parser.add_argument('--output', default='scanner/walk_forward.csv', help='结果表输出路径')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from stock_analyzer import StockAnalyzer
+    analyzer = StockAnalyzer()
+    if args.codes:
+        codes = [code.strip() for code in args.codes.split(',') if code.strip()]
+    else:
+        codes = analyzer.data_provider.get_a_share_codes()
+
+    configs = [ScoringConfig(name=f'entry{entry}_exit{exit_}', entry_score=float(entry), exit_score=float(exit_))
+               for entry, exit_ in itertools.product(args.entry.split(','), args.exit.split(','))]
+    frames = load_indicator_frames(codes, args.start, args.end, analyzer)
+    table = walk_forward(frames, configs, args.train_days, args.test_days, args.step_days,
+                         args.objective, BacktestConfig(initial_cash=analyzer.initial_cash), args.processes)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    table.to_csv(args.output, index=False, encoding='utf-8-sig')
+    selected = table[table['selected']]
+    print(selected[['window_start', 'test_start', 'test_end', 'config', 'train_sharpe', 'test_total_return',
+                    'test_sharpe', 'test_max_drawdown']].to_string(index=False))
+    print(f"结果表已保存至 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
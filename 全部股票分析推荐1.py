@@ -5,19 +5,33 @@ Stock Analysis System
 
 import os
 import time
+import contextlib
 import random
 import logging
+import multiprocessing
 import traceback
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Tuple, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 import numpy as np
 import pandas as pd
-import akshare as ak
 from tqdm import tqdm
 
+from data_provider import MarketDataProvider, create_provider
+from indicator_panel import shift, tail_windows, true_range
+from indicator_cache import IndicatorCache, get_indicator_cache
+from rate_limiter import AdaptiveConcurrency, get_scheduler
+from circuit_breaker import (CircuitOpenError, DataUnavailableError, RetryBudget, backoff_delay, get_breakers,
+                             is_transient_error)
+from scan_journal import ScanJournal, DONE, SKIPPED, FAILED
+from scan_pipeline import ScanPipeline, Stage, pack_ohlcv, unpack_ohlcv
+from result_sink import TopKSink
+from results_store import ResultsStore, get_results_store
+from spot_filter import SpotFilter
+from scan_shard import journal_name, mark_done, select_shard, shard_from_env
+
 # -------------------------------
 # **技术指标配置**
 # -------------------------------
@@ -49,15 +63,18 @@ class TechnicalParams:
 class StockAnalyzer:
     """股票分析引擎，计算各类技术指标"""
 
-    def __init__(self, params: Optional[TechnicalParams] = None):
+    def __init__(self, params: Optional[TechnicalParams] = None,
+                 data_provider: Optional[MarketDataProvider] = None):
         """
         初始化股票分析引擎
 
         Args:
             params: 技术指标配置参数
+            data_provider: 行情数据源，默认由 DATA_SOURCE 环境变量决定
         """
         self._setup_logging()
         self.params = params or TechnicalParams.default()
+        self.data_provider = data_provider or create_provider()
 
     def _setup_logging(self) -> None:
         """配置日志记录"""
@@ -81,6 +98,10 @@ class StockAnalyzer:
 
         Returns:
             包含日期、开盘、收盘、最高、最低、成交量的 DataFrame
+
+        Raises:
+            DataUnavailableError: 数据不足或数据本身有问题，重试无意义
+            其他异常: 网络、超时、熔断、无法解析的响应等上游临时错误，原样抛出供调用方退避重试
         """
         try:
             if not start_date:
@@ -90,34 +111,7 @@ class StockAnalyzer:
 
             code = stock_code[2:] if stock_code.startswith(('sz', 'sh')) else stock_code
 
-            df = ak.stock_zh_a_hist(
-                symbol=code,
-                start_date=start_date,
-                end_date=end_date,
-                adjust="qfq"
-            )
-
-            self.logger.info(f"获取到 {len(df)} 行数据，列名：{df.columns.tolist()}")
-
-            df = df.rename(columns={
-                "日期": "date",
-                "开盘": "open",
-                "收盘": "close",
-                "最高": "high",
-                "最低": "low",
-                "成交量": "volume",
-                "trade_date": "date"
-            })
-
-            required_columns = {'date', 'open', 'close', 'high', 'low', 'volume'}
-            missing_columns = required_columns - set(df.columns)
-            if missing_columns:
-                raise ValueError(f"缺失必须字段: {missing_columns}")
-
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            numeric_columns = ['open', 'close', 'high', 'low', 'volume']
-            df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-            df_cleaned = df.dropna(subset=['date'] + numeric_columns).sort_values('date')
+            df_cleaned = self.data_provider.get_stock_history(code, 'A', start_date, end_date)
 
             if len(df_cleaned) < 60:
                 raise ValueError(f"数据不足（仅 {len(df_cleaned)} 行），无法计算至少60日均线")
@@ -126,7 +120,9 @@ class StockAnalyzer:
 
         except Exception as e:
             self.logger.error(f"获取股票数据失败，股票代码 {stock_code}，错误信息：{str(e)}")
-            raise ValueError(f"股票 {stock_code} 数据获取出错: {str(e)}")
+            if is_transient_error(e):
+                raise
+            raise DataUnavailableError(f"股票 {stock_code} 数据获取出错: {str(e)}")
 
     @staticmethod
     def calculate_ema(series: pd.Series, period: int) -> pd.Series:
@@ -226,6 +222,66 @@ class StockAnalyzer:
             self.logger.error(f"指标计算出错：{str(e)}")
             raise
 
+    def calculate_snapshot_indicators(self, df: pd.DataFrame, rows: int = 2) -> pd.DataFrame:
+        """
+        快照模式：只计算最后 rows 根K线的指标（打分和报告只读取最后两行），列与 calculate_indicators 相同。
+        指数平均（均线、MACD、RSI）与累计 OBV 依赖全部历史，只对单列做一次完整递推并保留末尾；
+        滚动类指标只取各自窗口所需的最少K线。
+        """
+        try:
+            p = self.params
+            rows = min(rows, len(df))
+            close = df['close'].to_numpy(dtype=np.float64)
+            volume = df['volume'].to_numpy(dtype=np.float64)
+            data = {name: df[name].to_numpy()[-rows:] for name in df.columns}
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for key, period in p.ma_periods.items():
+                    data[f'MA{period}'] = self.calculate_ema(df['close'], period).to_numpy()[-rows:]
+                data['RSI'] = self.calculate_rsi(df['close'], p.rsi_period).to_numpy()[-rows:]
+                macd, signal, hist = self.calculate_macd(df['close'])
+                data['MACD'], data['Signal'], data['MACD_hist'] = (
+                    macd.to_numpy()[-rows:], signal.to_numpy()[-rows:], hist.to_numpy()[-rows:])
+
+                windows = tail_windows(close, p.bollinger_period, rows)
+                middle, std = windows.mean(axis=1), windows.std(axis=1, ddof=1)
+                data['BB_upper'], data['BB_middle'], data['BB_lower'] = (
+                    middle + std * p.bollinger_std, middle, middle - std * p.bollinger_std)
+                data['Volume_MA'] = tail_windows(volume, p.volume_ma_period, rows).mean(axis=1)
+                data['Volume_Ratio'] = volume[-rows:] / (data['Volume_MA'] + 1e-10)
+                tr = true_range(df['high'].to_numpy(dtype=np.float64), df['low'].to_numpy(dtype=np.float64), close)
+                data['ATR'] = tail_windows(tr, p.atr_period, rows).mean(axis=1)
+                data['Volatility'] = data['ATR'] / close[-rows:] * 100
+                data['ROC'] = (close[-rows:] / shift(close, 10)[-rows:] - 1) * 100
+
+                diff = np.nan_to_num(close - shift(close, 1))
+                obv = np.cumsum(np.where(diff > 0, volume, np.where(diff < 0, -volume, 0)))
+                data['OBV'] = obv[-rows:]
+                data['OBV_MA10'] = tail_windows(obv, 10, rows).mean(axis=1)
+
+                # %D 为3日均值，%K 需要多算2根K线
+                windows = tail_windows(close, 14, rows + 2)
+                lowest, highest = windows.min(axis=1), windows.max(axis=1)
+                percent_k = (tail_windows(close, 1, rows + 2)[:, 0] - lowest) / (highest - lowest + 1e-10) * 100
+                data['%K'] = percent_k[-rows:]
+                data['%D'] = tail_windows(percent_k, 3, rows).mean(axis=1)
+
+            return pd.DataFrame(data, index=df.index[-rows:])
+
+        except Exception as e:
+            self.logger.error(f"快照指标计算出错：{str(e)}")
+            raise
+
+    def calculate_cached(self, stock_code: str, df: pd.DataFrame, snapshot: bool = False) -> pd.DataFrame:
+        """
+        经过进程内指标缓存（及 INDICATOR_CACHE_DIR 指定的磁盘缓存）计算指标，
+        键为 (代码, 最后一根K线, 参数哈希)，同一天重复扫描时直接复用。
+        """
+        kind, compute = (('scanner_snapshot', self.calculate_snapshot_indicators) if snapshot
+                         else ('scanner', self.calculate_indicators))
+        key = IndicatorCache.make_key(kind, 'A', stock_code, df, self.params)
+        return get_indicator_cache().get_or_compute(key, lambda: compute(df))
+
     def calculate_score(self, df: pd.DataFrame) -> float:
         """
         计算股票综合打分（基本打分满分100分），并根据 OBV 与随机指标调整±5分，
@@ -298,65 +354,123 @@ class StockAnalyzer:
         try:
             df = self.get_stock_data(stock_code)
             df = self.calculate_indicators(df)
-            score = self.calculate_score(df)
-            latest = df.iloc[-1]
-            prev = df.iloc[-2]
-            return {
-                'stock_code': stock_code,
-                'analysis_date': datetime.now().strftime('%Y-%m-%d'),
-                'score': score,
-                'price': latest['close'],
-                'price_change': (latest['close'] - prev['close']) / prev['close'] * 100,
-                'ma_trend': 'UP' if latest['MA5'] > latest['MA20'] else 'DOWN',
-                'rsi': latest['RSI'],
-                'macd_signal': 'BUY' if latest['MACD'] > latest['Signal'] else 'SELL',
-                'volume_status': 'HIGH' if latest['Volume_Ratio'] > 1.5 else 'NORMAL',
-                'recommendation': self.get_recommendation(score)
-            }
+            return self.build_report(stock_code, df)
 
         except Exception as e:
             self.logger.error(f"分析股票 {stock_code} 失败：{str(e)}")
             raise
 
+    def build_report(self, stock_code: str, df: pd.DataFrame) -> Dict:
+        """根据已计算指标的数据打分并生成分析结果"""
+        score = self.calculate_score(df)
+        latest = df.iloc[-1]
+        prev = df.iloc[-2]
+        return {
+            'stock_code': stock_code,
+            'analysis_date': datetime.now().strftime('%Y-%m-%d'),
+            'score': score,
+            'price': latest['close'],
+            'price_change': (latest['close'] - prev['close']) / prev['close'] * 100,
+            'ma_trend': 'UP' if latest['MA5'] > latest['MA20'] else 'DOWN',
+            'rsi': latest['RSI'],
+            'macd_signal': 'BUY' if latest['MACD'] > latest['Signal'] else 'SELL',
+            'volume_status': 'HIGH' if latest['Volume_Ratio'] > 1.5 else 'NORMAL',
+            'recommendation': self.get_recommendation(score)
+        }
+
+# -------------------------------
+# **计算进程**
+# -------------------------------
+_worker_analyzer: Optional[StockAnalyzer] = None
+_worker_snapshot = True
+
+# 进程池在取数线程和日志处理器运行之后才创建，fork 会把其他线程持有的锁（日志、HTTP 客户端）
+# 复制进子进程导致死锁，因此用 forkserver 启动计算进程，不支持时用 spawn
+COMPUTE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def _init_compute_worker(params: TechnicalParams, snapshot: bool = True) -> None:
+    """计算进程初始化：每个进程只创建一次分析引擎，不需要数据源"""
+    global _worker_analyzer, _worker_snapshot
+    _worker_analyzer = StockAnalyzer(params, data_provider=MarketDataProvider())
+    _worker_snapshot = snapshot
+
+def _compute_report(stock_code: str, dates: np.ndarray, values: np.ndarray) -> Dict:
+    """在计算进程中完成指标计算和打分，输入为 pack_ohlcv 打包的数组"""
+    df = _worker_analyzer.calculate_cached(stock_code, unpack_ohlcv(dates, values), _worker_snapshot)
+    return _worker_analyzer.build_report(stock_code, df)
+
 # -------------------------------
 # **全盘股票扫描器**
 # -------------------------------
 class TopStockScanner:
     """全盘筛选高打分股票的扫描器"""
 
-    def __init__(self, max_workers: int = 20, min_score: float = 85):
+    def __init__(self, max_workers: int = 20, min_score: float = 85,
+                 rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 compute_processes: Optional[int] = None,
+                 snapshot: bool = True,
+                 journal_dir: str = 'scanner/journal',
+                 resume: bool = True,
+                 adaptive: bool = True,
+                 concurrency_bounds: Optional[Tuple[int, int]] = None,
+                 max_pause: float = 600.0,
+                 top_k: Optional[int] = None,
+                 results_store: Union[ResultsStore, bool, None] = True,
+                 prefilter: Union[SpotFilter, bool, None] = True,
+                 shard: Optional[Tuple[int, int]] = None):
         """
         初始化扫描器
 
         Args:
-            max_workers: 并发线程数量（已增至20以加速分析）
+            max_workers: 行情获取并发数（已增至20以加速分析）；自适应时为初始并发数
             min_score: 高分最低阈值
+            rate_limits: 各数据源限额 {数据源: (每秒请求数, 突发容量)}，
+                         未指定时使用 RATE_LIMITS 环境变量或默认值
+            compute_processes: 指标计算与打分的进程数，默认等于CPU核数；为0时在线程中计算
+            snapshot: 只计算打分所需的最后两根K线的指标，结果与完整计算相同
+            journal_dir: 扫描断点日志目录，每天一个日志文件
+            resume: 是否从当天的断点日志续扫（只处理未记录或上次失败的股票）
+            adaptive: 按请求延迟和错误率在线调整行情获取并发数（AIMD）
+            concurrency_bounds: 自适应并发数范围 (最小, 最大)，未指定时使用 FETCH_CONCURRENCY 环境变量
+                                或 [max_workers/4, max_workers*2]
+            max_pause: 数据源熔断时单只股票最长等待恢复的秒数，超过后记为失败（可续扫）
+            top_k: 只保留评分最高的 top_k 支高分股票，默认保留全部达到 min_score 的股票
+            results_store: 保存每次扫描全部打分结果的结果库，True 时使用共享结果库（SCAN_RESULTS_DB），
+                           False/None 时不保存
+            prefilter: 获取历史行情前按全市场实时快照预筛的条件，True 时读取环境变量 SPOT_FILTER
+                       （未设置则不预筛），False/None 时不预筛
+            shard: 多机分片扫描时本机负责的分片 (编号, 分片数)，未指定时读取环境变量 SCAN_SHARD（如 0/4），
+                   journal_dir 应为各机器共享的目录，全部完成后用 scan_shard.py merge 合并
         """
         self.analyzer = StockAnalyzer()
         self.max_workers = max_workers
         self.min_score = min_score
+        self.compute_processes = (os.cpu_count() or 1) if compute_processes is None else compute_processes
+        self.snapshot = snapshot
+        self.journal_dir = journal_dir
+        self.resume = resume
+        self.journal: Optional[ScanJournal] = None
+        self.concurrency = AdaptiveConcurrency.from_env(max_workers, concurrency_bounds) if adaptive else None
+        # 上游临时错误的重试受全局预算限制；数据源熔断时暂停等待恢复，不消耗重试次数
+        self.retry_budget = RetryBudget.from_env()
+        self.max_pause = max_pause
+        self.top_k = top_k
+        self.results_store = get_results_store() if results_store is True else (results_store or None)
+        self.prefilter = SpotFilter.from_env() if prefilter is True else (prefilter or None)
+        self.shard = shard or shard_from_env()
         self.logger = logging.getLogger(__name__)
 
+        # 所有工作线程共享同一组令牌桶，按上游限额连续发出请求
+        self.scheduler = get_scheduler()
+        for source, (rate, burst) in (rate_limits or {}).items():
+            self.scheduler.configure(source, rate, burst)
+
     def get_all_stocks(self) -> List[str]:
         """
-        获取所有上市 A 股股票代码（全盘版）。
-        使用 ak.stock_info_sh_name_code(symbol="主板A股") 与 ak.stock_info_sz_name_code(symbol="A股列表")，
-        候选字段列表为：['A股代码', '证券代码', '股票代码', 'code'] 。
+        获取所有上市 A 股股票代码（全盘版），由数据源合并沪深交易所列表。
         """
         try:
-            sh_df = ak.stock_info_sh_name_code(symbol="主板A股")
-            sz_df = ak.stock_info_sz_name_code(symbol="A股列表")
-            candidate_cols = ['A股代码', '证券代码', '股票代码', 'code']
-
-            def get_codes(df: pd.DataFrame) -> set:
-                for col in candidate_cols:
-                    if col in df.columns:
-                        return {str(code).zfill(6) for code in df[col]}
-                raise KeyError(f"未能找到股票代码字段，现有字段：{df.columns.tolist()}")
-
-            sh_codes = get_codes(sh_df)
-            sz_codes = get_codes(sz_df)
-            all_codes = sorted(sh_codes | sz_codes)
+            all_codes = self.analyzer.data_provider.get_a_share_codes()
             self.logger.info(f"完整股票列表获取到 {len(all_codes)} 支股票信息")
             print(f"\n开始分析 {len(all_codes)} 支股票...")
             return all_codes
@@ -365,51 +479,142 @@ class TopStockScanner:
             self.logger.error(f"获取股票列表失败：{str(e)}")
             raise
 
-    def analyze_stock_safe(self, stock_code: str, max_retries: int = 3) -> Optional[Dict]:
+    def prefilter_stocks(self, codes: List[str]) -> List[str]:
         """
-        安全分析单只股票（加入重试机制），数据异常则跳过。
+        用一次全市场实时快照请求按预筛条件剔除股票，保持原有顺序。
+        快照中没有的股票予以保留；快照获取失败时不预筛。
         """
-        for attempt in range(max_retries):
+        if self.prefilter is None:
+            return codes
+        try:
+            snapshot = self.analyzer.data_provider.get_spot_snapshot('A')
+        except Exception as e:
+            self.logger.warning(f"获取实时快照失败，跳过预筛：{str(e)}")
+            return codes
+        result = self.prefilter.apply(snapshot)
+        survivors = [code for code in codes if code not in result.rejected]
+        self.logger.info(f"快照预筛：{len(codes)} -> {len(survivors)} 支，剔除原因：{result.reason_counts()}")
+        print(f"\n快照预筛后剩余 {len(survivors)} 支股票（剔除 {len(codes) - len(survivors)} 支）")
+        return survivors
+
+    def journal_path(self) -> str:
+        """当天的扫描断点日志路径（分片扫描时每个分片一个日志）"""
+        return os.path.join(self.journal_dir, journal_name(datetime.now().strftime('%Y%m%d'), self.shard))
+
+    def _record(self, stock_code: str, status: str, report: Optional[Dict] = None, reason: str = '') -> None:
+        """扫描进行中时把单只股票的处理结果写入断点日志"""
+        if self.journal is not None:
+            self.journal.record(stock_code, status, report, reason)
+
+    def _fetch(self, stock_code: str) -> pd.DataFrame:
+        """获取行情；自适应并发时占用一个并发名额，并把延迟和是否为上游错误反馈给控制器"""
+        if self.concurrency is None:
+            return self.analyzer.get_stock_data(stock_code)
+        with self.concurrency.slot() as slot:
             try:
-                return self.analyzer.analyze_stock(stock_code)
-            except ValueError as e:
+                return self.analyzer.get_stock_data(stock_code)
+            except DataUnavailableError:
+                # 数据不足等数据本身的问题不是上游拥塞（无法解析的响应等临时错误仍记为失败）
+                slot.ok = True
+                raise
+
+    def fetch_stock_safe(self, stock_code: str, max_retries: int = 3) -> Optional[Tuple[str, pd.DataFrame]]:
+        """
+        安全获取单只股票行情，数据异常则跳过。
+        上游临时错误按带抖动的指数退避重试，重试次数受全局预算限制；
+        数据源熔断时等待其恢复后再试，不消耗重试次数。
+        """
+        self.retry_budget.record_request()
+        attempt = 0
+        paused = 0.0
+        while True:
+            try:
+                return stock_code, self._fetch(stock_code)
+            except DataUnavailableError as e:
                 self.logger.warning(f"跳过股票 {stock_code}: {str(e)}")
+                self._record(stock_code, SKIPPED, reason=str(e))
                 return None
+            except CircuitOpenError as e:
+                if paused >= self.max_pause:
+                    self.logger.error(f"股票 {stock_code} 等待数据源恢复超过 {self.max_pause:.0f} 秒：{str(e)}")
+                    self._record(stock_code, FAILED, reason=str(e))
+                    return None
+                wait = e.retry_after + random.uniform(0, 1)
+                paused += wait
+                time.sleep(wait)
             except Exception as e:
-                if attempt == max_retries - 1:
-                    self.logger.error(f"股票 {stock_code} 分析尝试 {max_retries} 次后失败：{str(e)}")
+                attempt += 1
+                if attempt >= max_retries or not self.retry_budget.try_spend():
+                    self.logger.error(f"股票 {stock_code} 数据获取尝试 {attempt} 次后失败：{str(e)}")
+                    self._record(stock_code, FAILED, reason=str(e))
                     return None
-                self.logger.warning(f"股票 {stock_code} 第 {attempt+1} 次分析失败：{str(e)}")
-                time.sleep(random.uniform(2, 5))
-
-    def process_batch(self, stock_codes: List[str]) -> List[Dict]:
-        """利用多线程并行处理一批股票的分析任务"""
-        results = []
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(self.analyze_stock_safe, code): code for code in stock_codes}
-            for future in tqdm(futures, desc="分析进度", ncols=80):
-                try:
-                    result = future.result()
-                    if result is not None:
-                        results.append(result)
-                except Exception as e:
-                    stock = futures[future]
-                    self.logger.error(f"处理股票 {stock} 时出错：{str(e)}")
-        return results
-
-    def save_intermediate_results(self, results: List[Dict]) -> None:
-        """周期性保存中间结果，便于后续查看进度"""
+                self.logger.warning(f"股票 {stock_code} 第 {attempt} 次获取失败：{str(e)}")
+                time.sleep(backoff_delay(attempt - 1))
+
+    def analyze_stock_safe(self, stock_code: str, max_retries: int = 3) -> Optional[Dict]:
+        """
+        安全分析单只股票（加入重试机制），数据异常则跳过。
+        """
+        fetched = self.fetch_stock_safe(stock_code, max_retries)
+        if fetched is None:
+            return None
+        try:
+            return self.analyzer.build_report(
+                stock_code, self.analyzer.calculate_cached(stock_code, fetched[1], self.snapshot))
+        except Exception as e:
+            self.logger.error(f"股票 {stock_code} 分析失败：{str(e)}")
+            self._record(stock_code, FAILED, reason=str(e))
+            return None
+
+    def _indicator_stage(self, item: Tuple[str, pd.DataFrame]) -> Tuple[str, pd.DataFrame]:
+        """流水线指标阶段"""
+        stock_code, df = item
+        return stock_code, self.analyzer.calculate_cached(stock_code, df, self.snapshot)
+
+    def _score_stage(self, item: Tuple[str, pd.DataFrame]) -> Dict:
+        """流水线打分阶段"""
+        stock_code, df = item
+        return self.analyzer.build_report(stock_code, df)
+
+    def _compute_pool(self):
+        """创建计算进程池；线程模式下返回空的上下文"""
+        if self.compute_processes > 0:
+            return ProcessPoolExecutor(max_workers=self.compute_processes,
+                                       mp_context=multiprocessing.get_context(COMPUTE_START_METHOD),
+                                       initializer=_init_compute_worker,
+                                       initargs=(self.analyzer.params, self.snapshot))
+        return contextlib.nullcontext()
+
+    def _compute_stages(self, pool: Optional[ProcessPoolExecutor]) -> List[Stage]:
+        """
+        计算阶段：进程模式下由分发线程把打包后的数组提交给进程池，
+        每个进程保持一个在途任务；线程模式下指标与打分分为两个线程阶段。
+        """
+        if pool is None:
+            workers = max(1, min(4, os.cpu_count() or 1))
+            return [
+                Stage('indicators', self._indicator_stage, workers),
+                Stage('score', self._score_stage, workers),
+            ]
+
+        def dispatch(item: Tuple[str, pd.DataFrame]) -> Dict:
+            stock_code, df = item
+            return pool.submit(_compute_report, stock_code, *pack_ohlcv(df)).result()
+
+        return [Stage('compute', dispatch, self.compute_processes)]
+
+    def save_intermediate_results(self, sink: TopKSink) -> None:
+        """周期性保存中间结果，便于后续查看进度（只写出收集器中保留的高分股票）"""
         try:
-            df = pd.DataFrame(results)
-            high_score_stocks = df[df['score'] >= self.min_score].sort_values('score', ascending=False)
+            high_score_stocks = sink.snapshot()
             output_lines = [
                 "=" * 80,
                 f"股票扫描中间结果 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                f"共分析 {len(results)} 支股票",
+                f"共分析 {sink.seen} 支股票",
                 "=" * 80,
                 f"\n发现 {len(high_score_stocks)} 支高分股票（得分≥{self.min_score}）："
             ]
-            for _, row in high_score_stocks.iterrows():
+            for row in high_score_stocks:
                 output_lines.extend([
                     f"\n股票代码: {row['stock_code']}",
                     f"得分: {row['score']:.1f} | 价格: ¥{row['price']:.2f} | 涨跌幅: {row['price_change']:.2f}%"
@@ -422,45 +627,115 @@ class TopStockScanner:
         except Exception as e:
             self.logger.error(f"保存中间结果失败：{str(e)}")
 
-    def get_high_score_stocks(self, batch_size: int = 20) -> List[Dict]:
-        """扫描全盘股票，返回高打分结果列表"""
+    def get_high_score_stocks(self, queue_size: Optional[int] = None) -> List[Dict]:
+        """
+        扫描全盘股票，返回高打分结果列表。
+        行情获取 -> 指标计算 -> 打分 -> 结果收集 以流水线方式连续运行，
+        各阶段之间为有界队列，某只股票获取缓慢不会阻塞其他工作线程。
+
+        每只股票的处理结果写入当天的断点日志，中断后重新运行只处理未记录或上次失败的股票。
+
+        Args:
+            queue_size: 阶段间队列容量，默认为工作线程数的两倍
+        """
         try:
             all_stocks = self.get_all_stocks()
+            if self.shard is not None:
+                all_stocks = select_shard(all_stocks, self.shard)
+                print(f"\n分片 {self.shard[0]}/{self.shard[1]} 负责 {len(all_stocks)} 支股票")
+            all_stocks = self.prefilter_stocks(all_stocks)
             total_stocks = len(all_stocks)
-            print(f"\n开始扫描 {total_stocks} 支股票……")
-            results = []
-            total_batches = (total_stocks + batch_size - 1) // batch_size
-
-            for i in range(0, total_stocks, batch_size):
-                batch_number = i // batch_size + 1
-                print(f"\r当前进度: 批次 {batch_number}/{total_batches}", end="")
-                batch = all_stocks[i:i + batch_size]
-                batch_results = self.process_batch(batch)
-                results.extend(batch_results)
-                if i + batch_size < total_stocks:
-                    time.sleep(random.uniform(3, 5))
-                if results and ((len(results) % 100 == 0) or (i + batch_size >= total_stocks)):
-                    self.save_intermediate_results(results)
+
+            meta = {'params': asdict(self.analyzer.params)}
+            if self.shard is not None:
+                meta['shard'] = list(self.shard)
+            self.journal = ScanJournal(self.journal_path(), meta=meta, resume=self.resume)
+            # 只保留达到阈值（及 top_k）的结果，内存与中间结果保存的开销不随股票总数增长
+            sink = TopKSink(k=self.top_k, min_score=self.min_score)
+            # 每只股票的打分结果（含续扫恢复的部分）分批写入结果库，用于历史查询和逐次对比
+            run_id = None
+            if self.results_store is not None:
+                # 分片的部分结果单独记为 scanner_shard，完整结果由合并命令记为 scanner
+                run_id = self.results_store.start_run('scanner' if self.shard is None else 'scanner_shard', 'A',
+                                                      dict(meta, min_score=self.min_score))
+            universe = set(all_stocks)
+            for report in self.journal.reports():
+                if report['stock_code'] not in universe:
+                    # 预筛条件变化后被剔除的股票不再计入结果
+                    continue
+                sink.add(report)
+                if run_id is not None:
+                    self.results_store.add(run_id, report)
+            pending = self.journal.pending(all_stocks)
+            if len(pending) < total_stocks:
+                print(f"\n从断点日志恢复 {total_stocks - len(pending)} 支股票的结果，剩余 {len(pending)} 支")
+            print(f"\n开始扫描 {len(pending)} 支股票……")
+
+            def collect(report: Dict) -> None:
+                sink.add(report)
+                if run_id is not None:
+                    self.results_store.add(run_id, report)
+                self._record(report['stock_code'], DONE, report)
+                if sink.seen % 100 == 0:
+                    self.save_intermediate_results(sink)
+
+            # 自适应并发时按并发上限启动获取线程，实际同时请求数由控制器限制
+            fetch_workers = self.concurrency.max_limit if self.concurrency else self.max_workers
+
+            def item_done(progress: tqdm) -> None:
+                progress.update(1)
+                if self.concurrency is not None:
+                    progress.set_postfix_str(
+                        f"并发 {self.concurrency.current} | {self.concurrency.throughput():.1f}次/秒", refresh=False)
+
+            def on_error(stage: str, item, e: Exception) -> None:
+                stock_code = item if isinstance(item, str) else item[0]
+                self.logger.error(f"处理股票 {stock_code} 时出错（{stage}）：{str(e)}")
+                self._record(stock_code, FAILED, reason=f"{stage}: {str(e)}")
+
+            try:
+                with tqdm(total=total_stocks, initial=total_stocks - len(pending), desc="分析进度", ncols=80) as progress, \
+                        self._compute_pool() as pool:
+                    pipeline = ScanPipeline(
+                        stages=[Stage('fetch', self.fetch_stock_safe, fetch_workers)] + self._compute_stages(pool),
+                        sink=collect,
+                        queue_size=queue_size or self.max_workers * 2,
+                        on_item_done=lambda: item_done(progress),
+                        on_error=on_error
+                    )
+                    stats = pipeline.run(pending)
+            finally:
+                self.journal.close()
+                if run_id is not None:
+                    self.results_store.flush(run_id)
+                self.logger.info(f"断点日志统计：{self.journal.counts()}")
+            if self.shard is not None:
+                # 有失败的股票时不标记完成，重新运行本分片即可续扫
+                counts = self.journal.counts()
+                if counts[FAILED]:
+                    self.logger.warning(f"分片 {self.shard[0]}/{self.shard[1]} 有 {counts[FAILED]} 支股票失败，"
+                                        f"重新运行以续扫")
+                else:
+                    mark_done(self.journal.path, counts)
+            self.journal = None
+            if sink.seen:
+                self.save_intermediate_results(sink)
+            if run_id is not None:
+                self.results_store.finish_run(run_id)
+                self.logger.info(f"扫描结果已保存至 {self.results_store.path}（run_id={run_id}）")
             print("\n扫描结束！")
+            self.logger.info(f"流水线统计：{stats}")
+            if self.compute_processes == 0:
+                # 进程模式下各计算进程有各自的内存缓存，只在线程模式下汇报
+                self.logger.info(f"指标缓存统计：{get_indicator_cache().stats()}")
+            self.logger.info(f"数据源限流统计：{self.scheduler.stats()}")
+            if self.concurrency is not None:
+                self.logger.info(f"自适应并发统计：{self.concurrency.stats()}")
+            self.logger.info(f"熔断统计：{get_breakers().stats()}，重试预算：{self.retry_budget.stats()}")
+
+            self.logger.info(f"结果收集统计：{sink.stats()}")
 
-            if results:
-                df_results = pd.DataFrame(results)
-                high_score_stocks = df_results[df_results['score'] >= self.min_score].sort_values('score', ascending=False)
-                formatted_results = []
-                for _, row in high_score_stocks.iterrows():
-                    formatted_results.append({
-                        '股票代码': row['stock_code'],
-                        '评分': f"{row['score']:.1f}",
-                        '当前价格': f"¥{row['price']:.2f}",
-                        '涨跌幅': f"{row['price_change']:.2f}%",
-                        'RSI指标': f"{row['rsi']:.2f}",
-                        '均线趋势': '上升' if row['ma_trend'] == 'UP' else '下降',
-                        'MACD信号': '买入' if row['macd_signal'] == 'BUY' else '卖出',
-                        '成交量状态': '放量' if row['volume_status'] == 'HIGH' else '正常',
-                        '投资建议': row['recommendation']
-                    })
-                return formatted_results
-            return []
+            return [format_report(row) for row in sink.snapshot()]
 
         except Exception as e:
             self.logger.error(f"全盘扫描失败：{str(e)}")
@@ -469,6 +744,20 @@ class TopStockScanner:
 # -------------------------------
 # **结果分组与报告生成**
 # -------------------------------
+def format_report(row: Dict) -> Dict:
+    """打分结果转为中文展示字段"""
+    return {
+        '股票代码': row['stock_code'],
+        '评分': f"{row['score']:.1f}",
+        '当前价格': f"¥{row['price']:.2f}",
+        '涨跌幅': f"{row['price_change']:.2f}%",
+        'RSI指标': f"{row['rsi']:.2f}",
+        '均线趋势': '上升' if row['ma_trend'] == 'UP' else '下降',
+        'MACD信号': '买入' if row['macd_signal'] == 'BUY' else '卖出',
+        '成交量状态': '放量' if row['volume_status'] == 'HIGH' else '正常',
+        '投资建议': row['recommendation']
+    }
+
 def format_price_category(price: float) -> str:
     """将价格划分为区间（例如 32.5 -> '30-40'）"""
     base = (price // 10) * 10
@@ -564,7 +853,7 @@ def main():
     scanner = TopStockScanner(max_workers=20)  # 已提升至20线程
     try:
         print("\n开始全盘扫描股票……")
-        high_score_stocks = scanner.get_high_score_stocks(batch_size=20)
+        high_score_stocks = scanner.get_high_score_stocks()
         if not high_score_stocks:
             print("\n未找到得分大于等于85分的股票。")
             return